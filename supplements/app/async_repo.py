@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional, TypeVar
+
+from .db import ConnectionManager
+
+T = TypeVar("T")
+
+
+class AsyncRepo:
+    # Async facade over the repo functions for the Textual app. Everything
+    # runs on one dedicated DB thread that owns its own connection, so the
+    # executor's queue is the single serialized path for writes, and reads
+    # queued behind a write see its result. The event loop only awaits.
+
+    def __init__(self, manager: ConnectionManager, *, on_pending: Optional[Callable[[int], None]] = None):
+        self._db = manager
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="supplements-db")
+        self._on_pending = on_pending
+        self.pending = 0
+
+    def call(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        # Blocking variant for startup and scripts, still on the DB thread.
+        return self._executor.submit(self._read_job, fn, args, kwargs).result()
+
+    async def read(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        return await self._run(partial(self._read_job, fn, args, kwargs))
+
+    async def poll(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        # A read that is not counted in `pending`, for background polling
+        # that should not show as work in progress.
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(self._read_job, fn, args, kwargs))
+
+    async def write(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        return await self._run(partial(self._write_job, fn, args, kwargs))
+
+    async def _run(self, job: Callable[[], T]) -> T:
+        self._set_pending(1)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            self._set_pending(-1)
+
+    def _read_job(self, fn: Callable[..., T], args: tuple, kwargs: dict) -> T:
+        conn: sqlite3.Connection = self._db.connection()
+        return fn(conn, *args, **kwargs)
+
+    def _write_job(self, fn: Callable[..., T], args: tuple, kwargs: dict) -> T:
+        with self._db.write() as conn:
+            return fn(conn, *args, **kwargs)
+
+    def _set_pending(self, delta: int) -> None:
+        self.pending += delta
+        if self._on_pending is not None:
+            self._on_pending(self.pending)
+
+    def close(self) -> None:
+        # Queued writes finish first; the thread's connection is closed on
+        # the thread that opened it.
+        self._executor.submit(self._db.close_thread_connection)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Optional
+
+from .config import AppConfig, ensure_dirs, get_config
+from .services.validators import STATUSES
+
+if TYPE_CHECKING:
+    import sqlite3
+
+# Entry point for scripted use (cron exports, backups, quick listings) as
+# well as the TUI and web UI. Each command imports what it needs inside its
+# handler: the headless ones never load Textual, Rich, Flask or Jinja, whose
+# imports would otherwise be most of their runtime. `python -m benchmarks`
+# checks their cold start against STARTUP_BUDGET_MS.
+
+HISTORY_LIMIT = 50
+
+Handler = Callable[[argparse.Namespace, AppConfig], int]
+
+
+def _open(cfg: AppConfig) -> sqlite3.Connection:
+    from .db import connect, init_db
+
+    ensure_dirs(cfg)
+    conn = connect(cfg.db_path)
+    init_db(conn, cfg.backups_dir)
+    return conn
+
+
+def cmd_tui(args: argparse.Namespace, cfg: AppConfig) -> int:
+    from .tui.app import SupplementsTUI
+
+    SupplementsTUI(cfg).run()
+    return 0
+
+
+def cmd_web(args: argparse.Namespace, cfg: AppConfig) -> int:
+    from .web.__main__ import main as web_main
+
+    return web_main(args.args, cfg)
+
+
+def cmd_backup(args: argparse.Namespace, cfg: AppConfig) -> int:
+    from .services.backup import main as backup_main
+
+    return backup_main(args.args, cfg)
+
+
+def cmd_list(args: argparse.Namespace, cfg: AppConfig) -> int:
+    from .repo import iter_items
+    from .services.formatting import format_doses, format_doses_when
+
+    statuses = STATUSES if args.status == "all" else (args.status,)
+    conn = _open(cfg)
+    out = sys.stdout
+    try:
+        if args.json:
+            # One item per line inside a JSON array, written as it is read.
+            encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+            sep = "[\n"
+            for status in statuses:
+                for item, doses in iter_items(conn, status, as_tuples=True):
+                    record = item._asdict()
+                    record["doses"] = [dose._asdict() for dose in doses]
+                    out.write(sep + encode(record))
+                    sep = ",\n"
+            out.write("[]\n" if sep == "[\n" else "\n]\n")
+            return 0
+        for status in statuses:
+            for item, doses in iter_items(conn, status, as_tuples=True):
+                fields = (item.name_display, item.category, item.status, format_doses(doses), format_doses_when(doses), item.brand or "")
+                out.write("\t".join(fields) + "\n")
+    finally:
+        conn.close()
+    return 0
+
+
+def cmd_history(args: argparse.Namespace, cfg: AppConfig) -> int:
+    from .repo import get_history, get_item_names
+    from .services.history import describe_event, write_history_csv
+
+    conn = _open(cfg)
+    try:
+        if args.csv:
+            # The whole timeline, in keyset batches.
+            write_history_csv(conn, sys.stdout, item_id=args.item)
+            return 0
+        events = get_history(conn, item_id=args.item, limit=args.limit)
+        names = get_item_names(conn, {e.item_id for e in events if e.item_id})
+        for e in events:
+            name = names.get(e.item_id, e.item_id or "")
+            print(f"{e.ts}  {name}  {describe_event(e)}")
+    finally:
+        conn.close()
+    return 0
+
+
+def cmd_export(args: argparse.Namespace, cfg: AppConfig) -> int:
+    from .services.doctor_export import export_doctor
+
+    conn = _open(cfg)
+    try:
+        path = export_doctor(conn, cfg.exports_dir, args.format)
+    finally:
+        conn.close()
+    print(path)
+    return 0
+
+
+def cmd_import(args: argparse.Namespace, cfg: AppConfig) -> int:
+    from .services.importer import import_items_file
+
+    if not args.path.is_file():
+        print(f"error: no such file: {args.path}", file=sys.stderr)
+        return 1
+    conn = _open(cfg)
+    try:
+        result = import_items_file(conn, args.path, args.format)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+    print(f"inserted {result.inserted}, duplicates {result.duplicates}, rejected {len(result.rejected)}")
+    for n, reasons in result.rejected:
+        print(f"  record {n}: {'; '.join(reasons)}", file=sys.stderr)
+    return 1 if result.rejected else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m app",
+        description="Supplements tracker. Without a command, opens the TUI.",
+    )
+    parser.add_argument("--data-dir", type=Path, help="directory with supplements.db, exports/ and backups/ (default: data/)")
+    parser.set_defaults(handler=cmd_tui)
+    sub = parser.add_subparsers(dest="command", metavar="command")
+
+    p = sub.add_parser("tui", help="open the terminal UI")
+    p.set_defaults(handler=cmd_tui)
+
+    # web and backup hand everything after the command to their own parsers.
+    # With prefix_chars="+" their subparsers take "--port" and "--help" as
+    # plain words rather than options of their own.
+    p = sub.add_parser("web", help="serve the web dashboard (python -m app.web options)", prefix_chars="+", add_help=False)
+    p.add_argument("args", nargs=argparse.REMAINDER)
+    p.set_defaults(handler=cmd_web)
+
+    p = sub.add_parser("list", help="print items, one per line")
+    p.add_argument("--status", choices=STATUSES + ("all",), default="active")
+    p.add_argument("--json", action="store_true", help="a JSON array of items with their doses")
+    p.set_defaults(handler=cmd_list)
+
+    p = sub.add_parser("history", help="print recent changes, newest first")
+    p.add_argument("--item", help="only this item id")
+    p.add_argument("--limit", type=int, default=HISTORY_LIMIT)
+    p.add_argument("--csv", action="store_true", help="the whole history as CSV")
+    p.set_defaults(handler=cmd_history)
+
+    p = sub.add_parser("export", help="write the doctor export and print its path")
+    p.add_argument("--format", choices=("html", "csv", "txt"), default="html")
+    p.set_defaults(handler=cmd_export)
+
+    p = sub.add_parser("import", help="import items from CSV, JSON or JSON lines")
+    p.add_argument("path", type=Path)
+    p.add_argument("--format", choices=("csv", "json", "jsonl"), help="default: from the file extension")
+    p.set_defaults(handler=cmd_import)
+
+    p = sub.add_parser(
+        "backup", help="manage snapshots (python -m app.services.backup commands)", prefix_chars="+", add_help=False
+    )
+    p.add_argument("args", nargs=argparse.REMAINDER)
+    p.set_defaults(handler=cmd_backup)
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    cfg = get_config(args.data_dir.resolve() if args.data_dir else None)
+    handler: Handler = args.handler
+    try:
+        return handler(args, cfg)
+    except BrokenPipeError:
+        # Output piped into e.g. `head`, which has what it wanted. Point
+        # stdout at /dev/null so the flush at exit does not fail again.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 
 
 @dataclass(frozen=True)
@@ -13,17 +14,16 @@ class AppConfig:
     backups_dir: Path
 
 
-def get_config() -> AppConfig:
+def get_config(data_dir: Optional[Path] = None) -> AppConfig:
+    # Only works out paths; ensure_dirs creates them, so scripted commands
+    # that never touch the filesystem do not pay for it.
     # This file lives at: <repo>/supplements/app/config.py
     project_root = Path(__file__).resolve().parents[2]
-    data_dir = project_root / "data"
+    data_dir = data_dir or project_root / "data"
     exports_dir = data_dir / "exports"
     backups_dir = data_dir / "backups"
     db_path = data_dir / "supplements.db"
 
-    exports_dir.mkdir(parents=True, exist_ok=True)
-    backups_dir.mkdir(parents=True, exist_ok=True)
-
     return AppConfig(
         project_root=project_root,
         data_dir=data_dir,
@@ -31,3 +31,8 @@ def get_config() -> AppConfig:
         exports_dir=exports_dir,
         backups_dir=backups_dir,
     )
+
+
+def ensure_dirs(cfg: AppConfig) -> None:
+    for path in (cfg.db_path.parent, cfg.exports_dir, cfg.backups_dir):
+        path.mkdir(parents=True, exist_ok=True)
@@ -1,82 +1,304 @@
 from __future__ import annotations
 
+import logging
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable
-
-
-SCHEMA_SQL: list[str] = [
-    """
-    CREATE TABLE IF NOT EXISTS items (
-        id TEXT PRIMARY KEY,
-        name_display TEXT NOT NULL,
-        name_generic TEXT,
-        brand TEXT,
-        category TEXT NOT NULL CHECK (category IN ('rx','otc','supplement')),
-        form TEXT,
-        route TEXT,
-        notes TEXT,
-        status TEXT NOT NULL CHECK (status IN ('active','paused','stopped')),
-        start_date TEXT,
-        stop_date TEXT,
-        prescriber TEXT,
-        pharmacy TEXT,
-        created_at TEXT NOT NULL,
-        updated_at TEXT NOT NULL
-    );
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS doses (
-        id TEXT PRIMARY KEY,
-        item_id TEXT NOT NULL,
-        amount REAL,
-        unit TEXT,
-        time_am INTEGER NOT NULL DEFAULT 0,
-        time_midday INTEGER NOT NULL DEFAULT 0,
-        time_pm INTEGER NOT NULL DEFAULT 0,
-        with_food INTEGER,
-        instructions TEXT,
-        created_at TEXT NOT NULL,
-        updated_at TEXT NOT NULL,
-        FOREIGN KEY (item_id) REFERENCES items(id) ON DELETE CASCADE
-    );
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS history (
-        id TEXT PRIMARY KEY,
-        ts TEXT NOT NULL,
-        item_id TEXT NOT NULL,
-        action TEXT NOT NULL CHECK (action IN ('create','update','status_change')),
-        field TEXT,
-        old_value TEXT,
-        new_value TEXT,
-        note TEXT,
-        FOREIGN KEY (item_id) REFERENCES items(id) ON DELETE CASCADE
-    );
-    """,
-    """
-    CREATE INDEX IF NOT EXISTS idx_items_status ON items(status);
-    """,
-    """
-    CREATE INDEX IF NOT EXISTS idx_items_category ON items(category);
-    """,
-    """
-    CREATE INDEX IF NOT EXISTS idx_history_item_ts ON history(item_id, ts);
-    """,
-]
-
-
-def connect(db_path: Path) -> sqlite3.Connection:
-    conn = sqlite3.connect(str(db_path))
+from typing import Iterable, Iterator, Optional
+
+from . import tracing
+from .migrations import SCHEMA_SQL, migrate  # noqa: F401  (SCHEMA_SQL re-exported)
+from .tracing import TRACER
+
+logger = logging.getLogger(__name__)
+
+BUSY_TIMEOUT_MS = 5000
+MMAP_SIZE = 64 * 1024 * 1024
+SLOW_LOCK_WAIT_S = 0.1
+
+
+class Connection(sqlite3.Connection):
+    # sqlite3.Connection cannot be weakly referenced; this subclass can, which
+    # lets the repo layer attach per-connection caches.
+    pass
+
+
+class TracedCursor(sqlite3.Cursor):
+    # Times each statement into tracing.TRACER, grouped by normalized SQL.
+    # A statement is recorded once it is done with: when its rows run out,
+    # when the cursor is reused or closed, or when it is dropped. Its time
+    # is execute (which steps to the first row) plus every fetch.
+    _stats: Optional[tracing.StatementStats] = None
+    _sql = ""
+    _params = None
+    _elapsed = 0.0
+    _fetch_s = 0.0
+    _rows = 0
+
+    def execute(self, sql, parameters=()):
+        if self._stats is not None:
+            self._finish()
+        started = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        except BaseException:
+            TRACER.stats_for(sql).errors += 1
+            raise
+        self._begin(sql, parameters, time.perf_counter() - started)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        if self._stats is not None:
+            self._finish()
+        started = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        except BaseException:
+            TRACER.stats_for(sql).errors += 1
+            raise
+        # The first row of parameters is enough for EXPLAIN, if we have it.
+        params = seq_of_parameters[0] if isinstance(seq_of_parameters, (list, tuple)) and seq_of_parameters else None
+        self._begin(sql, params, time.perf_counter() - started)
+        return self
+
+    def _begin(self, sql: str, params, elapsed: float) -> None:
+        self._stats = TRACER.stats_for(sql)
+        self._sql, self._params = sql, params
+        self._elapsed, self._fetch_s = elapsed, 0.0
+        if self.description is None:
+            # Nothing to fetch; rowcount is what it changed.
+            self._rows = max(self.rowcount, 0)
+            self._finish()
+        else:
+            self._rows = 0
+
+    def _finish(self) -> None:
+        stats, self._stats = self._stats, None
+        elapsed = self._elapsed + self._fetch_s
+        stats.latency.observe(elapsed)
+        stats.fetch_s += self._fetch_s
+        stats.rows += self._rows
+        if elapsed >= TRACER.slow_s:
+            TRACER.record_slow(self.connection, self._sql, self._params, elapsed, self._rows)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        if self._stats is not None:
+            self._fetch_s += time.perf_counter() - started
+            if row is None:
+                self._finish()
+            else:
+                self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        if self._stats is not None:
+            self._fetch_s += time.perf_counter() - started
+            self._rows += len(rows)
+            if len(rows) < size:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        if self._stats is not None:
+            self._fetch_s += time.perf_counter() - started
+            self._rows += len(rows)
+            self._finish()
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            if self._stats is not None:
+                self._fetch_s += time.perf_counter() - started
+                self._finish()
+            raise
+        if self._stats is not None:
+            self._fetch_s += time.perf_counter() - started
+            self._rows += 1
+        return row
+
+    def close(self):
+        if self._stats is not None:
+            self._finish()
+        super().close()
+
+    def __del__(self):
+        if self._stats is not None:
+            try:
+                self._finish()
+            except Exception:
+                pass
+
+
+class TracedConnection(Connection):
+    # Connection.execute() and executemany() make their cursor without going
+    # through cursor(), so they are routed explicitly.
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return sqlite3.Connection.cursor(self, TracedCursor).execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return sqlite3.Connection.cursor(self, TracedCursor).executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        if not self.in_transaction:
+            return super().commit()
+        started = time.perf_counter()
+        super().commit()
+        TRACER.commits.observe(time.perf_counter() - started)
+
+
+def connect(db_path: Path, *, read_only: bool = False, check_same_thread: bool = True) -> sqlite3.Connection:
+    # Tracing is read per call so it can be switched off for a run.
+    factory = TracedConnection if tracing.ENABLED else Connection
+    if read_only:
+        uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, factory=factory, check_same_thread=check_same_thread)
+    else:
+        conn = sqlite3.connect(str(db_path), factory=factory, check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON;")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS};")
+    if not read_only:
+        # WAL is persistent in the file, so readers opened later inherit it.
+        conn.execute("PRAGMA journal_mode = WAL;")
+    conn.execute("PRAGMA synchronous = NORMAL;")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE};")
     return conn
 
 
-def init_db(conn: sqlite3.Connection) -> None:
-    for stmt in SCHEMA_SQL:
-        conn.execute(stmt)
-    conn.commit()
+@dataclass
+class LockStats:
+    waits: int = 0
+    total_wait_s: float = 0.0
+    max_wait_s: float = 0.0
+
+    def as_dict(self) -> dict[str, float]:
+        return {
+            "waits": self.waits,
+            "total_wait_ms": round(self.total_wait_s * 1000, 3),
+            "max_wait_ms": round(self.max_wait_s * 1000, 3),
+            "avg_wait_ms": round(self.total_wait_s * 1000 / self.waits, 3) if self.waits else 0.0,
+        }
+
+
+class ConnectionManager:
+    # One read/write connection per thread, plus a small pool of read-only
+    # connections for reporting. Both WAL readers and the writer can run at
+    # the same time, so reports never block saves.
+
+    def __init__(self, db_path: Path, *, readers: int = 4):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all: list[sqlite3.Connection] = []
+        self._readers: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._reader_slots = threading.BoundedSemaphore(readers)
+        self._lock_stats = LockStats()
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.db_path)
+            self._local.conn = conn
+            with self._lock:
+                self._all.append(conn)
+        return conn
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        self._reader_slots.acquire()
+        try:
+            try:
+                conn = self._readers.get_nowait()
+            except queue.Empty:
+                # Pooled readers move between threads, one holder at a time.
+                conn = connect(self.db_path, read_only=True, check_same_thread=False)
+                with self._lock:
+                    self._all.append(conn)
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._readers.put(conn)
+        finally:
+            self._reader_slots.release()
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        # Takes the write lock up front so the wait is measured here rather
+        # than surfacing as "database is locked" halfway through a transaction.
+        # Repo functions commit on their own; anything left open is committed.
+        conn = self.connection()
+        started = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        self._record_lock_wait(time.perf_counter() - started)
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        if conn.in_transaction:
+            conn.commit()
+
+    def _record_lock_wait(self, waited: float) -> None:
+        with self._lock:
+            stats = self._lock_stats
+            stats.waits += 1
+            stats.total_wait_s += waited
+            stats.max_wait_s = max(stats.max_wait_s, waited)
+        if waited >= SLOW_LOCK_WAIT_S:
+            logger.warning("waited %.0f ms for the write lock on %s", waited * 1000, self.db_path)
+
+    def lock_stats(self) -> dict[str, float]:
+        with self._lock:
+            return self._lock_stats.as_dict()
+
+    def close_thread_connection(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            if conn in self._all:
+                self._all.remove(conn)
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            conns, self._all = self._all, []
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                # Per-thread connections can only be closed from their own
+                # thread; they are released when that thread exits.
+                pass
+        self._local = threading.local()
+        self._readers = queue.LifoQueue()
+
+
+def init_db(conn: sqlite3.Connection, backups_dir: Optional[Path] = None) -> None:
+    # A single PRAGMA read when the schema is already current.
+    migrate(conn, backups_dir=backups_dir)
 
 
 def exec_many(conn: sqlite3.Connection, statements: Iterable[str]) -> None:
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
-from .tui.app import SupplementsTUI
-
 
 def main() -> None:
+    # Imported here so importing this module stays cheap; `python -m app`
+    # is the full command line.
+    from .tui.app import SupplementsTUI
+
     SupplementsTUI().run()
 
 
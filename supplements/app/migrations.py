@@ -0,0 +1,586 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional, Sequence
+
+from .services.backup import snapshot
+
+logger = logging.getLogger(__name__)
+
+# Rows touched per transaction by rewrite_in_chunks.
+CHUNK_SIZE = 5000
+
+# The schema as it stood before versioning; migration 1 creates it. Every
+# later change is a new Migration below, never an edit to this list.
+SCHEMA_SQL: list[str] = [
+    """
+    CREATE TABLE IF NOT EXISTS items (
+        id TEXT PRIMARY KEY,
+        name_display TEXT NOT NULL,
+        name_generic TEXT,
+        brand TEXT,
+        category TEXT NOT NULL CHECK (category IN ('rx','otc','supplement')),
+        form TEXT,
+        route TEXT,
+        notes TEXT,
+        status TEXT NOT NULL CHECK (status IN ('active','paused','stopped')),
+        start_date TEXT,
+        stop_date TEXT,
+        prescriber TEXT,
+        pharmacy TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS doses (
+        id TEXT PRIMARY KEY,
+        item_id TEXT NOT NULL,
+        amount REAL,
+        unit TEXT,
+        time_am INTEGER NOT NULL DEFAULT 0,
+        time_midday INTEGER NOT NULL DEFAULT 0,
+        time_pm INTEGER NOT NULL DEFAULT 0,
+        with_food INTEGER,
+        instructions TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        FOREIGN KEY (item_id) REFERENCES items(id) ON DELETE CASCADE
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS history (
+        id TEXT PRIMARY KEY,
+        ts TEXT NOT NULL,
+        item_id TEXT NOT NULL,
+        action TEXT NOT NULL CHECK (action IN ('create','update','status_change')),
+        field TEXT,
+        old_value TEXT,
+        new_value TEXT,
+        note TEXT,
+        FOREIGN KEY (item_id) REFERENCES items(id) ON DELETE CASCADE
+    );
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_items_status ON items(status);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_items_category ON items(category);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_history_item_ts ON history(item_id, ts);
+    """,
+]
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    # DDL, run inside the migration's transaction. Must be safe to re-run:
+    # an interrupted backfill means apply() runs again on the next start.
+    apply: Callable[[sqlite3.Connection], None]
+    # Optional data rewrite, run after apply() commits, in chunks with their
+    # own short transactions. user_version is only bumped once it finishes.
+    backfill: Optional[Callable[[sqlite3.Connection], None]] = None
+
+
+def run_statements(statements: Sequence[str]) -> Callable[[sqlite3.Connection], None]:
+    def apply(conn: sqlite3.Connection) -> None:
+        for stmt in statements:
+            conn.execute(stmt)
+
+    return apply
+
+
+def column_names(conn: sqlite3.Connection, table: str) -> set[str]:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def add_column(conn: sqlite3.Connection, table: str, column: str, decl: str) -> None:
+    # ALTER TABLE ADD COLUMN has no IF NOT EXISTS.
+    if column not in column_names(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def run_in_chunks(
+    conn: sqlite3.Connection,
+    table: str,
+    sql: str,
+    *,
+    params: Sequence = (),
+    chunk_size: int = CHUNK_SIZE,
+) -> int:
+    # Runs `sql` once per rowid range of `table`, each in its own transaction,
+    # so the write lock is released between chunks and the app stays usable.
+    # The range is bound as the first two parameters (lo inclusive, hi
+    # exclusive), followed by `params`. Returns the total rowcount.
+    row = conn.execute(f"SELECT min(rowid), max(rowid) FROM {table}").fetchone()
+    if row[0] is None:
+        return 0
+
+    lo, hi = row[0], row[1]
+    changed = 0
+    start = lo
+    while start <= hi:
+        end = start + chunk_size
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cur = conn.execute(sql, (start, end, *params))
+            changed += max(cur.rowcount, 0)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        start = end
+    return changed
+
+
+def rewrite_in_chunks(
+    conn: sqlite3.Connection,
+    table: str,
+    set_sql: str,
+    *,
+    where: str = "1",
+    params: Sequence = (),
+    chunk_size: int = CHUNK_SIZE,
+) -> int:
+    # UPDATE table SET <set_sql> WHERE <where>, chunked by rowid. `where`
+    # should exclude rows that are already rewritten so an interrupted run
+    # can simply be repeated.
+    return run_in_chunks(
+        conn,
+        table,
+        f"UPDATE {table} SET {set_sql} WHERE rowid >= ? AND rowid < ? AND ({where})",
+        params=params,
+        chunk_size=chunk_size,
+    )
+
+
+# External-content FTS5 index over the searchable item text. status is
+# indexed as well so a per-tab search narrows the match set inside the index
+# instead of ranking every item. The index keys on items.rowid;
+# repo.rebuild_search_index re-derives it if that ever drifts (VACUUM may
+# renumber rowids of tables without an INTEGER PRIMARY KEY).
+_ITEMS_FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+        name_display, name_generic, brand, notes, status,
+        content = 'items',
+        content_rowid = 'rowid',
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_ai AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts (rowid, name_display, name_generic, brand, notes, status)
+        VALUES (new.rowid, new.name_display, new.name_generic, new.brand, new.notes, new.status);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_ad AFTER DELETE ON items BEGIN
+        INSERT INTO items_fts (items_fts, rowid, name_display, name_generic, brand, notes, status)
+        VALUES ('delete', old.rowid, old.name_display, old.name_generic, old.brand, old.notes, old.status);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_au AFTER UPDATE OF name_display, name_generic, brand, notes, status ON items BEGIN
+        INSERT INTO items_fts (items_fts, rowid, name_display, name_generic, brand, notes, status)
+        VALUES ('delete', old.rowid, old.name_display, old.name_generic, old.brand, old.notes, old.status);
+        INSERT INTO items_fts (rowid, name_display, name_generic, brand, notes, status)
+        VALUES (new.rowid, new.name_display, new.name_generic, new.brand, new.notes, new.status);
+    END
+    """,
+    # Indexes the existing rows in the same transaction that creates the
+    # triggers, so no write can land between the two and be indexed twice
+    # or not at all. A rerun after an interruption starts over.
+    "INSERT INTO items_fts (items_fts) VALUES ('rebuild')",
+]
+
+
+def _add_item_sort_key(conn: sqlite3.Connection) -> None:
+    # The list order (rx, then otc, then everything else; by name) as one
+    # indexable value. VIRTUAL, so adding it does not rewrite the table; the
+    # index stores the computed keys.
+    add_column(
+        conn,
+        "items",
+        "sort_key",
+        """TEXT GENERATED ALWAYS AS (
+            CASE category WHEN 'rx' THEN '1' WHEN 'otc' THEN '2' ELSE '3' END || lower(name_display)
+        ) VIRTUAL""",
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_items_status_sort ON items(status, sort_key, id)")
+    # Every status lookup can use the new index's prefix.
+    conn.execute("DROP INDEX IF EXISTS idx_items_status")
+
+
+# The daily schedule, materialized: one row per (time slot, dose) of every
+# active item, slot 1 AM, 2 Midday, 3 PM. The display columns are copied
+# in and the primary key is the display order, so the schedule is read from
+# this table alone without a join or a sort. Only the triggers below write
+# to it; each rebuilds the rows of the dose or item that changed.
+SCHEDULE_COLUMNS = (
+    "slot, sort_key, dose_id, item_id, name_display, category, brand, amount, unit, with_food, instructions"
+)
+
+# Every use narrows this by a dose, an item or a rowid range; CROSS JOIN and
+# the unary + keep the planner on those keys rather than the status index.
+_SCHEDULE_SELECT = """
+    SELECT s.slot, i.sort_key, d.id, i.id, i.name_display, i.category, i.brand,
+           d.amount, d.unit, d.with_food, d.instructions
+    FROM items i
+    JOIN doses d ON d.item_id = i.id
+    CROSS JOIN (SELECT 1 AS slot UNION ALL SELECT 2 UNION ALL SELECT 3) s
+      ON (s.slot = 1 AND d.time_am) OR (s.slot = 2 AND d.time_midday) OR (s.slot = 3 AND d.time_pm)
+    WHERE +i.status = 'active'
+"""
+
+_SCHEDULE_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS schedule (
+        slot INTEGER NOT NULL,
+        sort_key TEXT NOT NULL,
+        dose_id TEXT NOT NULL,
+        item_id TEXT NOT NULL,
+        name_display TEXT NOT NULL,
+        category TEXT NOT NULL,
+        brand TEXT,
+        amount REAL,
+        unit TEXT,
+        with_food INTEGER,
+        instructions TEXT,
+        PRIMARY KEY (slot, sort_key, dose_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_schedule_dose ON schedule(dose_id)",
+    "CREATE INDEX IF NOT EXISTS idx_schedule_item ON schedule(item_id)",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS schedule_doses_ai AFTER INSERT ON doses BEGIN
+        INSERT INTO schedule ({SCHEDULE_COLUMNS}) {_SCHEDULE_SELECT} AND d.id = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS schedule_doses_au
+    AFTER UPDATE OF item_id, amount, unit, time_am, time_midday, time_pm, with_food, instructions ON doses BEGIN
+        DELETE FROM schedule WHERE dose_id = old.id;
+        INSERT INTO schedule ({SCHEDULE_COLUMNS}) {_SCHEDULE_SELECT} AND d.id = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS schedule_doses_ad AFTER DELETE ON doses BEGIN
+        DELETE FROM schedule WHERE dose_id = old.id;
+    END
+    """,
+    # Item edits rewrite every column, so only real changes rebuild its rows.
+    f"""
+    CREATE TRIGGER IF NOT EXISTS schedule_items_au AFTER UPDATE OF status, name_display, category, brand ON items
+    WHEN old.status IS NOT new.status OR old.name_display IS NOT new.name_display
+        OR old.category IS NOT new.category OR old.brand IS NOT new.brand
+    BEGIN
+        DELETE FROM schedule WHERE item_id = old.id;
+        INSERT INTO schedule ({SCHEDULE_COLUMNS}) {_SCHEDULE_SELECT} AND i.id = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS schedule_items_ad AFTER DELETE ON items BEGIN
+        DELETE FROM schedule WHERE item_id = old.id;
+    END
+    """,
+]
+
+
+def _backfill_schedule(conn: sqlite3.Connection) -> None:
+    # Starts empty, then fills by item rowid range. The triggers are live
+    # between chunks, which is safe here: each chunk reads the items as they
+    # are now, and OR REPLACE makes a row a trigger already wrote harmless.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM schedule")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    run_in_chunks(
+        conn,
+        "items",
+        f"INSERT OR REPLACE INTO schedule ({SCHEDULE_COLUMNS}) {_SCHEDULE_SELECT} AND i.rowid >= ? AND i.rowid < ?",
+    )
+
+
+# Intake events are append-only; the rollups are kept by triggers so that
+# adherence over a date range reads one row per item-day or item-week.
+# Weeks start on Monday and are keyed by that date.
+_INTAKE_WEEK = "date(new.day, 'weekday 0', '-6 days')"
+
+_INTAKE_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS intake_events (
+        id INTEGER PRIMARY KEY,
+        item_id TEXT NOT NULL,
+        dose_id TEXT,
+        slot INTEGER,
+        day TEXT NOT NULL,
+        taken_at TEXT NOT NULL,
+        status TEXT NOT NULL CHECK (status IN ('taken', 'skipped')),
+        FOREIGN KEY (item_id) REFERENCES items(id) ON DELETE CASCADE
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_intake_item_day ON intake_events(item_id, day)",
+    "CREATE INDEX IF NOT EXISTS idx_intake_day ON intake_events(day, dose_id, slot)",
+    """
+    CREATE TABLE IF NOT EXISTS intake_daily (
+        item_id TEXT NOT NULL,
+        day TEXT NOT NULL,
+        taken INTEGER NOT NULL DEFAULT 0,
+        skipped INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (item_id, day)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_intake_daily_day ON intake_daily(day)",
+    """
+    CREATE TABLE IF NOT EXISTS intake_weekly (
+        item_id TEXT NOT NULL,
+        week TEXT NOT NULL,
+        taken INTEGER NOT NULL DEFAULT 0,
+        skipped INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (item_id, week)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_intake_weekly_week ON intake_weekly(week)",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS intake_events_ai AFTER INSERT ON intake_events BEGIN
+        INSERT INTO intake_daily (item_id, day, taken, skipped)
+        VALUES (new.item_id, new.day, new.status = 'taken', new.status = 'skipped')
+        ON CONFLICT (item_id, day) DO UPDATE
+        SET taken = taken + excluded.taken, skipped = skipped + excluded.skipped;
+        INSERT INTO intake_weekly (item_id, week, taken, skipped)
+        VALUES (new.item_id, {_INTAKE_WEEK}, new.status = 'taken', new.status = 'skipped')
+        ON CONFLICT (item_id, week) DO UPDATE
+        SET taken = taken + excluded.taken, skipped = skipped + excluded.skipped;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS intake_events_ad AFTER DELETE ON intake_events BEGIN
+        UPDATE intake_daily
+        SET taken = taken - (old.status = 'taken'), skipped = skipped - (old.status = 'skipped')
+        WHERE item_id = old.item_id AND day = old.day;
+        UPDATE intake_weekly
+        SET taken = taken - (old.status = 'taken'), skipped = skipped - (old.status = 'skipped')
+        WHERE item_id = old.item_id AND week = {_INTAKE_WEEK.replace("new.", "old.")};
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS intake_items_ad AFTER DELETE ON items BEGIN
+        DELETE FROM intake_daily WHERE item_id = old.id;
+        DELETE FROM intake_weekly WHERE item_id = old.id;
+    END
+    """,
+]
+
+
+# Change feed: one row per item with the sequence number of its latest
+# change to the item or any of its doses. Readers in any process remember
+# the highest seq they have applied and ask for the items past it; deleted
+# items keep their row so readers learn to drop them. The table never holds
+# more rows than there have been items, so nothing needs pruning.
+_CHANGE_SEQ = "(SELECT coalesce(max(seq), 0) + 1 FROM changes)"
+
+_CHANGES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS changes (
+        item_id TEXT PRIMARY KEY,
+        seq INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_changes_seq ON changes(seq)",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS changes_items_ai AFTER INSERT ON items BEGIN
+        INSERT OR REPLACE INTO changes (item_id, seq) VALUES (new.id, {_CHANGE_SEQ});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS changes_items_au AFTER UPDATE ON items BEGIN
+        INSERT OR REPLACE INTO changes (item_id, seq) VALUES (new.id, {_CHANGE_SEQ});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS changes_items_ad AFTER DELETE ON items BEGIN
+        INSERT OR REPLACE INTO changes (item_id, seq) VALUES (old.id, {_CHANGE_SEQ});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS changes_doses_ai AFTER INSERT ON doses BEGIN
+        INSERT OR REPLACE INTO changes (item_id, seq) VALUES (new.item_id, {_CHANGE_SEQ});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS changes_doses_au AFTER UPDATE ON doses BEGIN
+        INSERT OR REPLACE INTO changes (item_id, seq) VALUES (new.item_id, {_CHANGE_SEQ});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS changes_doses_ad AFTER DELETE ON doses BEGIN
+        INSERT OR REPLACE INTO changes (item_id, seq) VALUES (old.item_id, {_CHANGE_SEQ});
+    END
+    """,
+]
+
+
+
+# Marking a dose and slot again on the same day replaces the earlier mark,
+# as get_intake_for_day shows it, so the rollups count only the latest event
+# per (item, day, dose, slot). The insert trigger takes back the mark the
+# new event replaces; deleting the latest event restores the one before it.
+def _previous_mark(row: str) -> str:
+    # Status of the latest event before `row` (new or old) for the same key,
+    # '' if there is none.
+    return f"""coalesce((
+        SELECT status FROM intake_events
+        WHERE item_id = {row}.item_id AND day = {row}.day AND dose_id IS {row}.dose_id AND slot IS {row}.slot
+          AND id < {row}.id
+        ORDER BY id DESC LIMIT 1
+    ), '')"""
+
+
+_LATEST_INTAKE = """
+    SELECT item_id, day, status FROM (
+        SELECT item_id, day, status,
+               row_number() OVER (PARTITION BY item_id, day, dose_id, slot ORDER BY id DESC) AS n
+        FROM intake_events
+    ) WHERE n = 1
+"""
+
+# Each rollup row changes by the new mark minus the one it replaces. The
+# previous mark is looked up once per statement, hence INSERT ... SELECT
+# (WHERE true lets the parser tell ON CONFLICT from a join constraint).
+_INTAKE_LATEST_SQL = [
+    # Finds the previous mark; its (item_id, day) prefix serves what the
+    # index it replaces did.
+    "CREATE INDEX IF NOT EXISTS idx_intake_mark ON intake_events(item_id, day, dose_id, slot)",
+    "DROP INDEX IF EXISTS idx_intake_item_day",
+    "DROP TRIGGER IF EXISTS intake_events_ai",
+    "DROP TRIGGER IF EXISTS intake_events_ad",
+    f"""
+    CREATE TRIGGER intake_events_ai AFTER INSERT ON intake_events BEGIN
+        INSERT INTO intake_daily (item_id, day, taken, skipped)
+        SELECT new.item_id, new.day, (new.status = 'taken') - (prev = 'taken'), (new.status = 'skipped') - (prev = 'skipped')
+        FROM (SELECT {_previous_mark("new")} AS prev) WHERE true
+        ON CONFLICT (item_id, day) DO UPDATE
+        SET taken = taken + excluded.taken, skipped = skipped + excluded.skipped;
+        INSERT INTO intake_weekly (item_id, week, taken, skipped)
+        SELECT new.item_id, {_INTAKE_WEEK}, (new.status = 'taken') - (prev = 'taken'), (new.status = 'skipped') - (prev = 'skipped')
+        FROM (SELECT {_previous_mark("new")} AS prev) WHERE true
+        ON CONFLICT (item_id, week) DO UPDATE
+        SET taken = taken + excluded.taken, skipped = skipped + excluded.skipped;
+    END
+    """,
+    f"""
+    CREATE TRIGGER intake_events_ad AFTER DELETE ON intake_events
+    WHEN NOT EXISTS (
+        SELECT 1 FROM intake_events
+        WHERE item_id = old.item_id AND day = old.day AND dose_id IS old.dose_id AND slot IS old.slot
+          AND id > old.id
+    )
+    BEGIN
+        UPDATE intake_daily
+        SET taken = taken - (old.status = 'taken') + (prev = 'taken'),
+            skipped = skipped - (old.status = 'skipped') + (prev = 'skipped')
+        FROM (SELECT {_previous_mark("old")} AS prev)
+        WHERE item_id = old.item_id AND day = old.day;
+        UPDATE intake_weekly
+        SET taken = taken - (old.status = 'taken') + (prev = 'taken'),
+            skipped = skipped - (old.status = 'skipped') + (prev = 'skipped')
+        FROM (SELECT {_previous_mark("old")} AS prev)
+        WHERE item_id = old.item_id AND week = {_INTAKE_WEEK.replace("new.", "old.")};
+    END
+    """,
+    # Recount what the old triggers added up, in this transaction so no
+    # event is counted twice or missed.
+    "DELETE FROM intake_daily",
+    "DELETE FROM intake_weekly",
+    f"""
+    INSERT INTO intake_daily (item_id, day, taken, skipped)
+    SELECT item_id, day, sum(status = 'taken'), sum(status = 'skipped')
+    FROM ({_LATEST_INTAKE})
+    GROUP BY item_id, day
+    """,
+    f"""
+    INSERT INTO intake_weekly (item_id, week, taken, skipped)
+    SELECT item_id, date(day, 'weekday 0', '-6 days'), sum(status = 'taken'), sum(status = 'skipped')
+    FROM ({_LATEST_INTAKE})
+    GROUP BY item_id, date(day, 'weekday 0', '-6 days')
+    """,
+]
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "baseline schema", run_statements(SCHEMA_SQL)),
+    Migration(
+        2,
+        "indexes for incremental refresh, dose lookups and history keyset paging",
+        run_statements(
+            [
+                "CREATE INDEX IF NOT EXISTS idx_items_updated_at ON items(updated_at)",
+                "CREATE INDEX IF NOT EXISTS idx_doses_item ON doses(item_id)",
+                "DROP INDEX IF EXISTS idx_history_item_ts",
+                "CREATE INDEX IF NOT EXISTS idx_history_item_ts_id ON history(item_id, ts, id)",
+                "CREATE INDEX IF NOT EXISTS idx_history_ts_id ON history(ts, id)",
+            ]
+        ),
+    ),
+    Migration(3, "full-text search index over items", run_statements(_ITEMS_FTS_SQL)),
+    Migration(4, "indexed sort key for item listings", _add_item_sort_key),
+    Migration(5, "materialized daily schedule", run_statements(_SCHEDULE_SQL), _backfill_schedule),
+    Migration(6, "intake event log with daily and weekly rollups", run_statements(_INTAKE_SQL)),
+    Migration(7, "change feed for cross-process refresh", run_statements(_CHANGES_SQL)),
+    Migration(8, "intake rollups count the latest mark per dose and slot", run_statements(_INTAKE_LATEST_SQL)),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _has_tables(conn: sqlite3.Connection) -> bool:
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' LIMIT 1").fetchone()
+    return row is not None
+
+
+def migrate(conn: sqlite3.Connection, *, backups_dir: Optional[Path] = None) -> int:
+    # Returns the schema version the database ended up at.
+    current = schema_version(conn)
+    if current >= LATEST_VERSION:
+        return current
+
+    # A database that predates versioning reports 0 but already has tables;
+    # back those up too. A brand new file has nothing worth copying.
+    if backups_dir is not None and (current > 0 or _has_tables(conn)):
+        entry = snapshot(conn, backups_dir, kind=f"pre-migrate-v{current}")
+        logger.info("backed up database to %s before migrating", entry.name)
+
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+        logger.info("migrating schema to v%d: %s", migration.version, migration.description)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migration.apply(conn)
+            if migration.backfill is None:
+                conn.execute(f"PRAGMA user_version = {migration.version}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        if migration.backfill is not None:
+            migration.backfill(conn)
+            conn.execute(f"PRAGMA user_version = {migration.version}")
+            conn.commit()
+        current = migration.version
+    return current
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from collections import namedtuple
+from dataclasses import dataclass, fields
 from typing import Optional
 
 
-@dataclass
+@dataclass(slots=True)
 class Item:
     id: str
     name_display: str
@@ -23,7 +24,7 @@ class Item:
     updated_at: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Dose:
     id: str
     item_id: str
@@ -38,7 +39,7 @@ class Dose:
     updated_at: str
 
 
-@dataclass
+@dataclass(slots=True)
 class HistoryEvent:
     id: str
     ts: str
@@ -48,3 +49,68 @@ class HistoryEvent:
     old_value: Optional[str]
     new_value: Optional[str]
     note: Optional[str]
+
+
+@dataclass(slots=True)
+class ScheduleEntry:
+    # A row of the materialized schedule table: one dose in one time slot.
+    slot: int  # 1 AM | 2 Midday | 3 PM
+    sort_key: str
+    dose_id: str
+    item_id: str
+    name_display: str
+    category: str
+    brand: Optional[str]
+    amount: Optional[float]
+    unit: Optional[str]
+    with_food: Optional[int]
+    instructions: Optional[str]
+
+
+@dataclass(slots=True)
+class IntakeEvent:
+    # One dose taken (or skipped). `day` is the local date it counts
+    # towards; taken_at is UTC like every other timestamp.
+    item_id: str
+    dose_id: Optional[str]
+    slot: Optional[int]  # 1 AM | 2 Midday | 3 PM; None when taken as needed
+    day: str
+    taken_at: str
+    status: str  # taken | skipped
+
+
+@dataclass(slots=True)
+class IntakeDay:
+    day: str
+    taken: int
+    skipped: int
+
+
+@dataclass(slots=True)
+class Adherence:
+    # Totals over an inclusive date range. `expected` counts the scheduled
+    # slots of the items in the current schedule, from the day each item
+    # was added.
+    start: str
+    end: str
+    taken: int
+    skipped: int
+    expected: int
+
+    @property
+    def percent(self) -> Optional[float]:
+        if not self.expected:
+            return None
+        return 100.0 * self.taken / self.expected
+
+
+# Tuple-backed, read-only stand-ins for Item and Dose with the same field
+# names, for listings that only display rows (see repo.list_items as_tuples).
+ITEM_FIELDS = tuple(f.name for f in fields(Item))
+DOSE_FIELDS = tuple(f.name for f in fields(Dose))
+HISTORY_FIELDS = tuple(f.name for f in fields(HistoryEvent))
+SCHEDULE_FIELDS = tuple(f.name for f in fields(ScheduleEntry))
+INTAKE_FIELDS = tuple(f.name for f in fields(IntakeEvent))
+
+ItemRow = namedtuple("ItemRow", ITEM_FIELDS)
+DoseRow = namedtuple("DoseRow", DOSE_FIELDS)
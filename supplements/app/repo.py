@@ -1,75 +1,399 @@
 from __future__ import annotations
 
+import json
+import re
 import sqlite3
-from datetime import datetime, timezone
-from typing import Optional
+import string
+import weakref
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from operator import attrgetter
+from typing import Any, Iterable, Iterator, Optional, Sequence, Union
 from uuid import uuid4
 
-from .models import Dose, HistoryEvent, Item
+from .models import (
+    DOSE_FIELDS,
+    HISTORY_FIELDS,
+    INTAKE_FIELDS,
+    ITEM_FIELDS,
+    SCHEDULE_FIELDS,
+    Adherence,
+    Dose,
+    DoseRow,
+    HistoryEvent,
+    IntakeDay,
+    IntakeEvent,
+    Item,
+    ItemRow,
+    ScheduleEntry,
+)
+
+# Listing rows: one per item with all of its doses, dataclasses by default
+# and namedtuples with as_tuples=True.
+ItemWithDoses = Union[tuple[Item, list[Dose]], tuple[ItemRow, tuple[DoseRow, ...]]]
 
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
 
 
-def list_items(conn: sqlite3.Connection, status: str) -> list[tuple[Item, Optional[Dose]]]:
-    rows = conn.execute(
-        """
-        SELECT
-            i.*,
-            d.id AS d_id, d.item_id AS d_item_id, d.amount AS d_amount, d.unit AS d_unit,
-            d.time_am AS d_time_am, d.time_midday AS d_time_midday, d.time_pm AS d_time_pm,
-            d.with_food AS d_with_food, d.instructions AS d_instructions,
-            d.created_at AS d_created_at, d.updated_at AS d_updated_at
+# Column lists follow the model field order so rows map positionally.
+_ITEM_COLUMNS = ", ".join(f"i.{name}" for name in ITEM_FIELDS)
+_HISTORY_COLUMNS = ", ".join(HISTORY_FIELDS)
+_SCHEDULE_COLUMNS = ", ".join(SCHEDULE_FIELDS)
+_INTAKE_COLUMNS = ", ".join(INTAKE_FIELDS)
+_ITEM_WIDTH = len(ITEM_FIELDS)
+
+# Doses in display order: by their first time slot, then as added.
+_DOSE_ORDER = "time_am DESC, time_midday DESC, time_pm DESC, created_at, id"
+# An item's doses come back in its own row as a JSON array of arrays in
+# DOSE_FIELDS order, so listings read one row per item instead of one per
+# dose. The correlated subquery is an idx_doses_item lookup per item.
+_DOSES_JSON = f"""(
+    SELECT json_group_array(json_array({", ".join(DOSE_FIELDS)}))
+    FROM (SELECT * FROM doses WHERE item_id = i.id ORDER BY {_DOSE_ORDER})
+)"""
+_ITEM_DOSES_COLUMNS = f"{_ITEM_COLUMNS}, {_DOSES_JSON}"
+
+
+@dataclass
+class _Generation:
+    data_version: int
+    value: int = 0
+
+
+_GENERATIONS: "weakref.WeakKeyDictionary[sqlite3.Connection, _Generation]" = weakref.WeakKeyDictionary()
+
+
+def _generation(conn: sqlite3.Connection) -> Optional[_Generation]:
+    try:
+        gen = _GENERATIONS.get(conn)
+    except TypeError:
+        # Plain sqlite3.Connection objects (not from db.connect) are not tracked.
+        return None
+
+    # data_version only moves when another connection commits, so our own
+    # writes are counted by _bump_generation instead.
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if gen is None:
+        gen = _Generation(data_version=version)
+        _GENERATIONS[conn] = gen
+    elif gen.data_version != version:
+        gen.data_version = version
+        gen.value += 1
+    return gen
+
+
+def _bump_generation(conn: sqlite3.Connection) -> None:
+    try:
+        gen = _GENERATIONS.get(conn)
+    except TypeError:
+        return
+    if gen is not None:
+        gen.value += 1
+
+
+# Changes whenever anything this connection could read may have changed: a
+# commit from another connection or a write through the repo functions on
+# this one. None if the connection is not tracked.
+def data_generation(conn: sqlite3.Connection) -> Optional[int]:
+    gen = _generation(conn)
+    return None if gen is None else gen.value
+
+
+# Row factories, set per cursor: rows are sliced by position straight into
+# the models instead of going through sqlite3.Row name lookups.
+def _dose_lists(raw: str) -> list[list]:
+    return [] if raw == "[]" else json.loads(raw)
+
+
+def _item_doses_row(cursor: sqlite3.Cursor, row: tuple) -> tuple[Item, list[Dose]]:
+    return Item(*row[:_ITEM_WIDTH]), [Dose(*values) for values in _dose_lists(row[_ITEM_WIDTH])]
+
+
+# Low-cardinality columns whose values are shared between rows in compact
+# listings (every row otherwise holds its own copy of e.g. "supplement").
+_SHARED_ITEM_COLUMNS = tuple(
+    ITEM_FIELDS.index(name) for name in ("category", "status", "form", "route", "brand", "created_at", "updated_at")
+)
+_SHARED_DOSE_COLUMNS = tuple(DOSE_FIELDS.index(name) for name in ("unit", "created_at", "updated_at"))
+
+
+def _compact_item_doses_rows() -> Any:
+    # Row factory for as_tuples listings: namedtuples instead of dataclasses,
+    # with repeated strings stored once per query. Used for large read-only
+    # lists such as the cached list screens.
+    shared: dict[str, str] = {}
+    share = shared.setdefault
+    make_item = ItemRow._make
+    make_dose = DoseRow._make
+
+    def factory(cursor: sqlite3.Cursor, row: tuple) -> tuple[ItemRow, tuple[DoseRow, ...]]:
+        item = list(row[:_ITEM_WIDTH])
+        for i in _SHARED_ITEM_COLUMNS:
+            value = item[i]
+            if value is not None:
+                item[i] = share(value, value)
+        doses = _dose_lists(row[_ITEM_WIDTH])
+        for dose in doses:
+            for i in _SHARED_DOSE_COLUMNS:
+                value = dose[i]
+                if value is not None:
+                    dose[i] = share(value, value)
+        return make_item(item), tuple(map(make_dose, doses))
+
+    return factory
+
+
+def _history_row(cursor: sqlite3.Cursor, row: tuple) -> HistoryEvent:
+    return HistoryEvent(*row)
+
+
+def _schedule_row(cursor: sqlite3.Cursor, row: tuple) -> ScheduleEntry:
+    return ScheduleEntry(*row)
+
+
+def _query(conn: sqlite3.Connection, row_factory: Any, sql: str, params: Iterable = ()) -> sqlite3.Cursor:
+    cur = conn.cursor()
+    cur.row_factory = row_factory
+    return cur.execute(sql, tuple(params))
+
+
+def list_items(conn: sqlite3.Connection, status: str, *, as_tuples: bool = False) -> list[ItemWithDoses]:
+    # as_tuples returns ItemRow/DoseRow namedtuples with the same fields,
+    # read-only and sharing repeated strings: about half the memory for
+    # display-only listings, at a slightly higher build cost.
+    return _query(
+        conn,
+        _compact_item_doses_rows() if as_tuples else _item_doses_row,
+        f"""
+        SELECT {_ITEM_DOSES_COLUMNS}
         FROM items i
-        LEFT JOIN doses d ON d.item_id = i.id
         WHERE i.status = ?
-        ORDER BY
-            CASE i.category WHEN 'rx' THEN 1 WHEN 'otc' THEN 2 ELSE 3 END,
-            lower(i.name_display) ASC
+        ORDER BY i.sort_key, i.id
         """,
         (status,),
     ).fetchall()
 
-    out: list[tuple[Item, Optional[Dose]]] = []
-    for r in rows:
-        item = Item(
-            id=r["id"],
-            name_display=r["name_display"],
-            name_generic=r["name_generic"],
-            brand=r["brand"],
-            category=r["category"],
-            form=r["form"],
-            route=r["route"],
-            notes=r["notes"],
-            status=r["status"],
-            start_date=r["start_date"],
-            stop_date=r["stop_date"],
-            prescriber=r["prescriber"],
-            pharmacy=r["pharmacy"],
-            created_at=r["created_at"],
-            updated_at=r["updated_at"],
-        )
 
-        dose: Optional[Dose] = None
-        if r["d_id"] is not None:
-            dose = Dose(
-                id=r["d_id"],
-                item_id=r["d_item_id"],
-                amount=r["d_amount"],
-                unit=r["d_unit"],
-                time_am=int(r["d_time_am"] or 0),
-                time_midday=int(r["d_time_midday"] or 0),
-                time_pm=int(r["d_time_pm"] or 0),
-                with_food=r["d_with_food"],
-                instructions=r["d_instructions"],
-                created_at=r["d_created_at"],
-                updated_at=r["d_updated_at"],
-            )
+# Position in a status listing: (items.sort_key, items.id) of the last row.
+ItemCursor = tuple[str, str]
+
+_CATEGORY_RANK = {"rx": "1", "otc": "2"}
+# SQLite's lower() folds ASCII letters only.
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def item_sort_key(category: str, name_display: str) -> str:
+    # The items.sort_key generated column, computed in Python. With the id it
+    # is the list order; Python compares str by code point, which is the
+    # order SQLite compares the UTF-8 bytes in.
+    return _CATEGORY_RANK.get(category, "3") + name_display.translate(_ASCII_LOWER)
+
+
+def get_items_page(
+    conn: sqlite3.Connection,
+    status: str,
+    *,
+    after: Optional[ItemCursor] = None,
+    limit: int = 200,
+    as_tuples: bool = False,
+) -> tuple[list[ItemWithDoses], Optional[ItemCursor]]:
+    # One window of list_items order, read by seeking idx_items_status_sort
+    # past `after`: no OFFSET, no sort, and nothing beyond the window is read.
+    # The returned cursor is None once the listing is exhausted.
+    base = _compact_item_doses_rows() if as_tuples else _item_doses_row
+
+    def factory(cursor: sqlite3.Cursor, row: tuple) -> tuple[ItemCursor, ItemWithDoses]:
+        return (row[-1], row[0]), base(cursor, row[:-1])
+
+    where = "i.status = ?"
+    params: list[object] = [status]
+    if after is not None:
+        where += " AND (i.sort_key, i.id) > (?, ?)"
+        params.extend(after)
+
+    rows = _query(
+        conn,
+        factory,
+        f"""
+        SELECT {_ITEM_DOSES_COLUMNS}, i.sort_key
+        FROM items i
+        WHERE {where}
+        ORDER BY i.sort_key, i.id
+        LIMIT ?
+        """,
+        (*params, limit),
+    ).fetchall()
+
+    next_cursor = rows[-1][0] if len(rows) == limit else None
+    return [r for _, r in rows], next_cursor
 
-        out.append((item, dose))
 
-    return out
+def get_page_items(
+    conn: sqlite3.Connection,
+    status: str,
+    ids: Sequence[str],
+    *,
+    after: Optional[ItemCursor] = None,
+    until: Optional[ItemCursor] = None,
+    as_tuples: bool = False,
+) -> list[ItemWithDoses]:
+    # Those of `ids` that are on the get_items_page window between `after`
+    # and `until` (its last row, inclusive; None for the last window). One
+    # primary key lookup per id.
+    where = f"i.id IN ({', '.join('?' * len(ids))}) AND i.status = ?"
+    params: list[object] = [*ids, status]
+    if after is not None:
+        where += " AND (i.sort_key, i.id) > (?, ?)"
+        params.extend(after)
+    if until is not None:
+        where += " AND (i.sort_key, i.id) <= (?, ?)"
+        params.extend(until)
+    return _query(
+        conn,
+        _compact_item_doses_rows() if as_tuples else _item_doses_row,
+        f"SELECT {_ITEM_DOSES_COLUMNS} FROM items i WHERE {where}",
+        params,
+    ).fetchall()
+
+
+def iter_items(conn: sqlite3.Connection, status: str, *, as_tuples: bool = False) -> Iterator[ItemWithDoses]:
+    # Same rows and order as list_items, read lazily from the cursor for
+    # consumers that write them straight out (exports).
+    return _query(
+        conn,
+        _compact_item_doses_rows() if as_tuples else _item_doses_row,
+        f"""
+        SELECT {_ITEM_DOSES_COLUMNS}
+        FROM items i
+        WHERE i.status = ?
+        ORDER BY i.sort_key, i.id
+        """,
+        (status,),
+    )
+
+
+def count_items(conn: sqlite3.Connection) -> dict[str, int]:
+    rows = conn.execute("SELECT status, count(*) FROM items GROUP BY status")
+    return {r[0]: r[1] for r in rows}
+
+
+def data_stamp(conn: sqlite3.Connection) -> str:
+    # Changes with every write the repo makes: each one adds a history row
+    # (rowids only grow) and bumps items.updated_at. Both reads are O(log n).
+    history_rowid = conn.execute("SELECT max(rowid) FROM history").fetchone()[0] or 0
+    return f"{history_rowid}:{max_updated_at(conn)}"
+
+
+def change_seq(conn: sqlite3.Connection) -> int:
+    # Position of the newest change in the feed; 0 before the first.
+    return conn.execute("SELECT coalesce(max(seq), 0) FROM changes").fetchone()[0]
+
+
+def get_changes(conn: sqlite3.Connection, since: int, *, limit: int = -1) -> tuple[list[str], int]:
+    # Ids of the items changed after `since`, oldest change first, and the
+    # seq to pass next time. An item changed several times appears once.
+    rows = conn.execute(
+        "SELECT item_id, seq FROM changes WHERE seq > ? ORDER BY seq LIMIT ?",
+        (since, limit),
+    ).fetchall()
+    return [r[0] for r in rows], rows[-1][1] if rows else since
+
+
+def get_changed_items(
+    conn: sqlite3.Connection, since: int
+) -> tuple[list[tuple[Item, list[Dose]]], list[str], int]:
+    # The current state of every item changed after `since`, the ids of
+    # those since deleted, and the seq to pass next time.
+    ids, seq = get_changes(conn, since)
+    if not ids:
+        return [], [], seq
+    items = _query(
+        conn,
+        _item_doses_row,
+        f"""
+        SELECT {_ITEM_DOSES_COLUMNS}
+        FROM items i
+        WHERE i.id IN (SELECT item_id FROM changes WHERE seq > ? AND seq <= ?)
+        """,
+        (since, seq),
+    ).fetchall()
+    found = {item.id for item, _ in items}
+    return items, [item_id for item_id in ids if item_id not in found], seq
+
+
+def max_updated_at(conn: sqlite3.Connection) -> str:
+    row = conn.execute("SELECT max(updated_at) FROM items").fetchone()
+    return row[0] or ""
+
+
+# bm25 column weights for items_fts: name_display, name_generic, brand,
+# notes, status (status is only there for filtering).
+_SEARCH_WEIGHTS = (10.0, 6.0, 3.0, 1.0, 0.0)
+
+_SEARCH_COLUMNS = "{name_display name_generic brand notes}"
+
+_SEARCH_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def search_match_expression(text: str, status: Optional[str] = None) -> str:
+    # Every word must match, each as a prefix: "vit d" -> "vit"* "d"*.
+    # Quoting keeps FTS5 operators and punctuation in user input inert.
+    tokens = _SEARCH_TOKEN.findall(text)
+    if not tokens:
+        return ""
+    expression = f"{_SEARCH_COLUMNS} : (" + " ".join(f'"{token}"*' for token in tokens) + ")"
+    if status is not None:
+        expression = f'status : "{status}" AND {expression}'
+    return expression
+
+
+def search_items(
+    conn: sqlite3.Connection,
+    text: str,
+    *,
+    status: Optional[str] = None,
+    limit: int = 200,
+) -> list[tuple[Item, list[Dose]]]:
+    # Best matches first (bm25, name hits weigh most). The status filter is
+    # part of the MATCH, so only that tab's items are ranked.
+    expression = search_match_expression(text, status)
+    if not expression:
+        return []
+
+    weights = ", ".join(str(w) for w in _SEARCH_WEIGHTS)
+    return _query(
+        conn,
+        _item_doses_row,
+        f"""
+        SELECT {_ITEM_DOSES_COLUMNS}
+        FROM (
+            SELECT rowid, bm25(items_fts, {weights}) AS rank
+            FROM items_fts
+            WHERE items_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        ) f
+        JOIN items i ON i.rowid = f.rowid
+        ORDER BY f.rank, lower(i.name_display) ASC
+        """,
+        (expression, limit),
+    ).fetchall()
+
+
+def rebuild_search_index(conn: sqlite3.Connection) -> None:
+    conn.execute("INSERT INTO items_fts (items_fts) VALUES ('rebuild')")
+    conn.commit()
+
+
+def get_item_with_doses(conn: sqlite3.Connection, item_id: str) -> Optional[tuple[Item, list[Dose]]]:
+    return _query(
+        conn,
+        _item_doses_row,
+        f"SELECT {_ITEM_DOSES_COLUMNS} FROM items i WHERE i.id = ?",
+        (item_id,),
+    ).fetchone()
 
 
 def create_item_with_dose(
@@ -90,8 +414,43 @@ def create_item_with_dose(
     with_food: Optional[bool] = None,
     instructions: Optional[str] = None,
 ) -> str:
+    dose = {
+        "amount": amount,
+        "unit": unit,
+        "time_am": time_am,
+        "time_midday": time_midday,
+        "time_pm": time_pm,
+        "with_food": with_food,
+        "instructions": instructions,
+    }
+    return create_item_with_doses(
+        conn,
+        name_display=name_display,
+        category=category,
+        name_generic=name_generic,
+        brand=brand,
+        form=form,
+        route=route,
+        notes=notes,
+        doses=[dose],
+    )
+
+
+def create_item_with_doses(
+    conn: sqlite3.Connection,
+    *,
+    name_display: str,
+    category: str,
+    name_generic: Optional[str] = None,
+    brand: Optional[str] = None,
+    form: Optional[str] = None,
+    route: Optional[str] = None,
+    notes: Optional[str] = None,
+    doses: Sequence[dict] = (),
+) -> str:
+    # `doses` are dicts with the keys of _DOSE_INPUT_FIELDS; missing keys
+    # are blank.
     item_id = str(uuid4())
-    dose_id = str(uuid4())
     now = _now_iso()
 
     conn.execute(
@@ -103,34 +462,121 @@ def create_item_with_dose(
         """,
         (item_id, name_display, name_generic, brand, category, form, route, notes, now, now),
     )
-
-    conn.execute(
-        """
-        INSERT INTO doses (
-            id, item_id, amount, unit, time_am, time_midday, time_pm,
-            with_food, instructions, created_at, updated_at
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            dose_id,
-            item_id,
-            amount,
-            unit,
-            1 if time_am else 0,
-            1 if time_midday else 0,
-            1 if time_pm else 0,
-            None if with_food is None else (1 if with_food else 0),
-            instructions,
-            now,
-            now,
-        ),
+    conn.executemany(
+        _INSERT_DOSE_SQL,
+        [(str(uuid4()), item_id, *_dose_params(dose), now, now) for dose in doses],
     )
 
     _add_history(conn, item_id=item_id, action="create", note="created item")
     conn.commit()
+    _bump_generation(conn)
     return item_id
 
 
+def get_item_names(conn: sqlite3.Connection, item_ids: Iterable[str]) -> dict[str, str]:
+    ids = list(set(item_ids))
+    if not ids:
+        return {}
+    placeholders = ", ".join("?" for _ in ids)
+    rows = conn.execute(f"SELECT id, name_display FROM items WHERE id IN ({placeholders})", ids)
+    return {r[0]: r[1] for r in rows}
+
+
+def get_dose_items(conn: sqlite3.Connection, dose_ids: Iterable[str]) -> dict[str, str]:
+    # dose id -> the item it belongs to, for the ids that exist.
+    ids = list(set(dose_ids))
+    if not ids:
+        return {}
+    placeholders = ", ".join("?" for _ in ids)
+    rows = conn.execute(f"SELECT id, item_id FROM doses WHERE id IN ({placeholders})", ids)
+    return {r[0]: r[1] for r in rows}
+
+
+def item_key(name_display: str, category: str, brand: Optional[str]) -> tuple[str, str, str]:
+    # What counts as "the same item" when importing.
+    return (name_display.strip().lower(), category, (brand or "").strip().lower())
+
+
+def existing_item_keys(conn: sqlite3.Connection) -> set[tuple[str, str, str]]:
+    rows = conn.execute("SELECT name_display, category, brand FROM items")
+    return {item_key(r[0], r[1], r[2]) for r in rows}
+
+
+def bulk_create_items(conn: sqlite3.Connection, records: Iterable[dict], *, batch_size: int = 1000) -> int:
+    # All records go in one transaction, flushed to SQLite in batches so that
+    # a streamed input never has to be held in memory at once.
+    now = _now_iso()
+    items: list[tuple] = []
+    doses: list[tuple] = []
+    history: list[tuple] = []
+    inserted = 0
+
+    def flush() -> None:
+        conn.executemany(
+            """
+            INSERT INTO items (
+                id, name_display, name_generic, brand, category, form, route, notes,
+                status, start_date, stop_date, prescriber, pharmacy, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            items,
+        )
+        conn.executemany(_INSERT_DOSE_SQL, doses)
+        conn.executemany(
+            """
+            INSERT INTO history (id, ts, item_id, action, field, old_value, new_value, note)
+            VALUES (?, ?, ?, 'create', NULL, NULL, NULL, 'imported item')
+            """,
+            history,
+        )
+        items.clear()
+        doses.clear()
+        history.clear()
+
+    try:
+        for r in records:
+            item_id = str(uuid4())
+            status = r.get("status") or "active"
+            stop_date = r.get("stop_date")
+            if status == "stopped" and stop_date is None:
+                stop_date = now.split("T")[0]
+            items.append(
+                (
+                    item_id,
+                    r["name_display"],
+                    r.get("name_generic"),
+                    r.get("brand"),
+                    r["category"],
+                    r.get("form"),
+                    r.get("route"),
+                    r.get("notes"),
+                    status,
+                    r.get("start_date"),
+                    stop_date,
+                    r.get("prescriber"),
+                    r.get("pharmacy"),
+                    now,
+                    now,
+                )
+            )
+            # A record holds either a "doses" list or one dose's fields.
+            for dose in r["doses"] if "doses" in r else (r,):
+                doses.append((str(uuid4()), item_id, *_dose_params(dose), now, now))
+            history.append((str(uuid4()), now, item_id))
+            inserted += 1
+            if len(items) >= batch_size:
+                flush()
+        if items:
+            flush()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    conn.commit()
+    _bump_generation(conn)
+    return inserted
+
+
 def update_item_and_dose(
     conn: sqlite3.Connection,
     *,
@@ -150,6 +596,101 @@ def update_item_and_dose(
     with_food: Optional[bool],
     instructions: Optional[str],
 ) -> None:
+    # Single-dose form: sets the item's first dose and keeps any others.
+    found = get_item_with_doses(conn, item_id)
+    if found is None:
+        return
+    _, existing = found
+    first = {
+        "id": existing[0].id if existing else None,
+        "amount": amount,
+        "unit": unit,
+        "time_am": time_am,
+        "time_midday": time_midday,
+        "time_pm": time_pm,
+        "with_food": with_food,
+        "instructions": instructions,
+    }
+    others = [{"id": d.id, **dict(zip(_DOSE_INPUT_FIELDS, _stored_dose(d)))} for d in existing[1:]]
+    update_item_and_doses(
+        conn,
+        item_id=item_id,
+        name_display=name_display,
+        category=category,
+        name_generic=name_generic,
+        brand=brand,
+        form=form,
+        route=route,
+        notes=notes,
+        doses=[first, *others],
+    )
+
+
+def update_item_and_doses(
+    conn: sqlite3.Connection,
+    *,
+    item_id: str,
+    name_display: str,
+    category: str,
+    name_generic: Optional[str],
+    brand: Optional[str],
+    form: Optional[str],
+    route: Optional[str],
+    notes: Optional[str],
+    doses: Sequence[dict],
+) -> None:
+    # `doses` is the item's full dose list, in order. Entries whose "id" is
+    # one of the item's doses update it, the rest are added, and doses not
+    # listed are deleted. Only real changes are written and logged.
+    found = get_item_with_doses(conn, item_id)
+    if found is None:
+        return
+    item, existing = found
+    by_id = {d.id: d for d in existing}
+
+    item_values = {
+        "name_display": name_display,
+        "name_generic": name_generic,
+        "brand": brand,
+        "category": category,
+        "form": form,
+        "route": route,
+        "notes": notes,
+    }
+
+    changes: list[tuple[str, object, object]] = []
+    for key, value in item_values.items():
+        old = getattr(item, key)
+        if old != value:
+            changes.append((key, old, value))
+
+    # With more than one dose, logged fields say which dose they belong to.
+    numbered = max(len(existing), len(doses)) > 1
+    updates: list[tuple] = []
+    inserts: list[tuple] = []
+    kept: set[str] = set()
+    for n, dose in enumerate(doses, start=1):
+        params = _dose_params(dose)
+        current = by_id.get(dose.get("id"))
+        if current is None:
+            inserts.append(params)
+            changes.append((f"dose {n}" if numbered else "dose", None, _dose_summary(params)))
+            continue
+        kept.add(current.id)
+        dose_changes = [
+            (key, old, new) for key, old, new in zip(_DOSE_INPUT_FIELDS, _stored_dose(current), params) if old != new
+        ]
+        if dose_changes:
+            updates.append((*params, current.id))
+            changes.extend((f"dose {n} {key}" if numbered else key, old, new) for key, old, new in dose_changes)
+    removed = [d for d in existing if d.id not in kept]
+    for d in removed:
+        n = existing.index(d) + 1
+        changes.append((f"dose {n}" if numbered else "dose", _dose_summary(_stored_dose(d)), None))
+
+    if not changes:
+        return
+
     now = _now_iso()
 
     conn.execute(
@@ -168,64 +709,45 @@ def update_item_and_dose(
         """,
         (name_display, name_generic, brand, category, form, route, notes, now, item_id),
     )
+    conn.executemany("DELETE FROM doses WHERE id = ?", [(d.id,) for d in removed])
+    conn.executemany(
+        """
+        UPDATE doses
+        SET
+            amount = ?,
+            unit = ?,
+            time_am = ?,
+            time_midday = ?,
+            time_pm = ?,
+            with_food = ?,
+            instructions = ?,
+            updated_at = ?
+        WHERE id = ?
+        """,
+        [(*values[:-1], now, values[-1]) for values in updates],
+    )
+    conn.executemany(_INSERT_DOSE_SQL, [(str(uuid4()), item_id, *params, now, now) for params in inserts])
 
-    dose_row = conn.execute("SELECT id FROM doses WHERE item_id = ?", (item_id,)).fetchone()
-    if dose_row is None:
-        dose_id = str(uuid4())
-        conn.execute(
-            """
-            INSERT INTO doses (
-                id, item_id, amount, unit, time_am, time_midday, time_pm,
-                with_food, instructions, created_at, updated_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                dose_id,
-                item_id,
-                amount,
-                unit,
-                1 if time_am else 0,
-                1 if time_midday else 0,
-                1 if time_pm else 0,
-                None if with_food is None else (1 if with_food else 0),
-                instructions,
-                now,
-                now,
-            ),
-        )
-    else:
-        conn.execute(
-            """
-            UPDATE doses
-            SET
-                amount = ?,
-                unit = ?,
-                time_am = ?,
-                time_midday = ?,
-                time_pm = ?,
-                with_food = ?,
-                instructions = ?,
-                updated_at = ?
-            WHERE item_id = ?
-            """,
-            (
-                amount,
-                unit,
-                1 if time_am else 0,
-                1 if time_midday else 0,
-                1 if time_pm else 0,
-                None if with_food is None else (1 if with_food else 0),
-                instructions,
-                now,
-                item_id,
-            ),
-        )
-
-    _add_history(conn, item_id=item_id, action="update", note="updated item")
+    conn.executemany(
+        """
+        INSERT INTO history (id, ts, item_id, action, field, old_value, new_value, note)
+        VALUES (?, ?, ?, 'update', ?, ?, ?, NULL)
+        """,
+        [
+            (str(uuid4()), now, item_id, key, _history_value(old), _history_value(new))
+            for key, old, new in changes
+        ],
+    )
     conn.commit()
+    _bump_generation(conn)
 
 
 def set_status(conn: sqlite3.Connection, *, item_id: str, status: str) -> None:
+    row = conn.execute("SELECT status FROM items WHERE id = ?", (item_id,)).fetchone()
+    if row is None or row[0] == status:
+        return
+    old_status = row[0]
+
     now = _now_iso()
     stop_date = now.split("T")[0] if status == "stopped" else None
 
@@ -238,46 +760,280 @@ def set_status(conn: sqlite3.Connection, *, item_id: str, status: str) -> None:
         (status, stop_date, now, item_id),
     )
 
-    _add_history(conn, item_id=item_id, action="status_change", note=f"status -> {status}")
+    _add_history(
+        conn,
+        item_id=item_id,
+        action="status_change",
+        field="status",
+        old_value=old_status,
+        new_value=status,
+        note=f"status -> {status}",
+    )
     conn.commit()
+    _bump_generation(conn)
+
+
+def get_schedule(conn: sqlite3.Connection, *, item_ids: Optional[Sequence[str]] = None) -> list[ScheduleEntry]:
+    # The triggers keep the schedule table current, so this is one scan of
+    # its primary key: slot, then list order. With item_ids, only those
+    # items' rows, read through idx_schedule_item.
+    where, params = "", ()
+    if item_ids is not None:
+        where, params = f"WHERE item_id IN ({', '.join('?' * len(item_ids))})", tuple(item_ids)
+    return _query(
+        conn,
+        _schedule_row,
+        f"SELECT {_SCHEDULE_COLUMNS} FROM schedule {where} ORDER BY slot, sort_key, dose_id",
+        params,
+    ).fetchall()
+
+
+def get_schedule_totals(conn: sqlite3.Connection) -> list[tuple[int, Optional[str], float, int]]:
+    # What services.schedule.build_schedule adds up, without reading the
+    # entries out: (slot, unit, total amount, count) per slot and unit, the
+    # units of a slot in first-seen order. Unit None counts the doses with no
+    # amount or unit.
+    return conn.execute(
+        """
+        SELECT slot, unit, coalesce(sum(amount), 0), count(*)
+        FROM (
+            SELECT slot, CASE WHEN amount IS NOT NULL AND unit <> '' THEN unit END AS unit, amount,
+                   row_number() OVER (PARTITION BY slot ORDER BY sort_key, dose_id) AS n
+            FROM schedule
+        )
+        GROUP BY slot, unit
+        ORDER BY slot, min(n)
+        """
+    ).fetchall()
+
+
+# Keyset position in the history timeline: the (ts, id) of the last event
+# returned. Pages are ordered newest first.
+HistoryCursor = tuple[str, str]
+
+
+def get_history_page(
+    conn: sqlite3.Connection,
+    *,
+    item_id: Optional[str] = None,
+    action: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    before: Optional[HistoryCursor] = None,
+    after: Optional[HistoryCursor] = None,
+    limit: int = 200,
+) -> tuple[list[HistoryEvent], Optional[HistoryCursor]]:
+    # `since` is inclusive and `until` exclusive, both compared against ts.
+    # With `after`, the page holds the events just newer than the cursor and
+    # the returned cursor continues upwards; events are newest first either way.
+    where: list[str] = []
+    params: list[object] = []
+    if item_id:
+        where.append("item_id = ?")
+        params.append(item_id)
+    if action:
+        where.append("action = ?")
+        params.append(action)
+    if since:
+        where.append("ts >= ?")
+        params.append(since)
+    if until:
+        where.append("ts < ?")
+        params.append(until)
+    if before is not None:
+        where.append("(ts, id) < (?, ?)")
+        params.extend(before)
+    if after is not None:
+        where.append("(ts, id) > (?, ?)")
+        params.extend(after)
+
+    order = "ASC" if after is not None else "DESC"
+    events = _query(
+        conn,
+        _history_row,
+        f"""
+        SELECT {_HISTORY_COLUMNS} FROM history
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY ts {order}, id {order}
+        LIMIT ?
+        """,
+        (*params, limit),
+    ).fetchall()
+    next_cursor = (events[-1].ts, events[-1].id) if len(events) == limit else None
+    if after is not None:
+        events.reverse()
+    return events, next_cursor
 
 
 def get_history(conn: sqlite3.Connection, *, item_id: Optional[str] = None, limit: int = 200) -> list[HistoryEvent]:
+    events, _ = get_history_page(conn, item_id=item_id, limit=limit)
+    return events
+
+
+def iter_history(
+    conn: sqlite3.Connection,
+    *,
+    item_id: Optional[str] = None,
+    action: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    start: Optional[HistoryCursor] = None,
+    oldest_first: bool = False,
+    batch_size: int = 500,
+) -> Iterator[list[HistoryEvent]]:
+    # Walks the timeline one keyset page at a time, so memory stays at one
+    # batch no matter how long the history is, and no read transaction is
+    # held between batches. Starts just past `start` when given.
+    cursor = start
+    if oldest_first and cursor is None:
+        # Sorts before every (ts, id).
+        cursor = ("", "")
+    filters = {"item_id": item_id, "action": action, "since": since, "until": until}
+    while True:
+        if oldest_first:
+            events, cursor = get_history_page(conn, **filters, after=cursor, limit=batch_size)
+            events.reverse()
+        else:
+            events, cursor = get_history_page(conn, **filters, before=cursor, limit=batch_size)
+        if events:
+            yield events
+        if cursor is None:
+            return
+
+
+_intake_values = attrgetter(*INTAKE_FIELDS)
+
+
+def record_intakes(conn: sqlite3.Connection, events: Sequence[IntakeEvent]) -> int:
+    # One statement for the whole batch; the triggers count each event in
+    # the daily and weekly rollups in the same transaction, in place of any
+    # earlier mark for the same dose and slot that day.
+    conn.executemany(
+        f"INSERT INTO intake_events ({_INTAKE_COLUMNS}) VALUES ({', '.join('?' * len(INTAKE_FIELDS))})",
+        map(_intake_values, events),
+    )
+    conn.commit()
+    return len(events)
+
+
+def get_intake_for_day(conn: sqlite3.Connection, day: str) -> dict[tuple[Optional[str], Optional[int]], str]:
+    # The latest status per (dose_id, slot) on `day`.
+    rows = conn.execute(
+        "SELECT dose_id, slot, status FROM intake_events WHERE day = ? ORDER BY id",
+        (day,),
+    ).fetchall()
+    return {(row[0], row[1]): row[2] for row in rows}
+
+
+def get_daily_intake(
+    conn: sqlite3.Connection, *, start: str, end: str, item_id: Optional[str] = None
+) -> list[IntakeDay]:
+    # One row per day in [start, end] that has any events, oldest first.
+    where = "day >= ? AND day <= ?"
+    params: list[object] = [start, end]
     if item_id:
-        rows = conn.execute(
-            """
-            SELECT * FROM history
-            WHERE item_id = ?
-            ORDER BY ts DESC
-            LIMIT ?
-            """,
-            (item_id, limit),
-        ).fetchall()
+        where += " AND item_id = ?"
+        params.append(item_id)
+    rows = conn.execute(
+        f"""
+        SELECT day, sum(taken), sum(skipped) FROM intake_daily
+        WHERE {where}
+        GROUP BY day
+        ORDER BY day
+        """,
+        params,
+    ).fetchall()
+    return [IntakeDay(*row) for row in rows]
+
+
+def get_adherence(conn: sqlite3.Connection, *, start: str, end: str, item_id: Optional[str] = None) -> Adherence:
+    # Whole Monday-Sunday weeks inside [start, end] are read from the weekly
+    # rollup and the days either side from the daily one, so the cost grows
+    # with the number of weeks rather than the number of events.
+    first, last = date.fromisoformat(start), date.fromisoformat(end)
+    week_start = first + timedelta(days=(7 - first.weekday()) % 7)
+    week_end = last - timedelta(days=(last.weekday() + 1) % 7)
+    item_filter = " AND item_id = ?" if item_id else ""
+    item_params = [item_id] if item_id else []
+
+    taken = skipped = 0
+    if week_start < week_end:
+        day_ranges = [(first, week_start), (week_end + timedelta(days=1), last + timedelta(days=1))]
+        row = conn.execute(
+            f"SELECT sum(taken), sum(skipped) FROM intake_weekly WHERE week >= ? AND week < ?{item_filter}",
+            [week_start.isoformat(), week_end.isoformat(), *item_params],
+        ).fetchone()
+        taken, skipped = row[0] or 0, row[1] or 0
     else:
-        rows = conn.execute(
-            """
-            SELECT * FROM history
-            ORDER BY ts DESC
-            LIMIT ?
-            """,
-            (limit,),
-        ).fetchall()
-
-    out: list[HistoryEvent] = []
-    for r in rows:
-        out.append(
-            HistoryEvent(
-                id=r["id"],
-                ts=r["ts"],
-                item_id=r["item_id"],
-                action=r["action"],
-                field=r["field"],
-                old_value=r["old_value"],
-                new_value=r["new_value"],
-                note=r["note"],
-            )
-        )
-    return out
+        day_ranges = [(first, last + timedelta(days=1))]
+    for lo, hi in day_ranges:
+        if lo >= hi:
+            continue
+        row = conn.execute(
+            f"SELECT sum(taken), sum(skipped) FROM intake_daily WHERE day >= ? AND day < ?{item_filter}",
+            [lo.isoformat(), hi.isoformat(), *item_params],
+        ).fetchone()
+        taken += row[0] or 0
+        skipped += row[1] or 0
+
+    # Scheduled slots per item per day, counted from the day it was added.
+    expected = conn.execute(
+        f"""
+        SELECT sum(s.slots * (julianday(?) - julianday(max(?, substr(i.created_at, 1, 10))) + 1))
+        FROM (SELECT item_id, count(*) AS slots FROM schedule WHERE 1{item_filter} GROUP BY item_id) s
+        JOIN items i ON i.id = s.item_id
+        WHERE substr(i.created_at, 1, 10) <= ?
+        """,
+        [end, start, *item_params, end],
+    ).fetchone()[0]
+    return Adherence(start=start, end=end, taken=taken, skipped=skipped, expected=int(expected or 0))
+
+
+# The dose fields callers supply, in column order.
+_DOSE_INPUT_FIELDS = ("amount", "unit", "time_am", "time_midday", "time_pm", "with_food", "instructions")
+
+
+_INSERT_DOSE_SQL = """
+    INSERT INTO doses (
+        id, item_id, amount, unit, time_am, time_midday, time_pm,
+        with_food, instructions, created_at, updated_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _dose_params(dose: dict) -> tuple:
+    # A dose dict as stored: _DOSE_INPUT_FIELDS order, flags as 0/1.
+    with_food = dose.get("with_food")
+    return (
+        dose.get("amount"),
+        dose.get("unit"),
+        1 if dose.get("time_am") else 0,
+        1 if dose.get("time_midday") else 0,
+        1 if dose.get("time_pm") else 0,
+        None if with_food is None else (1 if with_food else 0),
+        dose.get("instructions"),
+    )
+
+
+def _stored_dose(dose: Dose) -> tuple:
+    return tuple(getattr(dose, key) for key in _DOSE_INPUT_FIELDS)
+
+
+def _dose_summary(params: tuple) -> str:
+    # "500 mg AM, PM" for the history log.
+    amount, unit = params[0], params[1]
+    parts = [f"{amount:g}" if amount is not None else "", unit or ""]
+    slots = [name for name, flag in zip(("AM", "Midday", "PM"), params[2:5]) if flag]
+    parts.append(", ".join(slots))
+    return " ".join(part for part in parts if part) or "blank"
+
+
+def _history_value(value: object) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, float):
+        return f"{value:g}"
+    return str(value)
 
 
 def _add_history(
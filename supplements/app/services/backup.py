@@ -0,0 +1,495 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Optional
+
+if TYPE_CHECKING:
+    from ..config import AppConfig
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# The online backup copies this many pages per step and then sleeps, so the
+# source is only read-locked for short stretches and writers keep going.
+PAGES_PER_STEP = 256
+STEP_PAUSE_S = 0.005
+MAX_RESTARTS = 3
+
+# Snapshots of these kinds are pruned by the retention policy; anything else
+# (manual, pre-migration, pre-restore) is kept until deleted by hand.
+PRUNABLE_KINDS = ("scheduled",)
+
+DEFAULT_INTERVAL_S = 60 * 60
+
+_manifest_lock = threading.Lock()
+
+
+class BackupError(Exception):
+    pass
+
+
+@dataclass
+class BackupEntry:
+    name: str
+    kind: str
+    created_at: str
+    size: int
+    raw_size: int
+    # sha256 of the .gz file (what verify checks) and of the uncompressed
+    # database (used to skip snapshots when nothing changed).
+    sha256: str
+    raw_sha256: str
+    schema_version: int
+
+    @property
+    def created(self) -> datetime:
+        return datetime.fromisoformat(self.created_at)
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    hourly: int = 24
+    daily: int = 7
+    weekly: int = 4
+
+
+@dataclass
+class VerifyResult:
+    name: str
+    ok: bool
+    message: str
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as fp:
+        for block in iter(lambda: fp.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_manifest(backups_dir: Path) -> list[BackupEntry]:
+    path = backups_dir / MANIFEST_NAME
+    if not path.exists():
+        return []
+    with path.open(encoding="utf-8") as fp:
+        data = json.load(fp)
+    return [BackupEntry(**raw) for raw in data.get("backups", [])]
+
+
+def _save_manifest(backups_dir: Path, entries: Iterable[BackupEntry]) -> None:
+    path = backups_dir / MANIFEST_NAME
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    data = {
+        "version": MANIFEST_VERSION,
+        "backups": [asdict(e) for e in sorted(entries, key=lambda e: e.created_at)],
+    }
+    with tmp.open("w", encoding="utf-8") as fp:
+        json.dump(data, fp, indent=2)
+        fp.write("\n")
+    os.replace(tmp, path)
+
+
+class _Restarted(Exception):
+    pass
+
+
+def copy_database(
+    source: sqlite3.Connection,
+    dest_path: Path,
+    *,
+    pages: int = PAGES_PER_STEP,
+    pause: float = STEP_PAUSE_S,
+) -> None:
+    # Online backup into a plain file. Sleeping in the progress callback
+    # happens between steps, when no lock on the source is held.
+    #
+    # A write from another connection restarts a stepwise backup, so under a
+    # steady stream of saves it could run forever. After MAX_RESTARTS the
+    # copy is redone in one step, i.e. one read transaction, which under WAL
+    # still does not block writers.
+    restarts = 0
+    last_remaining: Optional[int] = None
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining >= last_remaining:
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _Restarted()
+        last_remaining = remaining
+        if remaining and pause:
+            time.sleep(pause)
+
+    dest = sqlite3.connect(str(dest_path))
+    try:
+        try:
+            source.backup(dest, pages=pages, progress=progress)
+        except _Restarted:
+            logger.info("backup restarted %d times; finishing in a single step", restarts - 1)
+            source.backup(dest, pages=-1)
+    finally:
+        dest.close()
+
+
+def snapshot(
+    source: sqlite3.Connection,
+    backups_dir: Path,
+    *,
+    kind: str = "manual",
+    skip_unchanged: bool = False,
+    pages: int = PAGES_PER_STEP,
+    pause: float = STEP_PAUSE_S,
+) -> Optional[BackupEntry]:
+    # Writes a gzip-compressed copy of the database plus a manifest entry.
+    # With skip_unchanged, returns None (and keeps nothing) when the content
+    # matches the newest snapshot already on disk.
+    backups_dir.mkdir(parents=True, exist_ok=True)
+    created = _now()
+    stamp = created.strftime("%Y%m%dT%H%M%SZ")
+    name = f"supplements-{stamp}-{kind}.db.gz"
+    n = 1
+    while (backups_dir / name).exists():
+        n += 1
+        name = f"supplements-{stamp}-{kind}-{n}.db.gz"
+    raw = backups_dir / f".{name}.{os.getpid()}.partial"
+    final = backups_dir / name
+    try:
+        copy_database(source, raw, pages=pages, pause=pause)
+        check = sqlite3.connect(str(raw))
+        try:
+            schema_version = check.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            check.close()
+        raw_sha = _sha256_file(raw)
+
+        with _manifest_lock:
+            entries = load_manifest(backups_dir)
+            if skip_unchanged and entries and max(entries, key=lambda e: e.created_at).raw_sha256 == raw_sha:
+                return None
+
+            gz = final.with_name(f".{name}.{os.getpid()}.gz.partial")
+            try:
+                with raw.open("rb") as src, gzip.open(gz, "wb", compresslevel=6) as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                os.replace(gz, final)
+            finally:
+                gz.unlink(missing_ok=True)
+
+            entry = BackupEntry(
+                name=name,
+                kind=kind,
+                created_at=created.isoformat(),
+                size=final.stat().st_size,
+                raw_size=raw.stat().st_size,
+                sha256=_sha256_file(final),
+                raw_sha256=raw_sha,
+                schema_version=schema_version,
+            )
+            entries = [e for e in entries if e.name != name]
+            entries.append(entry)
+            _save_manifest(backups_dir, entries)
+    finally:
+        raw.unlink(missing_ok=True)
+    return entry
+
+
+def create_backup(
+    db_path: Path,
+    backups_dir: Path,
+    *,
+    kind: str = "manual",
+    skip_unchanged: bool = False,
+) -> Optional[BackupEntry]:
+    # Reads through its own read-only connection, so it can run next to the
+    # TUI or web app without sharing their connections.
+    uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+    source = sqlite3.connect(uri, uri=True)
+    try:
+        return snapshot(source, backups_dir, kind=kind, skip_unchanged=skip_unchanged)
+    finally:
+        source.close()
+
+
+def select_keep(entries: list[BackupEntry], policy: RetentionPolicy) -> set[str]:
+    # Grandfather-father-son: the newest snapshot in each of the last
+    # `hourly` hours, `daily` days and `weekly` ISO weeks that have one.
+    keep: set[str] = set()
+    newest_first = sorted(entries, key=lambda e: e.created_at, reverse=True)
+    if newest_first:
+        keep.add(newest_first[0].name)
+
+    buckets = (
+        (policy.hourly, lambda d: d.strftime("%Y-%m-%dT%H")),
+        (policy.daily, lambda d: d.strftime("%Y-%m-%d")),
+        (policy.weekly, lambda d: "%d-W%02d" % d.isocalendar()[:2]),
+    )
+    for limit, bucket_of in buckets:
+        seen: set[str] = set()
+        for entry in newest_first:
+            if len(seen) >= limit:
+                break
+            bucket = bucket_of(entry.created)
+            if bucket not in seen:
+                seen.add(bucket)
+                keep.add(entry.name)
+    return keep
+
+
+def prune(backups_dir: Path, policy: RetentionPolicy = RetentionPolicy()) -> list[str]:
+    with _manifest_lock:
+        entries = load_manifest(backups_dir)
+        prunable = [e for e in entries if e.kind in PRUNABLE_KINDS]
+        keep = select_keep(prunable, policy)
+        removed = [e.name for e in prunable if e.name not in keep]
+        if not removed:
+            return []
+        for name in removed:
+            (backups_dir / name).unlink(missing_ok=True)
+        _save_manifest(backups_dir, [e for e in entries if e.name not in removed])
+    return removed
+
+
+def find_entry(backups_dir: Path, name: Optional[str] = None) -> BackupEntry:
+    entries = load_manifest(backups_dir)
+    if not entries:
+        raise BackupError(f"no backups in {backups_dir}")
+    if name is None:
+        return max(entries, key=lambda e: e.created_at)
+    for entry in entries:
+        if entry.name == name:
+            return entry
+    raise BackupError(f"no backup named {name!r} in the manifest")
+
+
+def _decompress(path: Path, dest: Path) -> None:
+    with gzip.open(path, "rb") as src, dest.open("wb") as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+
+def verify(backups_dir: Path, entry: BackupEntry, *, full: bool = False) -> VerifyResult:
+    # The checksum alone catches truncation and bit rot; the decompressed copy
+    # is then opened and checked with quick_check (or integrity_check).
+    path = backups_dir / entry.name
+    if not path.exists():
+        return VerifyResult(entry.name, False, "file missing")
+    if path.stat().st_size != entry.size or _sha256_file(path) != entry.sha256:
+        return VerifyResult(entry.name, False, "checksum mismatch")
+
+    raw = backups_dir / f".{entry.name}.{os.getpid()}.verify"
+    try:
+        try:
+            _decompress(path, raw)
+        except (OSError, EOFError) as e:
+            return VerifyResult(entry.name, False, f"cannot decompress: {e}")
+        if _sha256_file(raw) != entry.raw_sha256:
+            return VerifyResult(entry.name, False, "database checksum mismatch")
+        conn = sqlite3.connect(str(raw))
+        try:
+            pragma = "integrity_check" if full else "quick_check"
+            rows = [r[0] for r in conn.execute(f"PRAGMA {pragma}")]
+        except sqlite3.DatabaseError as e:
+            return VerifyResult(entry.name, False, str(e))
+        finally:
+            conn.close()
+    finally:
+        raw.unlink(missing_ok=True)
+
+    if rows != ["ok"]:
+        return VerifyResult(entry.name, False, "; ".join(rows[:5]))
+    return VerifyResult(entry.name, True, "ok")
+
+
+def restore(db_path: Path, backups_dir: Path, entry: BackupEntry) -> Optional[BackupEntry]:
+    # Verifies the snapshot, keeps a copy of the current database, then
+    # copies the snapshot in with the backup API so the WAL and any open
+    # connections stay consistent. Returns the pre-restore snapshot.
+    result = verify(backups_dir, entry)
+    if not result.ok:
+        raise BackupError(f"{entry.name}: {result.message}")
+
+    safety = create_backup(db_path, backups_dir, kind="pre-restore") if Path(db_path).exists() else None
+
+    raw = backups_dir / f".{entry.name}.{os.getpid()}.restore"
+    try:
+        _decompress(backups_dir / entry.name, raw)
+        source = sqlite3.connect(str(raw))
+        dest = sqlite3.connect(str(db_path))
+        try:
+            source.backup(dest, pages=0)
+        finally:
+            dest.close()
+            source.close()
+    finally:
+        raw.unlink(missing_ok=True)
+    return safety
+
+
+class BackupScheduler:
+    # Takes a snapshot every `interval` seconds on a daemon thread and then
+    # applies the retention policy. A read-only connection is kept open to
+    # watch PRAGMA data_version, which moves whenever another connection
+    # commits; while it stays put the interval is skipped without copying
+    # anything, so an idle database costs one pragma. Any write counts,
+    # intake and history included.
+
+    def __init__(
+        self,
+        db_path: Path,
+        backups_dir: Path,
+        *,
+        interval: float = DEFAULT_INTERVAL_S,
+        policy: RetentionPolicy = RetentionPolicy(),
+    ):
+        self.db_path = db_path
+        self.backups_dir = backups_dir
+        self.interval = interval
+        self.policy = policy
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._watch: Optional[sqlite3.Connection] = None
+        # data_version when the last snapshot started; None forces one.
+        self._seen_version: Optional[int] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="supplements-backup", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _first_delay(self) -> float:
+        try:
+            entries = [e for e in load_manifest(self.backups_dir) if e.kind == "scheduled"]
+        except (OSError, ValueError, TypeError):
+            entries = []
+        if not entries:
+            return 0.0
+        age = (_now() - max(e.created for e in entries)).total_seconds()
+        return max(0.0, self.interval - age)
+
+    def _loop(self) -> None:
+        delay = self._first_delay()
+        try:
+            while not self._stop.wait(delay):
+                self.run_once()
+                delay = self.interval
+        finally:
+            if self._watch is not None:
+                self._watch.close()
+                self._watch = None
+
+    def _data_version(self) -> int:
+        if self._watch is None:
+            uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+            self._watch = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return self._watch.execute("PRAGMA data_version").fetchone()[0]
+
+    def run_once(self) -> Optional[BackupEntry]:
+        # Read before copying: a commit during the copy moves it again, so
+        # the next run takes another snapshot.
+        try:
+            version = self._data_version()
+            if version == self._seen_version:
+                return None
+            # skip_unchanged still catches a first run right after a restart.
+            entry = create_backup(self.db_path, self.backups_dir, kind="scheduled", skip_unchanged=True)
+            self._seen_version = version
+            prune(self.backups_dir, self.policy)
+            return entry
+        except Exception:
+            logger.exception("scheduled backup of %s failed", self.db_path)
+            return None
+
+
+def _format_size(n: int) -> str:
+    if n < 1024:
+        return f"{n} B"
+    if n < 1024 * 1024:
+        return f"{n / 1024:.1f} KiB"
+    return f"{n / (1024 * 1024):.1f} MiB"
+
+
+def main(argv: Optional[list[str]] = None, cfg: Optional[AppConfig] = None) -> int:
+    from ..config import get_config
+
+    parser = argparse.ArgumentParser(prog="python -m app.services.backup", description="Back up the supplements database.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("create", help="take a snapshot now")
+    sub.add_parser("list", help="list snapshots in the manifest")
+    p_verify = sub.add_parser("verify", help="check snapshot checksums and integrity")
+    p_verify.add_argument("name", nargs="?", help="snapshot to check (default: all)")
+    p_verify.add_argument("--full", action="store_true", help="run integrity_check instead of quick_check")
+    p_restore = sub.add_parser("restore", help="replace the database with a snapshot")
+    p_restore.add_argument("name", nargs="?", help="snapshot to restore (default: newest)")
+    sub.add_parser("prune", help="apply the retention policy")
+    p_run = sub.add_parser("run", help="take scheduled snapshots until interrupted")
+    p_run.add_argument("--interval", type=float, default=DEFAULT_INTERVAL_S, help="seconds between snapshots")
+    args = parser.parse_args(argv)
+
+    cfg = cfg or get_config()
+    try:
+        if args.command == "create":
+            entry = create_backup(cfg.db_path, cfg.backups_dir)
+            print(f"{entry.name}  {_format_size(entry.size)}")
+        elif args.command == "list":
+            for e in load_manifest(cfg.backups_dir):
+                print(f"{e.created_at}  {e.kind:<12} v{e.schema_version}  {_format_size(e.size):>10}  {e.name}")
+        elif args.command == "verify":
+            entries = [find_entry(cfg.backups_dir, args.name)] if args.name else load_manifest(cfg.backups_dir)
+            failed = 0
+            for entry in entries:
+                result = verify(cfg.backups_dir, entry, full=args.full)
+                failed += not result.ok
+                print(f"{'ok  ' if result.ok else 'FAIL'}  {result.name}  {result.message if not result.ok else ''}".rstrip())
+            return 1 if failed else 0
+        elif args.command == "restore":
+            entry = find_entry(cfg.backups_dir, args.name)
+            safety = restore(cfg.db_path, cfg.backups_dir, entry)
+            print(f"restored {entry.name}")
+            if safety is not None:
+                print(f"previous database saved as {safety.name}")
+        elif args.command == "prune":
+            for name in prune(cfg.backups_dir):
+                print(f"removed {name}")
+        elif args.command == "run":
+            logging.basicConfig(level=logging.INFO)
+            scheduler = BackupScheduler(cfg.db_path, cfg.backups_dir, interval=args.interval)
+            scheduler.start()
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                scheduler.stop()
+    except BackupError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
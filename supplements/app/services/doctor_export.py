@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import csv
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Optional, TextIO
+
+from ..repo import count_items, data_stamp, iter_items
+from .formatting import format_doses, format_doses_when
+
+if TYPE_CHECKING:
+    from jinja2 import Environment
+
+# Bump when the layout of any format changes so cached files are not reused.
+EXPORT_VERSION = 2
+
+FORMATS = ("html", "csv", "txt")
+
+SECTIONS = (
+    ("active", "Currently taking"),
+    ("paused", "Paused"),
+    ("stopped", "Stopped"),
+)
+
+CSV_COLUMNS = (
+    "status",
+    "name",
+    "generic",
+    "brand",
+    "category",
+    "dose",
+    "when",
+    "form",
+    "route",
+    "notes",
+    "start_date",
+    "stop_date",
+    "prescriber",
+)
+
+# Progress callbacks fire every PROGRESS_EVERY rows, not on each one.
+PROGRESS_EVERY = 250
+
+# Stale exports are removed only once this old: a file just written by
+# another process may be about to be opened by whoever asked for it.
+STALE_AFTER_S = 60
+
+TEMPLATES_DIR = Path(__file__).resolve().parents[1] / "web" / "templates"
+
+_env: Environment | None = None
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class _Tracker:
+    # Counts rows as they are pulled through the section generators and
+    # checks for cancellation between rows.
+    def __init__(
+        self,
+        total: int,
+        progress: Optional[Callable[[int, int], None]],
+        cancel: Optional[threading.Event],
+    ):
+        self.total = total
+        self.done = 0
+        self.progress = progress
+        self.cancel = cancel
+
+    def step(self) -> None:
+        if self.cancel is not None and self.cancel.is_set():
+            raise ExportCancelled()
+        self.done += 1
+        if self.progress is not None and self.done % PROGRESS_EVERY == 0:
+            self.progress(self.done, self.total)
+
+    def finish(self) -> None:
+        if self.progress is not None:
+            self.progress(self.done, self.total)
+
+
+def _jinja_env() -> Environment:
+    # Imported here: only HTML exports need Jinja, and it is slow to import
+    # for scripted CSV/text exports.
+    from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+    global _env
+    if _env is None:
+        _env = Environment(
+            loader=FileSystemLoader(str(TEMPLATES_DIR)),
+            autoescape=select_autoescape(["html"]),
+        )
+    return _env
+
+
+def export_key(conn: sqlite3.Connection, fmt: str) -> str:
+    raw = f"{EXPORT_VERSION}|{fmt}|{data_stamp(conn)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:20]
+
+
+def export_path(exports_dir: Path, key: str, fmt: str) -> Path:
+    return exports_dir / f"doctor-{key}.{fmt}"
+
+
+def iter_rows(conn: sqlite3.Connection, status: str, tracker: Optional[_Tracker] = None) -> Iterator[dict]:
+    for item, doses in iter_items(conn, status):
+        if tracker is not None:
+            tracker.step()
+        yield {
+            "status": item.status,
+            "name": item.name_display,
+            "generic": item.name_generic or "",
+            "brand": item.brand or "",
+            "category": item.category,
+            "dose": format_doses(doses),
+            "when": format_doses_when(doses),
+            "form": item.form or "",
+            "route": item.route or "",
+            "notes": item.notes or "",
+            "start_date": item.start_date or "",
+            "stop_date": item.stop_date or "",
+            "prescriber": item.prescriber or "",
+        }
+
+
+def iter_csv_chunks(conn: sqlite3.Connection, tracker: Optional[_Tracker] = None) -> Iterator[str]:
+    buf = _LineBuffer()
+    writer = csv.DictWriter(buf, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    yield buf.take()
+    for status, _ in SECTIONS:
+        for row in iter_rows(conn, status, tracker):
+            writer.writerow(row)
+            yield buf.take()
+
+
+class _LineBuffer:
+    # Minimal file-like target so csv.writer output can be yielded per row.
+    def __init__(self) -> None:
+        self._parts: list[str] = []
+
+    def write(self, s: str) -> int:
+        self._parts.append(s)
+        return len(s)
+
+    def take(self) -> str:
+        out = "".join(self._parts)
+        self._parts.clear()
+        return out
+
+
+def iter_text_lines(
+    conn: sqlite3.Connection,
+    *,
+    generated_at: str,
+    tracker: Optional[_Tracker] = None,
+) -> Iterator[str]:
+    yield "Medication and supplement list\n"
+    yield f"Generated {generated_at}\n"
+    for status, title in SECTIONS:
+        yield "\n"
+        yield f"{title}\n"
+        yield f"{'-' * len(title)}\n"
+        empty = True
+        for r in iter_rows(conn, status, tracker):
+            empty = False
+            detail = ", ".join(part for part in (r["dose"], r["when"], r["route"]) if part)
+            yield f"- {r['name']} [{r['category']}]" + (f": {detail}" if detail else "") + "\n"
+            if r["notes"]:
+                yield f"    {r['notes']}\n"
+        if empty:
+            yield "  (none)\n"
+
+
+def iter_html_chunks(
+    conn: sqlite3.Connection,
+    *,
+    generated_at: str,
+    tracker: Optional[_Tracker] = None,
+) -> Iterator[str]:
+    # Template.generate() renders lazily, pulling rows from each section's
+    # generator as it reaches them.
+    template = _jinja_env().get_template("doctor_preview.html")
+    sections = [(title, iter_rows(conn, status, tracker)) for status, title in SECTIONS]
+    return template.generate(sections=sections, generated_at=generated_at)
+
+
+def _write_chunks(fp: TextIO, chunks: Iterable[str], on_chunk: Optional[Callable[[str], None]]) -> None:
+    for chunk in chunks:
+        fp.write(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk)
+
+
+def export_doctor(
+    conn: sqlite3.Connection,
+    exports_dir: Path,
+    fmt: str = "html",
+    *,
+    progress: Optional[Callable[[int, int], None]] = None,
+    cancel: Optional[threading.Event] = None,
+    on_chunk: Optional[Callable[[str], None]] = None,
+) -> Path:
+    # progress(done, total) reports rows written; setting `cancel` aborts with
+    # ExportCancelled and leaves no partial file. on_chunk sees the output as
+    # it is written, which lets a preview show the first page early. None of
+    # them fire when the cached artifact is returned.
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}; expected one of {', '.join(FORMATS)}")
+
+    # One read transaction for the key, the count and every section, so a
+    # write landing midway cannot give a file whose key does not match what
+    # is in it.
+    owns_transaction = not conn.in_transaction
+    if owns_transaction:
+        conn.execute("BEGIN")
+    try:
+        path = _export(conn, exports_dir, fmt, progress, cancel, on_chunk)
+    finally:
+        if owns_transaction:
+            conn.rollback()
+
+    # Older artifacts of this format describe a regimen that no longer exists.
+    cutoff = time.time() - STALE_AFTER_S
+    for stale in exports_dir.glob(f"doctor-*.{fmt}"):
+        if stale == path:
+            continue
+        try:
+            if stale.stat().st_mtime < cutoff:
+                stale.unlink()
+        except FileNotFoundError:
+            pass
+    return path
+
+
+def _export(
+    conn: sqlite3.Connection,
+    exports_dir: Path,
+    fmt: str,
+    progress: Optional[Callable[[int, int], None]],
+    cancel: Optional[threading.Event],
+    on_chunk: Optional[Callable[[str], None]],
+) -> Path:
+    path = export_path(exports_dir, export_key(conn, fmt), fmt)
+    if path.exists():
+        return path
+
+    generated_at = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+    tracker = _Tracker(sum(count_items(conn).values()), progress, cancel)
+    exports_dir.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f"{path.name}.{os.getpid()}.partial")
+    try:
+        with partial.open("w", encoding="utf-8", newline="") as fp:
+            if fmt == "csv":
+                chunks = iter_csv_chunks(conn, tracker)
+            elif fmt == "txt":
+                chunks = iter_text_lines(conn, generated_at=generated_at, tracker=tracker)
+            else:
+                chunks = iter_html_chunks(conn, generated_at=generated_at, tracker=tracker)
+            _write_chunks(fp, chunks, on_chunk)
+        tracker.finish()
+        os.replace(partial, path)
+    finally:
+        partial.unlink(missing_ok=True)
+    return path
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+from ..models import Dose
+
+
+def format_when(dose: Optional[Dose]) -> str:
+    if not dose:
+        return ""
+    parts = []
+    if dose.time_am:
+        parts.append("AM")
+    if dose.time_midday:
+        parts.append("Midday")
+    if dose.time_pm:
+        parts.append("PM")
+    return ", ".join(parts)
+
+
+def format_dose(dose: Optional[Dose]) -> str:
+    if not dose:
+        return ""
+    if dose.amount is not None and dose.unit:
+        return f"{dose.amount:g} {dose.unit}"
+    if dose.amount is not None:
+        return f"{dose.amount:g}"
+    return dose.unit or ""
+
+
+def format_doses(doses: Sequence[Dose]) -> str:
+    # One dose reads as before; several also say when each is taken, e.g.
+    # "500 mg AM; 1000 mg PM".
+    if len(doses) <= 1:
+        return format_dose(doses[0] if doses else None)
+    return "; ".join(" ".join(part for part in (format_dose(d), format_when(d)) if part) for d in doses)
+
+
+def format_doses_when(doses: Sequence[Dose]) -> str:
+    # Every time slot any dose is taken in.
+    slots = [
+        name
+        for name, key in (("AM", "time_am"), ("Midday", "time_midday"), ("PM", "time_pm"))
+        if any(getattr(d, key) for d in doses)
+    ]
+    return ", ".join(slots)
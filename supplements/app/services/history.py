@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import base64
+import csv
+import sqlite3
+from typing import Iterator, Optional, TextIO
+
+from ..models import HistoryEvent
+from ..repo import HistoryCursor, iter_history
+
+CSV_COLUMNS = ("ts", "item_id", "action", "field", "old_value", "new_value", "note")
+
+
+def encode_cursor(cursor: Optional[HistoryCursor]) -> Optional[str]:
+    # Opaque, URL-safe form of a keyset cursor for APIs and links.
+    if cursor is None:
+        return None
+    raw = f"{cursor[0]}\n{cursor[1]}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: Optional[str]) -> Optional[HistoryCursor]:
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("utf-8")
+        ts, event_id = raw.split("\n")
+    except ValueError as e:
+        raise ValueError(f"invalid history cursor {token!r}") from e
+    return ts, event_id
+
+
+def iter_events(
+    conn: sqlite3.Connection,
+    *,
+    item_id: Optional[str] = None,
+    batch_size: int = 500,
+) -> Iterator[HistoryEvent]:
+    for batch in iter_history(conn, item_id=item_id, batch_size=batch_size):
+        yield from batch
+
+
+def describe_event(event: HistoryEvent) -> str:
+    if event.action == "update" and event.field:
+        old = "—" if event.old_value is None else event.old_value
+        new = "—" if event.new_value is None else event.new_value
+        return f"{event.field}: {old} → {new}"
+    if event.action == "status_change" and event.field:
+        return f"status: {event.old_value} → {event.new_value}"
+    return event.note or event.action
+
+
+def write_history_csv(
+    conn: sqlite3.Connection,
+    fp: TextIO,
+    *,
+    item_id: Optional[str] = None,
+    batch_size: int = 500,
+) -> int:
+    writer = csv.writer(fp)
+    writer.writerow(CSV_COLUMNS)
+    count = 0
+    for batch in iter_history(conn, item_id=item_id, batch_size=batch_size):
+        writer.writerows(tuple(getattr(e, col) for col in CSV_COLUMNS) for e in batch)
+        count += len(batch)
+    return count
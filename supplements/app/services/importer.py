@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import csv
+import json
+import sqlite3
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator, Optional, TextIO
+
+from ..repo import bulk_create_items, existing_item_keys, item_key
+from .validators import validate_item_record
+
+FORMATS = ("csv", "json", "jsonl")
+
+_CHUNK = 64 * 1024
+
+
+@dataclass
+class ImportResult:
+    inserted: int = 0
+    duplicates: int = 0
+    rejected: list[tuple[int, list[str]]] = field(default_factory=list)
+
+    @property
+    def total(self) -> int:
+        return self.inserted + self.duplicates + len(self.rejected)
+
+
+@dataclass(frozen=True)
+class InvalidRecord:
+    # Stands in for a record that is not valid JSON; import_items rejects it
+    # with `reason` and carries on with the next one.
+    reason: str
+
+
+def _invalid_json(e: json.JSONDecodeError) -> InvalidRecord:
+    return InvalidRecord(f"invalid JSON: {e.msg}")
+
+
+def detect_format(path: Path) -> str:
+    suffix = path.suffix.lower().lstrip(".")
+    if suffix == "ndjson":
+        return "jsonl"
+    if suffix in FORMATS:
+        return suffix
+    raise ValueError(f"cannot tell the import format of {path.name}; expected .csv, .json or .jsonl")
+
+
+def iter_records(fp: TextIO, fmt: str) -> Iterator[tuple[int, Any]]:
+    # Yields (record number, raw record). For CSV the number is the line the
+    # record ends on, so it matches what a spreadsheet shows; for JSON lines
+    # the line, for a JSON array the element's position. A record that does
+    # not parse comes back as an InvalidRecord.
+    if fmt == "csv":
+        reader = csv.DictReader(fp)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "jsonl":
+        for n, line in enumerate(fp, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield n, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield n, _invalid_json(e)
+    elif fmt == "json":
+        yield from enumerate(_iter_json_array(fp), start=1)
+    else:
+        raise ValueError(f"unknown import format {fmt!r}")
+
+
+def _iter_json_array(fp: TextIO) -> Iterator[Any]:
+    # Decodes a top-level JSON array one element at a time instead of
+    # json.load()-ing the whole file. `pos` walks the buffer so that consumed
+    # text is only dropped when the next chunk is appended. An element that
+    # does not decode is skipped up to the next top-level comma; only a
+    # broken array (no brackets, missing commas) fails the whole file.
+    decoder = json.JSONDecoder()
+    buf = fp.read(_CHUNK)
+    pos = _skip_ws(buf, 0)
+    if buf[pos : pos + 1] != "[":
+        raise ValueError("expected a JSON array of records")
+    pos += 1
+    eof = False
+    expect_comma = False
+
+    while True:
+        pos = _skip_ws(buf, pos)
+        if pos >= len(buf) - 1 and not eof:
+            chunk = fp.read(_CHUNK)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        if pos >= len(buf):
+            raise ValueError("unterminated JSON array")
+
+        ch = buf[pos]
+        if ch == "]":
+            return
+        if expect_comma:
+            if ch != ",":
+                raise ValueError(f"expected ',' between array elements, found {ch!r}")
+            pos += 1
+            expect_comma = False
+            continue
+
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            end = _element_end(buf, pos)
+            if end is None and not eof:
+                # Most likely cut off by the chunk boundary; read on.
+                chunk = fp.read(_CHUNK)
+                eof = not chunk
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            if end is None:
+                raise ValueError("unterminated JSON array") from e
+            obj = _invalid_json(e)
+        yield obj
+        pos = end
+        expect_comma = True
+
+
+def _element_end(buf: str, pos: int) -> Optional[int]:
+    # Where the array element starting at `pos` ends: the next ',' or ']'
+    # outside any string or nested brackets. None if `buf` ends first.
+    depth = 0
+    in_string = escaped = False
+    for i in range(pos, len(buf)):
+        ch = buf[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "[{":
+            depth += 1
+        elif ch in "]}" and depth > 0:
+            depth -= 1
+        elif ch in ",]" and depth == 0:
+            return i
+    return None
+
+
+def _skip_ws(buf: str, pos: int) -> int:
+    while pos < len(buf) and buf[pos] in " \t\r\n":
+        pos += 1
+    return pos
+
+
+def import_items(conn: sqlite3.Connection, fp: TextIO, fmt: str) -> ImportResult:
+    result = ImportResult()
+    seen = existing_item_keys(conn)
+
+    def accepted() -> Iterator[dict]:
+        for n, raw in iter_records(fp, fmt):
+            if isinstance(raw, InvalidRecord):
+                result.rejected.append((n, [raw.reason]))
+                continue
+            if not isinstance(raw, dict):
+                result.rejected.append((n, ["record is not an object"]))
+                continue
+            clean, errors = validate_item_record(raw)
+            if clean is None:
+                result.rejected.append((n, errors))
+                continue
+            key = item_key(clean["name_display"], clean["category"], clean["brand"])
+            if key in seen:
+                result.duplicates += 1
+                continue
+            seen.add(key)
+            yield clean
+
+    result.inserted = bulk_create_items(conn, accepted())
+    return result
+
+
+def import_items_file(conn: sqlite3.Connection, path: Path, fmt: Optional[str] = None) -> ImportResult:
+    fmt = fmt or detect_format(path)
+    # utf-8-sig drops the BOM that spreadsheet CSV exports often start with.
+    with path.open("r", encoding="utf-8-sig", newline="") as fp:
+        return import_items(conn, fp, fmt)
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+from ..db import ConnectionManager
+from ..models import IntakeEvent
+from ..repo import get_item_names, record_intakes
+from .validators import INTAKE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Events wait at most this long before being written, so a crash loses at
+# most this much; on a normal exit close() writes everything out.
+FLUSH_INTERVAL_S = 2.0
+# A burst this large is written straight away instead of waiting.
+MAX_PENDING = 1000
+
+SLOTS = (1, 2, 3)
+
+
+def make_event(
+    *,
+    item_id: str,
+    dose_id: Optional[str] = None,
+    slot: Optional[int] = None,
+    status: str = "taken",
+    at: Optional[datetime] = None,
+) -> IntakeEvent:
+    if status not in INTAKE_STATUSES:
+        raise ValueError(f"status must be one of {', '.join(INTAKE_STATUSES)}")
+    if slot is not None and slot not in SLOTS:
+        raise ValueError("slot must be 1 (AM), 2 (Midday) or 3 (PM)")
+    at = at or datetime.now(timezone.utc)
+    if at.tzinfo is None:
+        at = at.astimezone()
+    # The day is local: a dose taken at 23:30 counts towards that evening.
+    return IntakeEvent(
+        item_id=item_id,
+        dose_id=dose_id,
+        slot=slot,
+        day=at.astimezone().date().isoformat(),
+        taken_at=at.astimezone(timezone.utc).replace(microsecond=0).isoformat(),
+        status=status,
+    )
+
+
+class IntakeBuffer:
+    # Write-behind for intake events. record() only appends to a list; a
+    # daemon thread writes whatever has piled up in one transaction every
+    # `interval` seconds, or sooner once `max_pending` events are waiting.
+    # close(), also run at interpreter exit, writes out the rest.
+
+    def __init__(self, manager: ConnectionManager, *, interval: float = FLUSH_INTERVAL_S, max_pending: int = MAX_PENDING):
+        self.manager = manager
+        self.interval = interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        # Held for a whole flush, so batches reach the database in order.
+        self._flush_lock = threading.Lock()
+        self._pending: list[IntakeEvent] = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+
+    def record(self, event: IntakeEvent) -> None:
+        with self._lock:
+            self._pending.append(event)
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def pending_events(self) -> list[IntakeEvent]:
+        # A copy of what is queued, oldest first, for views that show marks
+        # before they are written.
+        with self._lock:
+            return list(self._pending)
+
+    def flush(self) -> int:
+        # Writes everything queued so far; returns how many events were
+        # written. On failure the batch goes back to the front of the queue.
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                written = self._write(batch)
+            except BaseException:
+                with self._lock:
+                    self._pending[:0] = batch
+                raise
+            self.written += written
+            self.flushes += 1
+            return written
+
+    def _write(self, batch: list[IntakeEvent]) -> int:
+        try:
+            with self.manager.write() as conn:
+                return record_intakes(conn, batch)
+        except sqlite3.IntegrityError:
+            pass
+        # Some event refers to an item that no longer exists. Drop those and
+        # write the rest, rather than holding the whole batch back for good.
+        with self.manager.write() as conn:
+            known = get_item_names(conn, {event.item_id for event in batch})
+            keep = [event for event in batch if event.item_id in known]
+            for item_id in {event.item_id for event in batch} - known.keys():
+                logger.warning("dropped intake events for unknown item %s", item_id)
+            self.dropped += len(batch) - len(keep)
+            return record_intakes(conn, keep)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="supplements-intake", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _loop(self) -> None:
+        try:
+            while not self._stop.is_set():
+                self._wake.wait(self.interval)
+                self._wake.clear()
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("writing intake events failed; will retry")
+        finally:
+            self.manager.close_thread_connection()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        # Stops the flush thread, then writes what is left from this thread.
+        atexit.unregister(self.close)
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict[str, int]:
+        return {"pending": self.pending(), "written": self.written, "dropped": self.dropped, "flushes": self.flushes}
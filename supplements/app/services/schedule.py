@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from ..models import ScheduleEntry
+
+SLOTS = ((1, "AM"), (2, "Midday"), (3, "PM"))
+
+
+@dataclass
+class ScheduleSlot:
+    slot: int
+    name: str
+    entries: list[ScheduleEntry] = field(default_factory=list)
+    # Summed amounts per unit, in first-seen order.
+    totals: dict[str, float] = field(default_factory=dict)
+    # Entries without an amount or unit, which cannot be summed.
+    unmeasured: int = 0
+
+
+def build_schedule(entries: Iterable[ScheduleEntry]) -> list[ScheduleSlot]:
+    # Groups repo.get_schedule() rows (already in slot order) into the three
+    # slots, adding up the doses as it goes. Empty slots are kept.
+    slots = {number: ScheduleSlot(number, name) for number, name in SLOTS}
+    for entry in entries:
+        slot = slots[entry.slot]
+        slot.entries.append(entry)
+        if entry.amount is not None and entry.unit:
+            slot.totals[entry.unit] = slot.totals.get(entry.unit, 0.0) + entry.amount
+        else:
+            slot.unmeasured += 1
+    return list(slots.values())
+
+
+def build_totals(rows: Iterable[tuple[int, Optional[str], float, int]]) -> list[ScheduleSlot]:
+    # The same slots from repo.get_schedule_totals(), with totals but no
+    # entries: for redrawing the slot headings when only some rows changed.
+    slots = {number: ScheduleSlot(number, name) for number, name in SLOTS}
+    for number, unit, total, count in rows:
+        if unit is None:
+            slots[number].unmeasured = count
+        else:
+            slots[number].totals[unit] = total
+    return list(slots.values())
+
+
+def format_totals(slot: ScheduleSlot) -> str:
+    parts = [f"{total:g} {unit}" for unit, total in slot.totals.items()]
+    if slot.unmeasured:
+        parts.append(f"{slot.unmeasured} without amount")
+    return ", ".join(parts)
+
+
+def format_with_food(entry: ScheduleEntry) -> str:
+    if entry.with_food is None:
+        return ""
+    return "with food" if entry.with_food else "without food"
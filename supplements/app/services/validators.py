@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+from datetime import date
+from typing import Any, Optional
+
+CATEGORIES = ("rx", "otc", "supplement")
+STATUSES = ("active", "paused", "stopped")
+INTAKE_STATUSES = ("taken", "skipped")
+
+_TEXT_FIELDS = (
+    "name_generic",
+    "brand",
+    "form",
+    "route",
+    "notes",
+    "prescriber",
+    "pharmacy",
+)
+_DOSE_TEXT_FIELDS = ("unit", "instructions")
+_DATE_FIELDS = ("start_date", "stop_date")
+_TIME_FIELDS = {"am": "time_am", "midday": "time_midday", "pm": "time_pm"}
+
+_TRUE = {"1", "true", "t", "yes", "y", "x"}
+_FALSE = {"0", "false", "f", "no", "n"}
+
+MAX_NAME_LEN = 200
+MAX_TEXT_LEN = 2000
+
+
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def parse_bool(value: Any) -> Optional[bool]:
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    text = str(value).strip().lower()
+    if not text:
+        return None
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError(f"not a yes/no value: {value!r}")
+
+
+def validate_dose_record(raw: dict[str, Any]) -> tuple[Optional[dict], list[str]]:
+    # Normalises one dose: amount, unit, time slots, with_food, instructions.
+    errors: list[str] = []
+    clean = _validate_dose(raw, errors)
+    if errors:
+        return None, errors
+    return clean, []
+
+
+def _validate_dose(raw: dict[str, Any], errors: list[str]) -> dict[str, Any]:
+    clean: dict[str, Any] = {}
+    for key in _DOSE_TEXT_FIELDS:
+        value = _text(raw.get(key))
+        if value is not None and len(value) > MAX_TEXT_LEN:
+            errors.append(f"{key} is longer than {MAX_TEXT_LEN} characters")
+        clean[key] = value
+
+    amount_raw = raw.get("amount")
+    amount: Optional[float] = None
+    if _text(amount_raw) is not None:
+        try:
+            amount = float(amount_raw)
+        except (TypeError, ValueError):
+            errors.append(f"amount must be a number (got {amount_raw!r})")
+        else:
+            if amount < 0:
+                errors.append("amount must not be negative")
+    clean["amount"] = amount
+
+    when = _text(raw.get("when"))
+    slots = set()
+    if when is not None:
+        for part in when.replace(";", ",").split(","):
+            slot = part.strip().lower()
+            if not slot:
+                continue
+            if slot not in _TIME_FIELDS:
+                errors.append(f"when must list AM, Midday or PM (got {part.strip()!r})")
+            slots.add(slot)
+
+    for slot, key in _TIME_FIELDS.items():
+        try:
+            flag = parse_bool(raw.get(key))
+        except ValueError as e:
+            errors.append(f"{key}: {e}")
+            flag = None
+        clean[key] = bool(flag) or slot in slots
+
+    try:
+        clean["with_food"] = parse_bool(raw.get("with_food"))
+    except ValueError as e:
+        errors.append(f"with_food: {e}")
+
+    return clean
+
+
+def validate_item_record(raw: dict[str, Any]) -> tuple[Optional[dict], list[str]]:
+    # Normalises one imported item record: (clean, []) on success, (None,
+    # reasons) when it must be rejected. `name` is accepted for name_display
+    # and a `when` column ("AM, PM") for the time_* flags; a `doses` list of
+    # dose objects replaces the inline dose fields.
+    errors: list[str] = []
+    clean: dict[str, Any] = {}
+
+    name = _text(raw.get("name_display", raw.get("name")))
+    if name is None:
+        errors.append("name_display is required")
+    elif len(name) > MAX_NAME_LEN:
+        errors.append(f"name_display is longer than {MAX_NAME_LEN} characters")
+    clean["name_display"] = name
+
+    category = (_text(raw.get("category")) or "supplement").lower()
+    if category not in CATEGORIES:
+        errors.append(f"category must be one of {', '.join(CATEGORIES)} (got {category!r})")
+    clean["category"] = category
+
+    status = (_text(raw.get("status")) or "active").lower()
+    if status not in STATUSES:
+        errors.append(f"status must be one of {', '.join(STATUSES)} (got {status!r})")
+    clean["status"] = status
+
+    for key in _TEXT_FIELDS:
+        value = _text(raw.get(key))
+        if value is not None and len(value) > MAX_TEXT_LEN:
+            errors.append(f"{key} is longer than {MAX_TEXT_LEN} characters")
+        clean[key] = value
+
+    for key in _DATE_FIELDS:
+        value = _text(raw.get(key))
+        if value is not None:
+            try:
+                date.fromisoformat(value)
+            except ValueError:
+                errors.append(f"{key} must be a YYYY-MM-DD date (got {value!r})")
+        clean[key] = value
+
+    # Either a "doses" list (JSON imports) or one dose's fields inline.
+    doses = raw.get("doses")
+    if doses is None:
+        clean.update(_validate_dose(raw, errors))
+    elif not isinstance(doses, list) or not all(isinstance(d, dict) for d in doses):
+        errors.append("doses must be a list of objects")
+    else:
+        clean["doses"] = []
+        for n, dose in enumerate(doses, start=1):
+            dose_errors: list[str] = []
+            clean["doses"].append(_validate_dose(dose, dose_errors))
+            errors.extend(f"dose {n}: {e}" for e in dose_errors)
+
+    if errors:
+        return None, errors
+    return clean, []
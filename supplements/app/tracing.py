@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import bisect
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+logger = logging.getLogger("app.sql")
+slow_logger = logging.getLogger("app.sql.slow")
+
+# Tracing is on unless SUPPLEMENTS_SQL_TRACE=0; it costs a couple of timer
+# reads and a dict lookup per statement.
+ENABLED = os.environ.get("SUPPLEMENTS_SQL_TRACE", "1") != "0"
+
+# Statements at or above this (execute plus fetch) go to the slow-query log
+# together with their EXPLAIN QUERY PLAN.
+SLOW_QUERY_MS = float(os.environ.get("SUPPLEMENTS_SLOW_QUERY_MS", "50"))
+SLOW_LOG_SIZE = 50
+
+# Histogram bucket upper bounds, in seconds.
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_NORMALIZED_CACHE_SIZE = 2048
+
+
+@dataclass
+class Histogram:
+    counts: list[int] = field(default_factory=lambda: [0] * (len(BUCKETS) + 1))
+    total_s: float = 0.0
+    max_s: float = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total_s += seconds
+        if seconds > self.max_s:
+            self.max_s = seconds
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th observation.
+        total = self.count
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max_s
+        return self.max_s
+
+
+@dataclass
+class StatementStats:
+    # latency covers execute plus fetching; fetch_s is the fetching part.
+    sql: str
+    latency: Histogram = field(default_factory=Histogram)
+    rows: int = 0
+    fetch_s: float = 0.0
+    errors: int = 0
+
+    @property
+    def calls(self) -> int:
+        return self.latency.count
+
+    @property
+    def total_s(self) -> float:
+        return self.latency.total_s
+
+
+@dataclass
+class SlowQuery:
+    at: float
+    sql: str
+    elapsed_s: float
+    rows: int
+    plan: list[str]
+
+
+def normalize_sql(sql: str) -> str:
+    # Literals become ?, IN lists collapse and whitespace is squeezed, so
+    # the same statement with different values lands in one group.
+    text = _STRING.sub("?", sql)
+    text = _NUMBER.sub("?", text)
+    text = " ".join(text.split())
+    return _IN_LIST.sub("(?...)", text)
+
+
+class QueryTracer:
+    # Process-wide statement statistics. New groups are added under a lock;
+    # updates to an existing group are plain attribute writes, which may
+    # rarely drop a count under heavy thread contention. That is the price
+    # of keeping the per-statement cost low.
+
+    def __init__(self, *, slow_ms: float = SLOW_QUERY_MS):
+        self.slow_s = slow_ms / 1000
+        self._lock = threading.Lock()
+        self._stats: dict[str, StatementStats] = {}
+        self._normalized: dict[str, str] = {}
+        self.commits = Histogram()
+        self.slow: deque[SlowQuery] = deque(maxlen=SLOW_LOG_SIZE)
+        self.slow_total = 0
+        self.started_at = time.time()
+
+    def stats_for(self, sql: str) -> StatementStats:
+        key = self._normalized.get(sql)
+        if key is None:
+            key = normalize_sql(sql)
+            if len(self._normalized) >= _NORMALIZED_CACHE_SIZE:
+                self._normalized.clear()
+            self._normalized[sql] = key
+        stats = self._stats.get(key)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(key, StatementStats(key))
+        return stats
+
+    def record_slow(self, conn: sqlite3.Connection, sql: str, params: Any, elapsed_s: float, rows: int) -> None:
+        plan = explain(conn, sql, params)
+        entry = SlowQuery(time.time(), normalize_sql(sql), elapsed_s, rows, plan)
+        with self._lock:
+            self.slow.append(entry)
+            self.slow_total += 1
+        slow_logger.warning(
+            "slow query %.1f ms, %d rows: %s%s",
+            elapsed_s * 1000,
+            rows,
+            entry.sql,
+            "".join(f"\n    {line}" for line in plan),
+        )
+
+    def statements(self) -> list[StatementStats]:
+        with self._lock:
+            return list(self._stats.values())
+
+    def slow_queries(self) -> list[SlowQuery]:
+        with self._lock:
+            return list(self.slow)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self.slow.clear()
+            self.slow_total = 0
+            self.commits = Histogram()
+            self.started_at = time.time()
+
+    def summary(self, *, limit: Optional[int] = None) -> list[dict]:
+        # Statement groups, most total time first.
+        rows = []
+        for s in sorted(self.statements(), key=lambda s: s.total_s, reverse=True)[:limit]:
+            calls = s.calls
+            rows.append(
+                {
+                    "sql": s.sql,
+                    "calls": calls,
+                    "errors": s.errors,
+                    "rows": s.rows,
+                    "total_ms": s.total_s * 1000,
+                    "avg_ms": s.total_s * 1000 / calls if calls else 0.0,
+                    "p50_ms": s.latency.quantile(0.5) * 1000,
+                    "p95_ms": s.latency.quantile(0.95) * 1000,
+                    "max_ms": s.latency.max_s * 1000,
+                }
+            )
+        return rows
+
+    def prometheus_text(self) -> str:
+        lines = [
+            "# HELP supplements_sql_statement_seconds Statement time including fetching, grouped by normalized SQL.",
+            "# TYPE supplements_sql_statement_seconds histogram",
+        ]
+        statements = self.statements()
+        for s in statements:
+            label = f'sql="{_escape_label(s.sql)}"'
+            _histogram_lines(lines, "supplements_sql_statement_seconds", label, s.latency)
+        lines += [
+            "# HELP supplements_sql_fetch_seconds_total Part of the statement time spent fetching rows.",
+            "# TYPE supplements_sql_fetch_seconds_total counter",
+        ]
+        lines += [f'supplements_sql_fetch_seconds_total{{sql="{_escape_label(s.sql)}"}} {s.fetch_s:.6f}' for s in statements]
+        lines += [
+            "# HELP supplements_sql_rows_total Rows returned or changed.",
+            "# TYPE supplements_sql_rows_total counter",
+        ]
+        lines += [f'supplements_sql_rows_total{{sql="{_escape_label(s.sql)}"}} {s.rows}' for s in statements]
+        lines += [
+            "# HELP supplements_sql_errors_total Statements that raised.",
+            "# TYPE supplements_sql_errors_total counter",
+        ]
+        lines += [f'supplements_sql_errors_total{{sql="{_escape_label(s.sql)}"}} {s.errors}' for s in statements]
+        lines += [
+            "# HELP supplements_sql_commit_seconds Time spent in COMMIT, including any fsync.",
+            "# TYPE supplements_sql_commit_seconds histogram",
+        ]
+        _histogram_lines(lines, "supplements_sql_commit_seconds", "", self.commits)
+        lines += [
+            "# HELP supplements_sql_slow_queries_total Statements over the slow-query threshold.",
+            "# TYPE supplements_sql_slow_queries_total counter",
+            f"supplements_sql_slow_queries_total {self.slow_total}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram_lines(lines: list[str], name: str, label: str, hist: Histogram) -> None:
+    sep = "," if label else ""
+    cumulative = 0
+    for bound, n in zip(BUCKETS, hist.counts):
+        cumulative += n
+        lines.append(f'{name}_bucket{{{label}{sep}le="{bound}"}} {cumulative}')
+    cumulative += hist.counts[-1]
+    lines.append(f'{name}_bucket{{{label}{sep}le="+Inf"}} {cumulative}')
+    braces = f"{{{label}}}" if label else ""
+    lines.append(f"{name}_sum{braces} {hist.total_s:.6f}")
+    lines.append(f"{name}_count{braces} {cumulative}")
+
+
+def explain(conn: sqlite3.Connection, sql: str, params: Any) -> list[str]:
+    if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+        return []
+    # A plain cursor, so the EXPLAIN itself is not traced.
+    cur = sqlite3.Cursor(conn)
+    cur.row_factory = None
+    try:
+        rows = cur.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    except sqlite3.Error as e:
+        return [f"(no plan: {e})"]
+    finally:
+        cur.close()
+
+    # Indent each step under its parent, like the sqlite3 shell does.
+    depth: dict[int, int] = {0: -1}
+    out = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        out.append("  " * depth[node_id] + detail)
+    return out
+
+
+TRACER = QueryTracer()
@@ -1,19 +1,129 @@
 from __future__ import annotations
 
+import asyncio
 import sqlite3
+from datetime import date, timedelta
+from typing import Optional, Sequence
 
 from textual.app import App
 
-from ..config import get_config
-from ..db import connect, init_db
+from ..async_repo import AsyncRepo
+from ..config import AppConfig, ensure_dirs, get_config
+from ..db import ConnectionManager, init_db
+from ..models import Dose, DoseRow, Item, ItemRow
+from ..services.backup import BackupScheduler
+from ..services.intake import IntakeBuffer
+from ..tracing import TRACER
 from ..repo import (
-    create_item_with_dose,
-    list_items,
+    change_seq,
+    create_item_with_doses,
+    data_generation,
+    get_history_page,
+    ItemCursor,
+    get_item_names,
+    get_item_with_doses,
+    get_adherence,
+    get_changed_items,
+    get_intake_for_day,
+    get_items_page,
+    get_schedule,
+    search_items,
     set_status,
-    update_item_and_dose,
+    update_item_and_doses,
 )
+from ..services.formatting import format_doses, format_doses_when
+from .screens.debug_view import DebugView
 from .screens.edit_item import EditItemScreen, SaveRequested
-from .screens.list_view import EditRequested, ListView, StatusRequested
+from .screens.export_preview import ExportPreviewScreen
+from .screens.history_view import HistoryRequested, HistoryView
+from .screens.list_view import EditRequested, ListView, SearchRequested, StatusRequested
+from .screens.schedule_view import ScheduleDay, ScheduleView
+
+# Writes from other processes (the web UI, the CLI, another TUI) show up
+# within this long. A poll with nothing new is one PRAGMA on the DB thread.
+POLL_INTERVAL_S = 0.5
+
+# Rows shown for a filter; the best matches come first.
+SEARCH_LIMIT = 100
+
+# A first load shows FIRST_WINDOW rows (about a screenful) as soon as they are
+# read, then fills in the rest NEXT_WINDOW rows per DB call.
+FIRST_WINDOW = 200
+NEXT_WINDOW = 5000
+
+# The schedule screen shows adherence over this many days, today included.
+ADHERENCE_DAYS = 7
+
+
+def _format_row(item: Item | ItemRow, doses: Sequence[Dose | DoseRow]) -> dict:
+    return {
+        "id": item.id,
+        "name": item.name_display,
+        "category": item.category,
+        "dose": format_doses(doses),
+        "when": format_doses_when(doses),
+        "brand": item.brand or "",
+        "notes": item.notes or "",
+    }
+
+
+def _poll_changes(
+    conn: sqlite3.Connection,
+    since: int,
+    seen_generation: Optional[int],
+) -> Optional[tuple[Optional[int], int, bool, list[tuple[str, dict]], list[str]]]:
+    # Runs on the DB thread. Returns None when nothing changed, otherwise
+    # (generation, seq, reset, [(status, row)] for changed items, deleted
+    # ids). reset means the feed ends before `since`: the database was
+    # restored or replaced, and everything loaded must be read again.
+    generation = data_generation(conn)
+    if generation is not None and generation == seen_generation:
+        return None
+    items, deleted, seq = get_changed_items(conn, since)
+    if not items and not deleted:
+        seq = change_seq(conn)
+        if seq < since:
+            return generation, seq, True, [], []
+    return generation, seq, False, [(item.status, _format_row(item, doses)) for item, doses in items], deleted
+
+
+def _load_screen_window(
+    conn: sqlite3.Connection,
+    status: str,
+    after: Optional[ItemCursor],
+    limit: int = NEXT_WINDOW,
+) -> tuple[list[dict], Optional[ItemCursor]]:
+    items, cursor = get_items_page(conn, status, after=after, limit=limit, as_tuples=True)
+    return [_format_row(item, doses) for item, doses in items], cursor
+
+
+def _search_screen_rows(conn: sqlite3.Connection, status: str, text: str) -> list[dict]:
+    return [_format_row(item, doses) for item, doses in search_items(conn, text, status=status, limit=SEARCH_LIMIT)]
+
+
+def _load_schedule_day(conn: sqlite3.Connection, intake: IntakeBuffer, day: str) -> ScheduleDay:
+    # Runs on the DB thread. A read, so the intake buffer is not flushed:
+    # queued marks are laid over the written ones, and the adherence line
+    # catches up once they are written, within intake.FLUSH_INTERVAL_S.
+    start = (date.fromisoformat(day) - timedelta(days=ADHERENCE_DAYS - 1)).isoformat()
+    marks = get_intake_for_day(conn, day)
+    for event in intake.pending_events():
+        if event.day == day:
+            marks[(event.dose_id, event.slot)] = event.status
+    return get_schedule(conn), marks, get_adherence(conn, start=start, end=day)
+
+
+def _edit_payload_kwargs(p: dict) -> dict:
+    return {
+        "name_display": p["name_display"],
+        "category": p["category"],
+        "name_generic": p["name_generic"],
+        "brand": p["brand"],
+        "form": p["form"],
+        "route": p["route"],
+        "notes": p["notes"],
+        "doses": p["doses"],
+    }
 
 
 class SupplementsTUI(App):
@@ -22,20 +132,43 @@ class SupplementsTUI(App):
     #buttons { padding: 1 2; height: auto; }
     #modal_title { padding: 1 2; }
     #error { padding: 0 2; color: red; }
+    #doses { height: auto; padding: 0 1; }
+    .dose_row { height: auto; }
+    .dose_row Label { padding: 1 1 0 0; }
+    .dose_row Input { width: 16; }
     """
 
     BINDINGS = [
         ("1", "show_active", "Active"),
         ("2", "show_paused", "Paused"),
         ("3", "show_stopped", "Stopped"),
+        ("t", "show_schedule", "Schedule"),
+        ("H", "show_history", "All history"),
+        ("e", "export", "Export"),
+        ("D", "show_debug", "SQL stats"),
         ("q", "quit", "Quit"),
     ]
 
-    def __init__(self):
+    def __init__(self, cfg: Optional[AppConfig] = None, *, backups: bool = True):
         super().__init__()
-        self.cfg = get_config()
-        self.conn: sqlite3.Connection = connect(self.cfg.db_path)
-        init_db(self.conn)
+        self.cfg = cfg or get_config()
+        ensure_dirs(self.cfg)
+        self.db = ConnectionManager(self.cfg.db_path)
+        # All repo calls run on the facade's DB thread; handlers only await.
+        self.repo = AsyncRepo(self.db, on_pending=self._on_db_pending)
+        self.repo.call(init_db, self.cfg.backups_dir)
+        # Position in the change feed that the loaded screens have applied,
+        # and repo.data_generation when it was read.
+        self.change_seq: int = self.repo.call(change_seq)
+        self.generation: Optional[int] = None
+        self._polling = False
+        self._poll_again = False
+        # Held from a DB read until its rows are applied, so a first-load
+        # window and a poll result reach a screen in the order they were read.
+        self._apply_lock = asyncio.Lock()
+        # backups=False is for benchmarks and scripted runs.
+        self.backups = BackupScheduler(self.cfg.db_path, self.cfg.backups_dir) if backups else None
+        self.intake = IntakeBuffer(self.db)
 
         self.screens_by_name = {
             "active": ListView("Active (1/2/3 to switch)", "active"),
@@ -43,56 +176,108 @@ class SupplementsTUI(App):
             "stopped": ListView("Stopped (1/2/3 to switch)", "stopped"),
         }
 
+    def on_unmount(self) -> None:
+        if self.backups is not None:
+            self.backups.stop(timeout=5)
+        self.intake.close(timeout=5)
+        self.repo.close()
+        self.db.close()
+
     def on_mount(self) -> None:
         for name, screen in self.screens_by_name.items():
             self.install_screen(screen, name=name)
+        if self.backups is not None:
+            self.backups.start()
+        self.intake.start()
 
         self.push_screen("active")
-        self.call_after_refresh(lambda: self._refresh_screen("active"))
+        self._schedule_refresh("active")
+        self.set_interval(POLL_INTERVAL_S, self._schedule_poll)
+
+    def _on_db_pending(self, pending: int) -> None:
+        for screen in self.screens_by_name.values():
+            screen.set_busy(pending > 0)
 
-    def _refresh_screen(self, name: str) -> None:
+    def _schedule_refresh(self, name: str) -> None:
+        # Workers run as their own tasks, so the app's message queue (and
+        # with it key handling) never waits on the database.
+        self.run_worker(self._refresh_screen(name), group="refresh")
+
+    async def _refresh_screen(self, name: str) -> None:
+        # First load of a status tab. From then on the change feed keeps it
+        # current, so switching back to it reads nothing.
         screen = self.screens_by_name[name]
-        rows = list_items(self.conn, screen.status)
-
-        formatted = []
-        for item, dose in rows:
-            when = ""
-            dose_str = ""
-
-            if dose:
-                parts = []
-                if dose.time_am:
-                    parts.append("AM")
-                if dose.time_midday:
-                    parts.append("Midday")
-                if dose.time_pm:
-                    parts.append("PM")
-                when = ", ".join(parts)
-
-                if dose.amount is not None and dose.unit:
-                    dose_str = f"{dose.amount:g} {dose.unit}"
-                elif dose.amount is not None:
-                    dose_str = f"{dose.amount:g}"
-                elif dose.unit:
-                    dose_str = dose.unit
-
-            formatted.append(
-                {
-                    "id": item.id,
-                    "name": item.name_display,
-                    "category": item.category,
-                    "dose": dose_str,
-                    "when": when,
-                    "brand": item.brand or "",
-                    "notes": item.notes or "",
-                }
-            )
+        if screen.loaded or screen.paging:
+            return
+        screen.paging = True
+        try:
+            async with self._apply_lock:
+                rows, cursor = await self.repo.read(_load_screen_window, screen.status, None, FIRST_WINDOW)
+                screen.load_rows(rows)
+                screen.loaded = True
+
+            # Later windows continue in list order, so they are appended as is.
+            # Changes made meanwhile arrive through the change feed; the screen
+            # holds them until the last window is in.
+            while cursor is not None:
+                async with self._apply_lock:
+                    rows, cursor = await self.repo.read(_load_screen_window, screen.status, cursor)
+                    screen.append_rows(rows)
+        finally:
+            async with self._apply_lock:
+                screen.finish_paging()
 
-        screen.load_rows(formatted)
+    def _schedule_poll(self) -> None:
+        if self._polling:
+            # The running poll may have read before the change that asked
+            # for this one.
+            self._poll_again = True
+            return
+        self._polling = True
+        self.run_worker(self._poll_changes(), group="poll")
+
+    async def _poll_changes(self) -> None:
+        try:
+            async with self._apply_lock:
+                changed = await self._apply_changes()
+        finally:
+            self._polling = False
+        if changed and isinstance(self.screen, ScheduleView):
+            self.screen.action_reload()
+        if self._poll_again:
+            self._poll_again = False
+            self._schedule_poll()
+
+    async def _apply_changes(self) -> bool:
+        result = await self.repo.poll(_poll_changes, self.change_seq, self.generation)
+        if result is None:
+            return False
+        generation, seq, reset, changed, deleted = result
+        self.generation = generation
+        if seq == self.change_seq:
+            return False
+        self.change_seq = seq
+        if reset:
+            # Loaded tabs load again from the first window; load_rows drops
+            # whatever the new database does not have.
+            for name, screen in self.screens_by_name.items():
+                if screen.loaded:
+                    screen.loaded = False
+                    self._schedule_refresh(name)
+            return True
+        # Each loaded tab takes the changed items in its status and drops
+        # the rest, so an item whose status changed moves between tabs.
+        for screen in self.screens_by_name.values():
+            if not screen.loaded:
+                continue
+            upserts = [row for status, row in changed if status == screen.status]
+            removed = [row["id"] for status, row in changed if status != screen.status]
+            screen.apply_rows(upserts, removed + deleted)
+        return True
 
     def _switch_and_refresh(self, name: str) -> None:
         self.switch_screen(name)
-        self.call_after_refresh(lambda: self._refresh_screen(name))
+        self._schedule_refresh(name)
 
     def action_show_active(self) -> None:
         self._switch_and_refresh("active")
@@ -103,87 +288,97 @@ class SupplementsTUI(App):
     def action_show_stopped(self) -> None:
         self._switch_and_refresh("stopped")
 
-    async def on_edit_requested(self, message: EditRequested) -> None:
-        item_id = message.item_id
+    async def action_export(self) -> None:
+        await self.push_screen(ExportPreviewScreen(self.db.reader, self.cfg.exports_dir))
+
+    async def action_show_schedule(self) -> None:
+        await self.push_screen(
+            ScheduleView(lambda day: self.repo.read(_load_schedule_day, self.intake, day), self.intake.record)
+        )
+
+    async def action_show_debug(self) -> None:
+        await self.push_screen(DebugView(TRACER, self.db.lock_stats))
+
+    def action_show_history(self) -> None:
+        self.post_message(HistoryRequested(None))
+
+    def on_history_requested(self, message: HistoryRequested) -> None:
+        self.run_worker(self._open_history(message.item_id), group="history")
+
+    async def _open_history(self, item_id: str | None) -> None:
+        title = "History (all items)"
+        if item_id:
+            names = await self.repo.read(get_item_names, [item_id])
+            title = f"History: {names.get(item_id, item_id)}"
+
+        await self.push_screen(
+            HistoryView(
+                lambda **query: self.repo.read(get_history_page, **query),
+                lambda item_ids: self.repo.read(get_item_names, item_ids),
+                item_id=item_id,
+                title=title,
+            )
+        )
+
+    def on_search_requested(self, message: SearchRequested) -> None:
+        # exclusive: a newer keystroke's search supersedes one still queued.
+        self.run_worker(self._search(message.status, message.text), group=f"search-{message.status}", exclusive=True)
+
+    async def _search(self, status: str, text: str) -> None:
+        rows = await self.repo.read(_search_screen_rows, status, text)
+        self.screens_by_name[status].show_search_results(text, rows)
+
+    def on_edit_requested(self, message: EditRequested) -> None:
+        self.run_worker(self._open_editor(message.item_id), group="edit")
+
+    async def _open_editor(self, item_id: str | None) -> None:
         initial = {}
 
         if item_id:
-            for status in ["active", "paused", "stopped"]:
-                rows = list_items(self.conn, status)
-                for item, dose in rows:
-                    if item.id == item_id:
-                        initial = {
-                            "name_display": item.name_display,
-                            "category": item.category,
-                            "brand": item.brand,
-                            "name_generic": item.name_generic,
-                            "form": item.form,
-                            "route": item.route,
-                            "notes": item.notes,
-                            "amount": None if not dose else dose.amount,
-                            "unit": None if not dose else dose.unit,
-                            "time_am": False if not dose else bool(dose.time_am),
-                            "time_midday": False if not dose else bool(dose.time_midday),
-                            "time_pm": False if not dose else bool(dose.time_pm),
+            found = await self.repo.read(get_item_with_doses, item_id)
+            if found is not None:
+                item, doses = found
+                initial = {
+                    "name_display": item.name_display,
+                    "category": item.category,
+                    "brand": item.brand,
+                    "name_generic": item.name_generic,
+                    "form": item.form,
+                    "route": item.route,
+                    "notes": item.notes,
+                    "doses": [
+                        {
+                            "id": dose.id,
+                            "amount": dose.amount,
+                            "unit": dose.unit,
+                            "time_am": bool(dose.time_am),
+                            "time_midday": bool(dose.time_midday),
+                            "time_pm": bool(dose.time_pm),
+                            "with_food": dose.with_food,
+                            "instructions": dose.instructions,
                         }
-                        break
+                        for dose in doses
+                    ],
+                }
 
         await self.push_screen(EditItemScreen(item_id, initial))
 
-    async def on_save_requested(self, message: SaveRequested) -> None:
-        item_id = message.item_id
-        p = message.payload
+    def on_save_requested(self, message: SaveRequested) -> None:
+        self.run_worker(self._save(message.item_id, message.payload), group="write")
 
+    async def _save(self, item_id: str | None, payload: dict) -> None:
         if item_id is None:
-            create_item_with_dose(
-                self.conn,
-                name_display=p["name_display"],
-                category=p["category"],
-                name_generic=p["name_generic"],
-                brand=p["brand"],
-                form=p["form"],
-                route=p["route"],
-                notes=p["notes"],
-                amount=p["amount"],
-                unit=p["unit"],
-                time_am=p["time_am"],
-                time_midday=p["time_midday"],
-                time_pm=p["time_pm"],
-                with_food=None,
-                instructions=None,
-            )
+            await self.repo.write(create_item_with_doses, **_edit_payload_kwargs(payload))
         else:
-            update_item_and_dose(
-                self.conn,
-                item_id=item_id,
-                name_display=p["name_display"],
-                category=p["category"],
-                name_generic=p["name_generic"],
-                brand=p["brand"],
-                form=p["form"],
-                route=p["route"],
-                notes=p["notes"],
-                amount=p["amount"],
-                unit=p["unit"],
-                time_am=p["time_am"],
-                time_midday=p["time_midday"],
-                time_pm=p["time_pm"],
-                with_food=None,
-                instructions=None,
-            )
+            await self.repo.write(update_item_and_doses, item_id=item_id, **_edit_payload_kwargs(payload))
+
+        # Our own write moves the generation, so the next poll picks it up;
+        # no need to wait for the timer.
+        self._schedule_poll()
+
+    def on_status_requested(self, message: StatusRequested) -> None:
+        self.run_worker(self._set_status(message.item_id, message.new_status), group="write")
 
-        # Refresh the currently visible status tab
-        current = self.screen
-        for name, scr in self.screens_by_name.items():
-            if scr is current:
-                self.call_after_refresh(lambda n=name: self._refresh_screen(n))
-                break
-
-    async def on_status_requested(self, message: StatusRequested) -> None:
-        set_status(self.conn, item_id=message.item_id, status=message.new_status)
-
-        current = self.screen
-        for name, scr in self.screens_by_name.items():
-            if scr is current:
-                self.call_after_refresh(lambda n=name: self._refresh_screen(n))
-                break
+    async def _set_status(self, item_id: str, status: str) -> None:
+        await self.repo.write(set_status, item_id=item_id, status=status)
+        self._schedule_poll()
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import time
+from typing import Callable
+
+from rich.text import Text
+from textual.app import ComposeResult
+from textual.containers import VerticalScroll
+from textual.screen import Screen
+from textual.widgets import DataTable, Static
+
+from ...tracing import QueryTracer
+
+LockStats = Callable[[], dict[str, float]]
+
+
+class DebugView(Screen):
+    # SQL statistics straight from the in-process tracer; nothing here
+    # touches the database, so it is safe to leave open while working.
+    REFRESH_S = 2.0
+    TOP_STATEMENTS = 50
+    SQL_WIDTH = 70
+
+    BINDINGS = [
+        ("escape", "close", "Back"),
+        ("r", "reload", "Reload"),
+        ("x", "reset", "Reset stats"),
+    ]
+
+    def __init__(self, tracer: QueryTracer, lock_stats: LockStats):
+        super().__init__()
+        self.tracer = tracer
+        self.lock_stats = lock_stats
+
+    def compose(self) -> ComposeResult:
+        yield Static("SQL statistics (r reload, x reset)", id="title")
+        yield Static("", id="totals", markup=False)
+        yield DataTable(id="statements")
+        with VerticalScroll(id="slow_scroll"):
+            yield Static("", id="slow", markup=False)
+
+    def on_mount(self) -> None:
+        table = self.query_one("#statements", DataTable)
+        table.add_columns("SQL", "Calls", "Rows", "Total ms", "Avg ms", "p50", "p95", "Max ms", "Err")
+        table.cursor_type = "row"
+        table.focus()
+        self._show()
+        self.set_interval(self.REFRESH_S, self._show)
+
+    def action_close(self) -> None:
+        self.dismiss(None)
+
+    def action_reload(self) -> None:
+        self._show()
+
+    def action_reset(self) -> None:
+        self.tracer.reset()
+        self._show()
+
+    def _show(self) -> None:
+        commits = self.tracer.commits
+        locks = self.lock_stats()
+        since = time.strftime("%H:%M:%S", time.localtime(self.tracer.started_at))
+        self.query_one("#totals", Static).update(
+            f"since {since}  |  commits {commits.count}, "
+            f"avg {commits.total_s * 1000 / commits.count if commits.count else 0:.2f} ms, "
+            f"max {commits.max_s * 1000:.2f} ms  |  write lock waits {locks['waits']}, "
+            f"avg {locks['avg_wait_ms']:.2f} ms, max {locks['max_wait_ms']:.2f} ms  |  "
+            f"slow queries {self.tracer.slow_total} (>= {self.tracer.slow_s * 1000:g} ms)"
+        )
+
+        table = self.query_one("#statements", DataTable)
+        row = table.cursor_row
+        table.clear()
+        for s in self.tracer.summary(limit=self.TOP_STATEMENTS):
+            sql = s["sql"]
+            # Text, not str: SQL is not Rich markup.
+            table.add_row(
+                Text(sql if len(sql) <= self.SQL_WIDTH else sql[: self.SQL_WIDTH - 1] + "…"),
+                s["calls"],
+                s["rows"],
+                f"{s['total_ms']:.1f}",
+                f"{s['avg_ms']:.2f}",
+                f"≤{s['p50_ms']:g}",
+                f"≤{s['p95_ms']:g}",
+                f"{s['max_ms']:.1f}",
+                s["errors"] or "",
+            )
+        if table.row_count:
+            table.move_cursor(row=min(row, table.row_count - 1))
+
+        lines = []
+        for q in reversed(self.tracer.slow_queries()):
+            at = time.strftime("%H:%M:%S", time.localtime(q.at))
+            lines.append(f"{at}  {q.elapsed_s * 1000:.1f} ms, {q.rows} rows  {q.sql}")
+            lines.extend(f"    {step}" for step in q.plan)
+        self.query_one("#slow", Static).update("\n".join(lines) or "No slow queries.")
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from textual.app import ComposeResult
-from textual.containers import Grid
+from textual.containers import Grid, Horizontal, Vertical
 from textual.message import Message
 from textual.screen import ModalScreen
 from textual.widgets import Button, Checkbox, Input, Label, Select, Static
@@ -15,15 +15,21 @@ class SaveRequested(Message, bubble=True):
 
 
 class EditItemScreen(ModalScreen):
+    # One row per dose: amount, unit and time slots. with_food and
+    # instructions are not edited here and are kept as they were. Rows left
+    # completely blank are dropped on save, except a lone first one.
+
     def __init__(self, item_id: str | None, initial: dict):
         super().__init__()
         self.item_id = item_id
         self.initial = initial
+        # Existing doses by row, None for rows added here.
+        self.doses: list[dict | None] = list(initial.get("doses") or [None])
 
     def compose(self) -> ComposeResult:
         yield Static("Add/Edit Item", id="modal_title")
 
-        with Grid(id="form"):
+        with Grid(id="edit_form"):
             yield Label("Name")
             yield Input(value=self.initial.get("name_display", ""), id="name_display")
 
@@ -50,35 +56,48 @@ class EditItemScreen(ModalScreen):
             yield Label("Route")
             yield Input(value=self.initial.get("route", "") or "", id="route")
 
-            yield Label("Dose amount")
-            yield Input(value=self.initial.get("amount", "") or "", id="amount", placeholder="ex: 10 or 600")
-
-            yield Label("Dose unit")
-            yield Input(value=self.initial.get("unit", "") or "", id="unit", placeholder="mg, mcg, IU, g, caps, tabs")
-
-            yield Label("When")
-            yield Checkbox("AM", value=bool(self.initial.get("time_am", False)), id="time_am")
-            yield Checkbox("Midday", value=bool(self.initial.get("time_midday", False)), id="time_midday")
-            yield Checkbox("PM", value=bool(self.initial.get("time_pm", False)), id="time_pm")
-
             yield Label("Notes")
             yield Input(value=self.initial.get("notes", "") or "", id="notes")
 
+        with Vertical(id="doses"):
+            for i, dose in enumerate(self.doses):
+                yield self._dose_row(i, dose)
+
         yield Static("", id="error")
 
         yield Button("Save", id="save", variant="primary")
+        yield Button("Add dose", id="add_dose")
         yield Button("Cancel", id="cancel")
 
+    def _dose_row(self, i: int, dose: dict | None) -> Horizontal:
+        dose = dose or {}
+        amount = dose.get("amount")
+        return Horizontal(
+            Label(f"Dose {i + 1}"),
+            Input(value="" if amount is None else f"{amount:g}", id=f"amount-{i}", placeholder="amount"),
+            Input(value=dose.get("unit") or "", id=f"unit-{i}", placeholder="mg, mcg, IU, caps"),
+            Checkbox("AM", value=bool(dose.get("time_am")), id=f"time_am-{i}"),
+            Checkbox("Midday", value=bool(dose.get("time_midday")), id=f"time_midday-{i}"),
+            Checkbox("PM", value=bool(dose.get("time_pm")), id=f"time_pm-{i}"),
+            classes="dose_row",
+        )
+
     def on_mount(self) -> None:
-        self.query_one("#form", Grid).styles.grid_size_columns = 2
-        self.query_one("#form", Grid).styles.grid_size_rows = "auto"
+        self.query_one("#edit_form", Grid).styles.grid_size_columns = 2
         self.query_one("#name_display", Input).focus()
 
-    def on_button_pressed(self, event: Button.Pressed) -> None:
+    async def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "cancel":
             self.dismiss(None)
             return
 
+        if event.button.id == "add_dose":
+            i = len(self.doses)
+            self.doses.append(None)
+            await self.query_one("#doses", Vertical).mount(self._dose_row(i, None))
+            self.query_one(f"#amount-{i}", Input).focus()
+            return
+
         if event.button.id != "save":
             return
 
@@ -89,14 +108,32 @@ class EditItemScreen(ModalScreen):
 
         category = self.query_one("#category", Select).value or "supplement"
 
-        amount_raw = self.query_one("#amount", Input).value.strip()
-        amount = None
-        if amount_raw:
-            try:
-                amount = float(amount_raw)
-            except ValueError:
-                self.query_one("#error", Static).update("Dose amount must be a number.")
-                return
+        doses = []
+        for i, existing in enumerate(self.doses):
+            existing = existing or {}
+            amount_raw = self.query_one(f"#amount-{i}", Input).value.strip()
+            amount = None
+            if amount_raw:
+                try:
+                    amount = float(amount_raw)
+                except ValueError:
+                    self.query_one("#error", Static).update(f"Dose {i + 1} amount must be a number.")
+                    return
+            dose = {
+                "id": existing.get("id"),
+                "amount": amount,
+                "unit": self.query_one(f"#unit-{i}", Input).value.strip() or None,
+                "time_am": self.query_one(f"#time_am-{i}", Checkbox).value,
+                "time_midday": self.query_one(f"#time_midday-{i}", Checkbox).value,
+                "time_pm": self.query_one(f"#time_pm-{i}", Checkbox).value,
+                "with_food": existing.get("with_food"),
+                "instructions": existing.get("instructions"),
+            }
+            blank = dose["amount"] is None and not dose["unit"] and not (
+                dose["time_am"] or dose["time_midday"] or dose["time_pm"]
+            )
+            if not blank or (i == 0 and len(self.doses) == 1):
+                doses.append(dose)
 
         payload = {
             "name_display": name_display,
@@ -106,13 +143,7 @@ class EditItemScreen(ModalScreen):
             "form": self.query_one("#form", Input).value.strip() or None,
             "route": self.query_one("#route", Input).value.strip() or None,
             "notes": self.query_one("#notes", Input).value.strip() or None,
-            "amount": amount,
-            "unit": self.query_one("#unit", Input).value.strip() or None,
-            "time_am": self.query_one("#time_am", Checkbox).value,
-            "time_midday": self.query_one("#time_midday", Checkbox).value,
-            "time_pm": self.query_one("#time_pm", Checkbox).value,
-            "with_food": None,
-            "instructions": None,
+            "doses": doses,
         }
 
         self.post_message(SaveRequested(self.item_id, payload))
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from contextlib import AbstractContextManager
+from pathlib import Path
+from typing import Callable
+
+from textual import work
+from textual.app import ComposeResult
+from textual.containers import Horizontal, VerticalScroll
+from textual.screen import ModalScreen
+from textual.widgets import Button, ProgressBar, Static
+
+from ...services.doctor_export import ExportCancelled, export_doctor
+
+OpenReader = Callable[[], AbstractContextManager[sqlite3.Connection]]
+
+
+class ExportPreviewScreen(ModalScreen):
+    # The plain-text export doubles as the preview. It is produced by a
+    # worker thread on its own read-only connection; the first PAGE_LINES
+    # lines are shown as soon as they exist and the rest only advance the
+    # progress bar.
+    PAGE_LINES = 40
+
+    BINDINGS = [
+        ("escape", "cancel", "Cancel"),
+    ]
+
+    def __init__(self, open_reader: OpenReader, exports_dir: Path):
+        super().__init__()
+        self.open_reader = open_reader
+        self.exports_dir = exports_dir
+        self._cancel = threading.Event()
+        self._busy = False
+
+    def compose(self) -> ComposeResult:
+        yield Static("Doctor export preview", id="modal_title")
+        yield ProgressBar(id="progress", show_eta=False)
+        # Preview lines come from user data and status lines from paths and
+        # errors: plain text, not Textual markup.
+        yield Static("Starting…", id="status", markup=False)
+        with VerticalScroll(id="preview_scroll"):
+            yield Static("", id="preview", markup=False)
+        with Horizontal(id="buttons"):
+            yield Button("Save HTML", id="save_html", disabled=True)
+            yield Button("Save CSV", id="save_csv", disabled=True)
+            yield Button("Cancel", id="cancel", variant="error")
+
+    def on_mount(self) -> None:
+        self._start("txt")
+
+    def _start(self, fmt: str) -> None:
+        self._cancel.set()
+        self._cancel = threading.Event()
+        self._busy = True
+        self.query_one("#cancel", Button).label = "Cancel"
+        self.query_one("#save_html", Button).disabled = True
+        self.query_one("#save_csv", Button).disabled = True
+        self.query_one("#progress", ProgressBar).update(total=None, progress=0)
+        self.query_one("#status", Static).update(f"Generating {fmt.upper()}…")
+        self._run_export(fmt, self._cancel)
+
+    @work(thread=True, exclusive=True, group="export")
+    def _run_export(self, fmt: str, cancel: threading.Event) -> None:
+        page: list[str] = []
+        pending = [""]
+        page_shown = False
+
+        def on_chunk(chunk: str) -> None:
+            nonlocal page_shown
+            if page_shown:
+                return
+            lines = (pending[0] + chunk).split("\n")
+            pending[0] = lines.pop()
+            page.extend(lines)
+            if len(page) >= self.PAGE_LINES:
+                page_shown = True
+                self.app.call_from_thread(self._show_page, page[: self.PAGE_LINES], True)
+
+        def progress(done: int, total: int) -> None:
+            self.app.call_from_thread(self._show_progress, done, total)
+
+        try:
+            with self.open_reader() as conn:
+                path = export_doctor(
+                    conn,
+                    self.exports_dir,
+                    fmt,
+                    progress=progress,
+                    cancel=cancel,
+                    on_chunk=on_chunk if fmt == "txt" else None,
+                )
+        except ExportCancelled:
+            self.app.call_from_thread(self._finished, None, "Export cancelled.")
+            return
+        except Exception as e:
+            self.app.call_from_thread(self._finished, None, f"Export failed: {e}")
+            return
+
+        if fmt == "txt" and not page_shown:
+            # Short list, or a cached artifact that produced no chunks.
+            with path.open(encoding="utf-8") as fp:
+                first = [line.rstrip("\n") for _, line in zip(range(self.PAGE_LINES + 1), fp)]
+            self.app.call_from_thread(self._show_page, first[: self.PAGE_LINES], len(first) > self.PAGE_LINES)
+        self.app.call_from_thread(self._finished, path, f"Saved {path}")
+
+    def _show_page(self, lines: list[str], truncated: bool) -> None:
+        text = "\n".join(lines)
+        if truncated:
+            text += "\n…"
+        self.query_one("#preview", Static).update(text)
+
+    def _show_progress(self, done: int, total: int) -> None:
+        self.query_one("#progress", ProgressBar).update(total=max(total, 1), progress=done)
+
+    def _finished(self, path: Path | None, message: str) -> None:
+        self._busy = False
+        self.query_one("#status", Static).update(message)
+        self.query_one("#cancel", Button).label = "Close"
+        self.query_one("#save_html", Button).disabled = False
+        self.query_one("#save_csv", Button).disabled = False
+        if path is not None:
+            bar = self.query_one("#progress", ProgressBar)
+            bar.update(total=max(bar.total or 1, 1), progress=bar.total or 1)
+
+    def action_cancel(self) -> None:
+        if self._busy:
+            self._cancel.set()
+            self.query_one("#status", Static).update("Cancelling…")
+            return
+        self.dismiss(None)
+
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        if event.button.id == "cancel":
+            self.action_cancel()
+        elif event.button.id == "save_html":
+            self._start("html")
+        elif event.button.id == "save_csv":
+            self._start("csv")
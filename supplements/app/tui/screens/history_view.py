@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+from collections import deque
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Iterable, Optional
+
+from textual.app import ComposeResult
+from textual.containers import Horizontal
+from textual.message import Message
+from textual.screen import Screen
+from textual.widgets import DataTable, Input, Select, Static
+
+from ...models import HistoryEvent
+from ...repo import HistoryCursor
+from ...services.history import describe_event
+
+FetchPage = Callable[..., Awaitable[tuple[list[HistoryEvent], Optional[HistoryCursor]]]]
+ItemNames = Callable[[Iterable[str]], Awaitable[dict[str, str]]]
+
+ACTIONS = (
+    ("All actions", ""),
+    ("Created", "create"),
+    ("Updated", "update"),
+    ("Status", "status_change"),
+)
+
+
+class HistoryRequested(Message, bubble=True):
+    def __init__(self, item_id: str | None):
+        super().__init__()
+        self.item_id = item_id
+
+
+class HistoryView(Screen):
+    # Only a window of MAX_PAGES pages is ever held (in memory and in the
+    # DataTable). Moving the cursor within PREFETCH_ROWS of either edge pulls
+    # the next keyset page in that direction and drops the page at the far end.
+    PAGE_SIZE = 100
+    MAX_PAGES = 3
+    PREFETCH_ROWS = 10
+
+    BINDINGS = [
+        ("escape", "close", "Back"),
+        ("r", "reload", "Reload"),
+    ]
+
+    def __init__(self, fetch_page: FetchPage, item_names: ItemNames, *, item_id: str | None = None, title: str = "History"):
+        super().__init__()
+        self.fetch_page = fetch_page
+        self.item_names = item_names
+        self.item_id = item_id
+        self.title = title
+        self._filters: dict[str, Optional[str]] = {"action": None, "since": None, "until": None}
+        self._pages: deque[list[HistoryEvent]] = deque()
+        self._names: dict[str, str] = {}
+        self._has_older = False
+        self._has_newer = False
+        self._loading = False
+
+    def compose(self) -> ComposeResult:
+        yield Static(self.title, id="title")
+        with Horizontal(id="filters"):
+            yield Select(ACTIONS, value="", allow_blank=False, id="action")
+            yield Input(placeholder="from YYYY-MM-DD", id="since")
+            yield Input(placeholder="to YYYY-MM-DD", id="until")
+        yield Static("", id="error")
+        yield DataTable(id="history_table")
+
+    def on_mount(self) -> None:
+        table = self.query_one("#history_table", DataTable)
+        table.add_columns("When", "Item", "Action", "Change")
+        table.cursor_type = "row"
+        table.focus()
+        self.run_worker(self._reload(), group="history-page", exclusive=True)
+
+    def action_close(self) -> None:
+        self.dismiss(None)
+
+    def action_reload(self) -> None:
+        self.run_worker(self._reload(), group="history-page", exclusive=True)
+
+    async def _reload(self) -> None:
+        events, cursor = await self._fetch()
+        self._pages = deque([events] if events else [])
+        self._has_older = cursor is not None
+        self._has_newer = False
+        await self._remember_names(events)
+        self._show_window(cursor_row=0)
+
+    def on_select_changed(self, event: Select.Changed) -> None:
+        if event.select.id == "action":
+            self._filters["action"] = str(event.value) or None
+            self.action_reload()
+
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        if event.input.id not in ("since", "until"):
+            return
+        raw = event.value.strip()
+        error = self.query_one("#error", Static)
+        if not raw:
+            self._filters[event.input.id] = None
+        else:
+            try:
+                day = date.fromisoformat(raw)
+            except ValueError:
+                error.update("Dates must look like 2024-01-31.")
+                return
+            # `until` is inclusive for the user; the repo bound is exclusive.
+            if event.input.id == "until":
+                day += timedelta(days=1)
+            self._filters[event.input.id] = day.isoformat()
+        error.update("")
+        self.action_reload()
+
+    def on_data_table_row_highlighted(self, event: DataTable.RowHighlighted) -> None:
+        if self._loading or event.data_table.id != "history_table":
+            return
+        row = event.cursor_row
+        # Rebuilding the window queues a highlight for row 0 that is stale by
+        # the time it arrives; only react to where the cursor really is.
+        if row != event.data_table.cursor_row:
+            return
+        if row >= event.data_table.row_count - self.PREFETCH_ROWS and self._has_older:
+            self._loading = True
+            self.run_worker(self._load(self._extend_older), group="history-page")
+        elif row < self.PREFETCH_ROWS and self._has_newer:
+            self._loading = True
+            self.run_worker(self._load(self._extend_newer), group="history-page")
+
+    async def _fetch(self, **cursor: Optional[HistoryCursor]) -> tuple[list[HistoryEvent], Optional[HistoryCursor]]:
+        return await self.fetch_page(item_id=self.item_id, limit=self.PAGE_SIZE, **self._filters, **cursor)
+
+    async def _load(self, extend: Callable[[], Awaitable[None]]) -> None:
+        try:
+            await extend()
+        finally:
+            self._loading = False
+
+    def _cursor_row(self) -> int:
+        return self.query_one("#history_table", DataTable).cursor_row
+
+    async def _extend_older(self) -> None:
+        last = self._pages[-1][-1]
+        events, cursor = await self._fetch(before=(last.ts, last.id))
+        self._has_older = cursor is not None
+        if not events:
+            return
+        self._pages.append(events)
+        await self._remember_names(events)
+        # The user may have kept moving while the page was loading.
+        row = self._cursor_row()
+        if len(self._pages) > self.MAX_PAGES:
+            dropped = self._pages.popleft()
+            row -= len(dropped)
+            self._has_newer = True
+        self._show_window(cursor_row=row)
+
+    async def _extend_newer(self) -> None:
+        first = self._pages[0][0]
+        events, cursor = await self._fetch(after=(first.ts, first.id))
+        self._has_newer = cursor is not None
+        if not events:
+            return
+        self._pages.appendleft(events)
+        await self._remember_names(events)
+        row = self._cursor_row() + len(events)
+        if len(self._pages) > self.MAX_PAGES:
+            self._pages.pop()
+            self._has_older = True
+        self._show_window(cursor_row=row)
+
+    async def _remember_names(self, events: list[HistoryEvent]) -> None:
+        missing = {e.item_id for e in events if e.item_id not in self._names}
+        if missing:
+            self._names.update(await self.item_names(missing))
+        # Keep the name map bounded to the window as well.
+        if len(self._names) > self.PAGE_SIZE * self.MAX_PAGES * 2:
+            visible = {e.item_id for page in self._pages for e in page}
+            self._names = {k: v for k, v in self._names.items() if k in visible}
+
+    def _show_window(self, *, cursor_row: int) -> None:
+        table = self.query_one("#history_table", DataTable)
+        table.clear()
+        for page in self._pages:
+            for e in page:
+                table.add_row(
+                    e.ts.replace("T", " ")[:19],
+                    self._names.get(e.item_id, e.item_id[:8]),
+                    e.action,
+                    describe_event(e),
+                    key=e.id,
+                )
+        if table.row_count:
+            table.move_cursor(row=max(0, min(cursor_row, table.row_count - 1)))
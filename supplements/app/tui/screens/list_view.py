@@ -4,9 +4,13 @@ from textual.app import ComposeResult
 from textual.containers import Horizontal
 from textual.message import Message
 from textual.screen import Screen
-from textual.widgets import Button, DataTable, Static
+from textual.timer import Timer
+from textual.widgets import Button, DataTable, Input, Static
 from textual.css.query import NoMatches
 
+from ...repo import item_sort_key
+from .history_view import HistoryRequested
+
 
 class EditRequested(Message, bubble=True):
     def __init__(self, item_id: str | None):
@@ -21,12 +25,53 @@ class StatusRequested(Message, bubble=True):
         self.new_status = new_status
 
 
+class SearchRequested(Message, bubble=True):
+    def __init__(self, status: str, text: str):
+        super().__init__()
+        self.status = status
+        self.text = text
+
+
+COLUMNS = (
+    ("Name", "name"),
+    ("Category", "category"),
+    ("Dose", "dose"),
+    ("When", "when"),
+    ("Brand", "brand"),
+    ("Notes", "notes"),
+)
+
+
+def _sort_key(row: dict) -> tuple[str, str]:
+    # The ORDER BY of repo.list_items: sort_key, then id.
+    return (item_sort_key(row["category"], row["name"]), row["id"])
+
+
+class _NameCell(str):
+    # The name as shown, carrying the row's list position: DataTable.sort
+    # hands the key function cell values only, not row keys.
+    sort_key: tuple[str, str]
+
+
+def _cells(row: dict) -> tuple:
+    name = _NameCell(row["name"])
+    name.sort_key = _sort_key(row)
+    return (name, *(row[key] for _, key in COLUMNS[1:]))
+
+
 class ListView(Screen):
+    # Keystrokes in the filter box within SEARCH_DELAY_S of each other are
+    # coalesced into one search.
+    SEARCH_DELAY_S = 0.12
+
     BINDINGS = [
+        ("/", "focus_filter", "Filter"),
+        ("escape", "clear_filter", "Clear filter"),
         ("a", "add", "Add"),
         ("enter", "edit", "Edit"),
         ("p", "pause_resume", "Pause/Resume"),
         ("s", "stop", "Stop"),
+        ("h", "history", "History"),
         ("q", "quit", "Quit"),
     ]
 
@@ -34,11 +79,24 @@ class ListView(Screen):
         super().__init__()
         self.title = title
         self.status = status
-        self._row_item_ids: list[str] = []
-        self._pending_rows: list[dict] | None = None
+        # Set once the first window is shown; the app's change feed keeps
+        # the rows current from then on.
+        self.loaded = False
+        # Feed changes that arrived while later windows were still loading;
+        # applied in order once the last one is in (see finish_paging).
+        self._deferred: list[tuple[list[dict], list[str]]] = []
+        self._rows: dict[str, dict] = {}
+        self._busy = False
+        self._table_ready = False
+        # True while the first load is still reading windows.
+        self.paging = False
+        # While non-empty the table shows search results instead of _rows.
+        self.filter_text = ""
+        self._search_timer: Timer | None = None
 
     def compose(self) -> ComposeResult:
         yield Static(f"{self.title}", id="title")
+        yield Input(placeholder="Filter (/)", id="filter")
         yield DataTable(id="table")
         with Horizontal(id="buttons"):
             yield Button("Add", id="btn_add")
@@ -48,48 +106,167 @@ class ListView(Screen):
 
     def on_mount(self) -> None:
         table = self.query_one("#table", DataTable)
-        table.add_columns("Name", "Category", "Dose", "When", "Brand", "Notes")
+        table.add_columns(*COLUMNS)
         table.cursor_type = "row"
+        self._table_ready = True
+        table.focus()
 
-        if self._pending_rows is not None:
-            rows = self._pending_rows
-            self._pending_rows = None
-            self.load_rows(rows)
+        # Rows may have arrived before the table existed.
+        self._show_model()
 
-    def load_rows(self, rows: list[dict]) -> None:
+    def _fill_table(self, rows: list[dict]) -> None:
+        table = self.query_one("#table", DataTable)
+        table.clear()
+        for r in rows:
+            table.add_row(*_cells(r), key=r["id"])
+        if rows:
+            table.move_cursor(row=0)
+
+    def _show_model(self) -> None:
+        if not self._table_ready:
+            return
+        self._fill_table(sorted(self._rows.values(), key=_sort_key))
+
+    def on_input_changed(self, event: Input.Changed) -> None:
+        if event.input.id != "filter":
+            return
+        self.filter_text = event.value.strip()
+        if self._search_timer is not None:
+            self._search_timer.stop()
+            self._search_timer = None
+        if not self.filter_text:
+            self._show_model()
+            return
+        self._search_timer = self.set_timer(self.SEARCH_DELAY_S, self._request_search)
+
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        if event.input.id == "filter":
+            self.query_one("#table", DataTable).focus()
+
+    def _request_search(self) -> None:
+        self._search_timer = None
+        if self.filter_text:
+            self.app.post_message(SearchRequested(self.status, self.filter_text))
+
+    def show_search_results(self, text: str, rows: list[dict]) -> None:
+        # Results for anything but the current filter text are stale.
+        if text != self.filter_text or not self._table_ready:
+            return
+        self._fill_table(rows)
+
+    def action_focus_filter(self) -> None:
+        self.query_one("#filter", Input).focus()
+
+    def action_clear_filter(self) -> None:
+        filter_input = self.query_one("#filter", Input)
+        if filter_input.value:
+            # Input.Changed restores the full list.
+            filter_input.value = ""
+        self.query_one("#table", DataTable).focus()
+
+    def set_busy(self, busy: bool) -> None:
+        if busy == self._busy:
+            return
+        self._busy = busy
         try:
-            table = self.query_one("#table", DataTable)
+            title = self.query_one("#title", Static)
         except NoMatches:
-            self._pending_rows = rows
             return
+        title.update(f"{self.title}  (working…)" if busy else f"{self.title}")
 
-        table.clear()
-        self._row_item_ids = []
+    def load_rows(self, rows: list[dict]) -> None:
+        incoming = {r["id"] for r in rows}
+        self._apply(rows, [item_id for item_id in self._rows if item_id not in incoming])
 
-        for r in rows:
-            self._row_item_ids.append(r["id"])
-            table.add_row(
-                r["name"],
-                r["category"],
-                r["dose"],
-                r["when"],
-                r["brand"],
-                r["notes"],
-            )
-
-        if table.row_count > 0:
-            table.cursor_coordinate = (0, 0)
+    def apply_rows(self, upserts: list[dict], removed_ids: list[str]) -> None:
+        # While windows are still being appended in list order, a row sorted
+        # in now could end up after rows of a later window; hold it back.
+        if self.paging:
+            self._deferred.append((upserts, removed_ids))
+            return
+        self._apply(upserts, removed_ids)
+
+    def finish_paging(self) -> None:
+        self.paging = False
+        deferred, self._deferred = self._deferred, []
+        for upserts, removed_ids in deferred:
+            self._apply(upserts, removed_ids)
+
+    def _apply(self, upserts: list[dict], removed_ids: list[str]) -> None:
+        removed = [item_id for item_id in removed_ids if item_id in self._rows]
+        for item_id in removed:
+            del self._rows[item_id]
+
+        # Feed upserts come in no particular order. Added in list order, they
+        # need no sort when the table starts out empty; load_rows input is
+        # already sorted, which sorted() checks in one pass.
+        changed: list[tuple[dict, dict | None]] = []
+        for r in sorted(upserts, key=_sort_key):
+            old = self._rows.get(r["id"])
+            if old != r:
+                changed.append((r, old))
+                self._rows[r["id"]] = r
+
+        # Until on_mount has set up the columns, the model is all there is.
+        if not self._table_ready or (not removed and not changed):
+            return
+        if self.filter_text:
+            # Search results are ranked by the database; ask again.
+            self._request_search()
+            return
+        table = self.query_one("#table", DataTable)
+
+        was_empty = table.row_count == 0
+        selected = self._selected_item_id()
+        needs_sort = False
+
+        for item_id in removed:
+            table.remove_row(item_id)
+
+        for r, old in changed:
+            if old is None:
+                table.add_row(*_cells(r), key=r["id"])
+                needs_sort = needs_sort or not was_empty
+                continue
+            if r["name"] != old["name"] or r["category"] != old["category"]:
+                table.update_cell(r["id"], "name", _cells(r)[0])
+                needs_sort = True
+            for _, key in COLUMNS[1:]:
+                if r[key] != old[key]:
+                    table.update_cell(r["id"], key, r[key])
+
+        if needs_sort:
+            table.sort("name", key=lambda cell: cell.sort_key)
+
+        if selected in self._rows:
+            table.move_cursor(row=table.get_row_index(selected))
+        elif was_empty and table.row_count > 0:
+            table.move_cursor(row=0)
+
+    def append_rows(self, rows: list[dict]) -> None:
+        # Rows that sort after everything already loaded (the next window of
+        # a first load): added at the end, no sort. Feed changes are deferred
+        # meanwhile, so nothing out of order is in the table yet.
+        fresh = [r for r in rows if r["id"] not in self._rows]
+        for r in fresh:
+            self._rows[r["id"]] = r
+        if not fresh or not self._table_ready or self.filter_text:
+            return
+        table = self.query_one("#table", DataTable)
+        was_empty = table.row_count == 0
+        for r in fresh:
+            table.add_row(*_cells(r), key=r["id"])
+        if was_empty:
+            table.move_cursor(row=0)
 
     def _selected_item_id(self) -> str | None:
         table = self.query_one("#table", DataTable)
         if table.row_count == 0:
             return None
-        row = table.cursor_row
-        if row is None:
-            return None
-        if row < 0 or row >= len(self._row_item_ids):
+        if not table.is_valid_coordinate(table.cursor_coordinate):
             return None
-        return self._row_item_ids[row]
+        row_key, _ = table.coordinate_to_cell_key(table.cursor_coordinate)
+        return row_key.value
 
     def action_add(self) -> None:
         # Post directly to app for reliability.
@@ -112,6 +289,11 @@ class ListView(Screen):
         if item_id:
             self.app.post_message(StatusRequested(item_id, "stopped"))
 
+    def action_history(self) -> None:
+        item_id = self._selected_item_id()
+        if item_id:
+            self.app.post_message(HistoryRequested(item_id))
+
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "btn_add":
             self.action_add()
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+from datetime import date
+from typing import Awaitable, Callable, Optional
+
+from rich.text import Text
+from textual.app import ComposeResult
+from textual.screen import Screen
+from textual.widgets import DataTable, Static
+
+from ...models import Adherence, IntakeEvent, ScheduleEntry
+from ...services.formatting import format_dose
+from ...services.intake import make_event
+from ...services.schedule import build_schedule, format_totals, format_with_food
+
+# (schedule rows, today's status per (dose_id, slot), recent adherence)
+ScheduleDay = tuple[list[ScheduleEntry], dict[tuple[Optional[str], Optional[int]], str], Adherence]
+FetchScheduleDay = Callable[[str], Awaitable[ScheduleDay]]
+RecordIntake = Callable[[IntakeEvent], None]
+
+MARKS = {"taken": "✓ taken", "skipped": "– skipped"}
+
+
+def format_adherence(adherence: Adherence) -> str:
+    percent = adherence.percent
+    if percent is None:
+        return "Nothing scheduled yet"
+    days = (date.fromisoformat(adherence.end) - date.fromisoformat(adherence.start)).days + 1
+    return f"Last {days} days: {percent:.0f}% taken ({adherence.taken} of {adherence.expected} scheduled)"
+
+
+class ScheduleView(Screen):
+    # Active items by time of day, from the materialized schedule table,
+    # with today's doses marked off. Marks go through the intake buffer, so
+    # the table is updated in place rather than re-read.
+
+    BINDINGS = [
+        ("escape", "close", "Back"),
+        ("x", "mark('taken')", "Taken"),
+        ("s", "mark('skipped')", "Skipped"),
+        ("r", "reload", "Reload"),
+    ]
+
+    def __init__(self, fetch_day: FetchScheduleDay, record_intake: RecordIntake):
+        super().__init__()
+        self.fetch_day = fetch_day
+        self.record_intake = record_intake
+        self._entries: dict[str, ScheduleEntry] = {}
+
+    def compose(self) -> ComposeResult:
+        yield Static("Daily schedule (active items)", id="title")
+        yield Static("", id="adherence", markup=False)
+        yield DataTable(id="schedule_table")
+
+    def on_mount(self) -> None:
+        table = self.query_one("#schedule_table", DataTable)
+        table.add_columns("When", "Name", "Dose", "Food", "Instructions")
+        table.add_column("Today", key="today")
+        table.cursor_type = "row"
+        table.focus()
+
+    def on_screen_resume(self) -> None:
+        self.action_reload()
+
+    def action_close(self) -> None:
+        self.dismiss(None)
+
+    def action_reload(self) -> None:
+        self.run_worker(self._reload(), group="schedule", exclusive=True)
+
+    def action_mark(self, status: str) -> None:
+        table = self.query_one("#schedule_table", DataTable)
+        if not table.row_count:
+            return
+        row_key, _ = table.coordinate_to_cell_key(table.cursor_coordinate)
+        entry = self._entries.get(row_key.value)
+        if entry is None:
+            return
+        self.record_intake(make_event(item_id=entry.item_id, dose_id=entry.dose_id, slot=entry.slot, status=status))
+        table.update_cell(row_key, "today", MARKS[status])
+        table.action_cursor_down()
+
+    async def _reload(self) -> None:
+        entries, marks, adherence = await self.fetch_day(date.today().isoformat())
+        self.query_one("#adherence", Static).update(format_adherence(adherence))
+        table = self.query_one("#schedule_table", DataTable)
+        table.clear()
+        self._entries = {}
+        for slot in build_schedule(entries):
+            totals = format_totals(slot)
+            count = len(slot.entries)
+            table.add_row(
+                Text(slot.name, style="bold"),
+                Text(f"{count} item" if count == 1 else f"{count} items", style="bold"),
+                Text(totals, style="bold"),
+                "",
+                "",
+                "",
+                key=f"slot-{slot.slot}",
+            )
+            for entry in slot.entries:
+                key = f"{slot.slot}-{entry.dose_id}"
+                self._entries[key] = entry
+                table.add_row(
+                    "",
+                    entry.name_display,
+                    format_dose(entry),
+                    format_with_food(entry),
+                    entry.instructions or "",
+                    MARKS.get(marks.get((entry.dose_id, entry.slot)), ""),
+                    key=key,
+                )
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from dataclasses import asdict
+from typing import Optional
+
+from flask import Flask, Response, jsonify, request
+
+from ..config import AppConfig, ensure_dirs, get_config
+from ..db import ConnectionManager, init_db
+from ..services.formatting import format_dose, format_doses, format_doses_when, format_when
+from ..services.history import describe_event
+from ..services.intake import IntakeBuffer
+from ..services.schedule import format_totals, format_with_food
+from ..tracing import TRACER
+from .api import bp as api_bp
+from .cache import FragmentCache, StampTracker
+from .views import WebState, bp, entry_order, item_order
+
+
+def create_app(cfg: Optional[AppConfig] = None, *, readers: int = 8) -> Flask:
+    # Reads use the manager's pooled read-only connections, so concurrent
+    # sessions never queue behind each other or behind a save. Writes use
+    # the request thread's connection, closed again when the request ends.
+    cfg = cfg or get_config()
+    ensure_dirs(cfg)
+    db = ConnectionManager(cfg.db_path, readers=readers)
+    init_db(db.connection(), cfg.backups_dir)
+    db.close_thread_connection()
+
+    app = Flask(__name__)
+    app.config["SUPPLEMENTS"] = cfg
+    # Intake events are queued and written in batches by the buffer's own
+    # thread; whatever is still queued at exit is written then.
+    intake = IntakeBuffer(db)
+    intake.start()
+    state = WebState(cfg=cfg, db=db, stamps=StampTracker(), fragments=FragmentCache(), intake=intake)
+    app.extensions["supplements"] = state
+    app.add_template_filter(format_dose, "dose")
+    app.add_template_filter(format_when, "when")
+    app.add_template_filter(format_doses, "doses")
+    app.add_template_filter(format_doses_when, "doses_when")
+    app.add_template_filter(describe_event, "describe")
+    app.add_template_filter(format_totals, "totals")
+    app.add_template_filter(format_with_food, "with_food")
+    app.add_template_filter(item_order, "item_order")
+    app.add_template_filter(entry_order, "entry_order")
+    app.register_blueprint(bp)
+    app.register_blueprint(api_bp)
+
+    @app.teardown_request
+    def close_write_connection(exc: Optional[BaseException]) -> None:
+        db.close_thread_connection()
+
+    @app.get("/metrics")
+    def metrics() -> Response:
+        # Prometheus text by default; ?format=json adds the slow-query log
+        # with plans. The statistics are per process.
+        fragments = state.fragments.stats()
+        locks = db.lock_stats()
+        queued = intake.stats()
+        if request.args.get("format") == "json":
+            return jsonify(
+                statements=TRACER.summary(),
+                slow_queries=[asdict(q) for q in TRACER.slow_queries()],
+                fragment_cache=fragments,
+                write_lock=locks,
+                intake=queued,
+            )
+        lines = [
+            "# HELP supplements_web_fragment_cache_total Fragment cache lookups by outcome.",
+            "# TYPE supplements_web_fragment_cache_total counter",
+        ]
+        lines += [
+            f'supplements_web_fragment_cache_total{{outcome="{name}"}} {fragments[name]}'
+            for name in ("hits", "misses", "waits")
+        ]
+        lines += [
+            "# HELP supplements_write_lock_waits_total Writes that took the write lock.",
+            "# TYPE supplements_write_lock_waits_total counter",
+            f"supplements_write_lock_waits_total {locks['waits']}",
+            "# HELP supplements_write_lock_wait_seconds_total Time spent waiting for the write lock.",
+            "# TYPE supplements_write_lock_wait_seconds_total counter",
+            f"supplements_write_lock_wait_seconds_total {locks['total_wait_ms'] / 1000:.6f}",
+            "# HELP supplements_intake_pending Intake events queued but not yet written.",
+            "# TYPE supplements_intake_pending gauge",
+            f"supplements_intake_pending {queued['pending']}",
+            "# HELP supplements_intake_events_total Intake events by outcome.",
+            "# TYPE supplements_intake_events_total counter",
+            f'supplements_intake_events_total{{outcome="written"}} {queued["written"]}',
+            f'supplements_intake_events_total{{outcome="dropped"}} {queued["dropped"]}',
+        ]
+        body = TRACER.prometheus_text() + "\n".join(lines) + "\n"
+        return Response(body, mimetype="text/plain; version=0.0.4")
+
+    return app
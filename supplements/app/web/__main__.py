@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from typing import Optional
+
+from ..config import AppConfig
+from . import create_app
+
+
+def main(argv: Optional[list[str]] = None, cfg: Optional[AppConfig] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.web", description="Serve the supplements web dashboard.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args(argv)
+    create_app(cfg).run(host=args.host, port=args.port, debug=args.debug, threaded=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
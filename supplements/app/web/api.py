@@ -0,0 +1,409 @@
+from __future__ import annotations
+
+import json
+import zlib
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from flask import Blueprint, Response, abort, jsonify, request
+from werkzeug.exceptions import HTTPException
+
+from ..db import ConnectionManager
+from ..models import DOSE_FIELDS, HISTORY_FIELDS, ITEM_FIELDS
+from ..repo import (
+    HistoryCursor,
+    change_seq,
+    get_adherence,
+    get_changes,
+    get_daily_intake,
+    get_dose_items,
+    get_history_page,
+    get_item_names,
+    get_item_with_doses,
+    iter_history,
+    iter_items,
+)
+from ..services.history import decode_cursor, encode_cursor
+from ..services.intake import make_event
+from ..services.validators import STATUSES
+from .cache import etag_for
+from .views import get_state
+
+# Collections are sent as they are read: rows are encoded one by one and
+# written out in chunks of about CHUNK_CHARS, so server memory does not grow
+# with the size of the collection. History is read in keyset batches of
+# STREAM_BATCH, which also keeps any one read transaction short.
+CHUNK_CHARS = 64 * 1024
+STREAM_BATCH = 500
+GZIP_LEVEL = 6
+
+DEFAULT_PAGE = 500
+MAX_PAGE = 5000
+MAX_INTAKE_BATCH = 5000
+ADHERENCE_DAYS = 7
+
+# `doses` lists every dose; `dose` is the first one only, kept for clients
+# written before items could have several.
+ITEM_API_FIELDS = ITEM_FIELDS + ("doses", "dose")
+ITEM_DEFAULT_FIELDS = ITEM_FIELDS + ("doses",)
+# `cursor` is the opaque position of an event, for resuming a stream.
+HISTORY_API_FIELDS = HISTORY_FIELDS + ("cursor",)
+
+FORMATS = ("ndjson", "json")
+MIMETYPES = {"ndjson": "application/x-ndjson", "json": "application/json"}
+
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+
+@bp.errorhandler(HTTPException)
+def _error(e: HTTPException) -> tuple[Response, int]:
+    return jsonify(error=e.description), e.code or 500
+
+
+def _fields(available: tuple[str, ...], default: tuple[str, ...]) -> tuple[str, ...]:
+    raw = request.args.get("fields")
+    if not raw:
+        return default
+    fields = tuple(dict.fromkeys(name.strip() for name in raw.split(",") if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown or not fields:
+        abort(400, f"unknown fields {', '.join(unknown) or '(none given)'}; available: {', '.join(available)}")
+    return fields
+
+
+def _format(default: str) -> str:
+    fmt = request.args.get("format", default)
+    if fmt not in FORMATS:
+        abort(400, f"format must be one of {', '.join(FORMATS)}")
+    return fmt
+
+
+def _limit() -> int:
+    raw = request.args.get("limit", str(DEFAULT_PAGE))
+    try:
+        limit = int(raw)
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_PAGE:
+        abort(400, f"limit must be between 1 and {MAX_PAGE}")
+    return limit
+
+
+def _timestamp(name: str) -> Optional[str]:
+    value = request.args.get(name) or None
+    if value is not None:
+        try:
+            datetime.fromisoformat(value)
+        except ValueError:
+            abort(400, f"{name} must be an ISO date or timestamp")
+    return value
+
+
+def _cursor() -> Optional[HistoryCursor]:
+    try:
+        return decode_cursor(request.args.get("cursor"))
+    except ValueError as e:
+        abort(400, str(e))
+
+
+def _date(name: str, default: date) -> date:
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        abort(400, f"{name} must be an ISO date")
+
+
+def _gzip_accepted() -> bool:
+    return request.accept_encodings["gzip"] > 0
+
+
+def _etag() -> str:
+    # Per representation: the gzipped body gets its own tag.
+    state = get_state()
+    with state.db.reader() as conn:
+        etag = etag_for(state.stamps.stamp(conn))
+    return f"{etag}-gz" if _gzip_accepted() else etag
+
+
+def _not_modified(etag: str) -> Optional[Response]:
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def _dose_record(dose: Any) -> dict[str, Any]:
+    return {f: getattr(dose, f) for f in DOSE_FIELDS}
+
+
+def _item_encoder(fields: tuple[str, ...]) -> Callable[[tuple], dict[str, Any]]:
+    def encode(row: tuple) -> dict[str, Any]:
+        item, doses = row
+        out = {}
+        for name in fields:
+            if name == "doses":
+                out[name] = [_dose_record(d) for d in doses]
+            elif name == "dose":
+                out[name] = _dose_record(doses[0]) if doses else None
+            else:
+                out[name] = getattr(item, name)
+        return out
+
+    return encode
+
+
+def _history_encoder(fields: tuple[str, ...]) -> Callable[[Any], dict[str, Any]]:
+    def encode(event: Any) -> dict[str, Any]:
+        out = {}
+        for name in fields:
+            out[name] = encode_cursor((event.ts, event.id)) if name == "cursor" else getattr(event, name)
+        return out
+
+    return encode
+
+
+def _ndjson(records: Iterable[dict]) -> Iterator[bytes]:
+    lines: list[str] = []
+    size = 0
+    for record in records:
+        line = _encode(record)
+        lines.append(line)
+        size += len(line) + 1
+        if size >= CHUNK_CHARS:
+            lines.append("")
+            yield "\n".join(lines).encode("utf-8")
+            lines, size = [], 0
+    if lines:
+        lines.append("")
+        yield "\n".join(lines).encode("utf-8")
+
+
+def _json_array(records: Iterable[dict]) -> Iterator[bytes]:
+    # The same stream as one JSON array, for clients without NDJSON support.
+    parts = ["["]
+    size = 0
+    first = True
+    for record in records:
+        if not first:
+            parts.append(",")
+        first = False
+        line = _encode(record)
+        parts.append(line)
+        size += len(line) + 1
+        if size >= CHUNK_CHARS:
+            yield "".join(parts).encode("utf-8")
+            parts, size = [], 0
+    parts.append("]")
+    yield "".join(parts).encode("utf-8")
+
+
+def _gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    # Each chunk is flushed, so the client can decode rows as they arrive.
+    z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = z.compress(chunk) + z.flush(zlib.Z_SYNC_FLUSH)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def _respond(chunks: Iterable[bytes], *, fmt: str, etag: Optional[str] = None) -> Response:
+    headers = {"Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if _gzip_accepted():
+        chunks = _gzip(chunks)
+        headers["Content-Encoding"] = "gzip"
+    response = Response(chunks, mimetype=MIMETYPES[fmt], headers=headers)
+    if etag is not None:
+        response.set_etag(etag)
+    return response
+
+
+def _stream(
+    db: ConnectionManager,
+    read: Callable[[Any], Iterable[Any]],
+    encode: Callable[[Any], dict[str, Any]],
+) -> Iterator[dict[str, Any]]:
+    # Runs while the response is being sent; the pooled reader goes back to
+    # the pool when the stream ends or the client goes away.
+    with db.reader() as conn:
+        for row in read(conn):
+            yield encode(row)
+
+
+@bp.get("/items")
+def items() -> Response:
+    status = request.args.get("status", "active")
+    if status not in STATUSES:
+        abort(400, f"status must be one of {', '.join(STATUSES)}")
+    fields = _fields(ITEM_API_FIELDS, ITEM_DEFAULT_FIELDS)
+    fmt = _format("ndjson")
+    etag = _etag()
+    cached = _not_modified(etag)
+    if cached is not None:
+        return cached
+
+    records = _stream(get_state().db, lambda conn: iter_items(conn, status, as_tuples=True), _item_encoder(fields))
+    return _respond(_ndjson(records) if fmt == "ndjson" else _json_array(records), fmt=fmt, etag=etag)
+
+
+@bp.get("/changes")
+def changes() -> Response:
+    # The change feed: ids of items created, edited or deleted after `since`
+    # (a `seq` from an earlier response), oldest first. Without `since`,
+    # only the current seq. `more` means a full page came back; ask again.
+    # `reset` means `since` is past the end of the feed (the database was
+    # restored or replaced): reload everything and carry on from `seq`.
+    raw = request.args.get("since")
+    try:
+        since = None if raw is None else int(raw)
+    except ValueError:
+        since = -1
+    if since is not None and since < 0:
+        abort(400, "since must be a seq from an earlier response")
+    limit = _limit()
+
+    reset = False
+    with get_state().db.reader() as conn:
+        if since is None:
+            ids, seq = [], change_seq(conn)
+        else:
+            ids, seq = get_changes(conn, since, limit=limit)
+            if not ids:
+                seq = change_seq(conn)
+                reset = seq < since
+    body = {"seq": seq, "items": ids, "more": len(ids) == limit, "reset": reset}
+    return _respond([_encode(body).encode("utf-8")], fmt="json")
+
+
+@bp.get("/items/<item_id>")
+def item(item_id: str) -> Response:
+    fields = _fields(ITEM_API_FIELDS, ITEM_FIELDS)
+    etag = _etag()
+    cached = _not_modified(etag)
+    if cached is not None:
+        return cached
+
+    with get_state().db.reader() as conn:
+        found = get_item_with_doses(conn, item_id)
+    if found is None:
+        abort(404, f"no item {item_id}")
+    item, doses = found
+    # The doses are listed next to the item rather than inside it.
+    encode = _item_encoder(tuple(name for name in fields if name not in ("doses", "dose")))
+    body = {"item": encode((item, doses)), "doses": [_dose_record(d) for d in doses]}
+    return _respond([_encode(body).encode("utf-8")], fmt="json", etag=etag)
+
+
+@bp.get("/history")
+def history() -> Response:
+    # format=json (the default) returns one page and a next_cursor;
+    # format=ndjson streams every matching event from `cursor` onwards.
+    # order=asc walks oldest first, for clients syncing forward.
+    fmt = _format("json")
+    oldest_first = request.args.get("order", "desc") == "asc"
+    filters = {
+        "item_id": request.args.get("item") or None,
+        "action": request.args.get("action") or None,
+        "since": _timestamp("since"),
+        "until": _timestamp("until"),
+    }
+    start = _cursor()
+
+    if fmt == "ndjson":
+        fields = _fields(HISTORY_API_FIELDS, HISTORY_API_FIELDS)
+
+        def read(conn: Any) -> Iterator[Any]:
+            for batch in iter_history(conn, **filters, start=start, oldest_first=oldest_first, batch_size=STREAM_BATCH):
+                yield from batch
+
+        return _respond(_ndjson(_stream(get_state().db, read, _history_encoder(fields))), fmt=fmt)
+
+    fields = _fields(HISTORY_API_FIELDS, HISTORY_FIELDS)
+    limit = _limit()
+    etag = _etag()
+    cached = _not_modified(etag)
+    if cached is not None:
+        return cached
+    with get_state().db.reader() as conn:
+        if oldest_first:
+            events, next_cursor = get_history_page(conn, **filters, after=start or ("", ""), limit=limit)
+            events.reverse()
+        else:
+            events, next_cursor = get_history_page(conn, **filters, before=start, limit=limit)
+    encode = _history_encoder(fields)
+    body = {"events": [encode(e) for e in events], "next_cursor": encode_cursor(next_cursor)}
+    return _respond([_encode(body).encode("utf-8")], fmt="json", etag=etag)
+
+
+@bp.post("/intake")
+def record_intake() -> tuple[Response, int]:
+    # One event or a list of them. They are queued and written in the next
+    # batch, so 202 means accepted, not yet stored.
+    body = request.get_json(silent=True)
+    records = body if isinstance(body, list) else [body]
+    if not records or len(records) > MAX_INTAKE_BATCH or not all(isinstance(r, dict) for r in records):
+        abort(400, f"expected an event object or a list of 1 to {MAX_INTAKE_BATCH} of them")
+    events = []
+    for i, record in enumerate(records):
+        try:
+            at = record.get("taken_at")
+            events.append(
+                make_event(
+                    item_id=str(record["item_id"]),
+                    dose_id=record.get("dose_id"),
+                    slot=record.get("slot"),
+                    status=record.get("status", "taken"),
+                    at=datetime.fromisoformat(at) if at else None,
+                )
+            )
+        except KeyError:
+            abort(400, f"event {i}: item_id is required")
+        except (TypeError, ValueError) as e:
+            abort(400, f"event {i}: {e}")
+
+    state = get_state()
+    with state.db.reader() as conn:
+        known = get_item_names(conn, {event.item_id for event in events})
+        owners = get_dose_items(conn, {event.dose_id for event in events if event.dose_id is not None})
+    unknown = sorted({event.item_id for event in events} - known.keys())
+    if unknown:
+        abort(404, f"no item {', '.join(unknown)}")
+    for i, event in enumerate(events):
+        if event.dose_id is not None and owners.get(event.dose_id) != event.item_id:
+            abort(400, f"event {i}: item {event.item_id} has no dose {event.dose_id}")
+    for event in events:
+        state.intake.record(event)
+    return jsonify(queued=len(events)), 202
+
+
+@bp.get("/adherence")
+def adherence() -> Response:
+    # Defaults to the last ADHERENCE_DAYS days. A read, so it does not flush
+    # the intake buffer: events accepted by POST /intake are counted once
+    # written, at most intake.FLUSH_INTERVAL_S later.
+    end = _date("end", date.today())
+    start = _date("start", end - timedelta(days=ADHERENCE_DAYS - 1))
+    if start > end:
+        abort(400, "start must not be after end")
+    item_id = request.args.get("item") or None
+
+    with get_state().db.reader() as conn:
+        totals = get_adherence(conn, start=start.isoformat(), end=end.isoformat(), item_id=item_id)
+        days = get_daily_intake(conn, start=start.isoformat(), end=end.isoformat(), item_id=item_id)
+    body = {
+        "start": totals.start,
+        "end": totals.end,
+        "item_id": item_id,
+        "taken": totals.taken,
+        "skipped": totals.skipped,
+        "expected": totals.expected,
+        "percent": None if totals.percent is None else round(totals.percent, 1),
+        "days": [{"day": d.day, "taken": d.taken, "skipped": d.skipped} for d in days],
+    }
+    return _respond([_encode(body).encode("utf-8")], fmt="json")
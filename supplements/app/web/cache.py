@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Hashable
+
+from ..repo import data_stamp
+
+# Part of every ETag, so a deploy with changed templates is not answered
+# with 304 for pages rendered by the old ones.
+TEMPLATE_VERSION = 1
+
+
+class StampTracker:
+    # repo.data_stamp() is two index reads. PRAGMA data_version on a pooled
+    # reader is cheaper and only moves when some other connection commits
+    # (readers never write), so the stamp is re-read only then.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen: "weakref.WeakKeyDictionary[sqlite3.Connection, tuple[int, str]]" = weakref.WeakKeyDictionary()
+
+    def stamp(self, conn: sqlite3.Connection) -> str:
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        with self._lock:
+            seen = self._seen.get(conn)
+        if seen is not None and seen[0] == version:
+            return seen[1]
+        stamp = data_stamp(conn)
+        with self._lock:
+            self._seen[conn] = (version, stamp)
+        return stamp
+
+
+def etag_for(stamp: str) -> str:
+    return hashlib.sha1(f"{TEMPLATE_VERSION}:{stamp}".encode("utf-8")).hexdigest()[:20]
+
+
+class FragmentCache:
+    # Rendered HTML fragments, each kept under the data stamp it was rendered
+    # for, so it is only ever served for that stamp. Fragments of earlier
+    # stamps are no longer asked for and are the first evicted. Concurrent
+    # misses for the same stamp and key wait for the first renderer instead
+    # of each running the query.
+
+    def __init__(self, *, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, Hashable], str] = OrderedDict()
+        self._pending: dict[tuple[str, Hashable], Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.invalidations = 0
+
+    def get(self, stamp: str, key: Hashable, render: Callable[[], str]) -> str:
+        # Requests still holding an older stamp (their read began before a
+        # write) get their own render under their own stamp: they neither
+        # share a newer render nor replace a newer entry.
+        entry = (stamp, key)
+        with self._lock:
+            html = self._entries.get(entry)
+            if html is not None:
+                self._entries.move_to_end(entry)
+                self.hits += 1
+                return html
+            pending = self._pending.get(entry)
+            owner = pending is None
+            if owner:
+                pending = self._pending[entry] = Future()
+                self.misses += 1
+            else:
+                self.waits += 1
+
+        if not owner:
+            return pending.result()
+
+        try:
+            html = render()
+        except BaseException as e:
+            with self._lock:
+                self._pending.pop(entry, None)
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            self._pending.pop(entry, None)
+            self._entries[entry] = html
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        pending.set_result(html)
+        return html
+
+    def invalidate(self) -> None:
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,105 @@
+// Keeps the rows of [data-live] regions current while the page is open.
+// Polls the change feed and, when items changed (here, in the TUI or from
+// the CLI), asks the region's data-live URL for just those items' rows and
+// patches them in: rows of changed items are dropped, the returned rows go
+// in by their data-order, and other returned [data-part] elements (such as
+// slot totals) replace the page's. Rows without data-order (search results,
+// ranked) are only replaced where they already are. The whole page is
+// reloaded only when the feed says the database was replaced.
+(function () {
+  "use strict";
+
+  var POLL_MS = 1000;
+  var BATCH = 100; // views.LIVE_BATCH: most ids one rows request may carry
+  var script = document.currentScript;
+  var feed = script.dataset.changes;
+  var seq = script.dataset.since ? Number(script.dataset.since) : null;
+
+  function regions() {
+    return document.querySelectorAll("[data-live]");
+  }
+
+  function insert(tbody, row) {
+    var order = row.dataset.order;
+    var rows = tbody.querySelectorAll("tr[data-order]");
+    var lo = 0;
+    var hi = rows.length;
+    while (lo < hi) {
+      var mid = (lo + hi) >> 1;
+      if (rows[mid].dataset.order < order) lo = mid + 1;
+      else hi = mid;
+    }
+    tbody.insertBefore(row, lo < rows.length ? rows[lo] : tbody.querySelector("tr.empty"));
+  }
+
+  function patch(region, doc, ids) {
+    var changed = {};
+    ids.forEach(function (id) { changed[id] = true; });
+    var ranked = {};
+    doc.querySelectorAll("tr[data-item]:not([data-order])").forEach(function (row) {
+      ranked[row.dataset.item] = row;
+    });
+    region.querySelectorAll("tr[data-item]").forEach(function (row) {
+      var id = row.dataset.item;
+      if (!changed[id]) return;
+      if (ranked[id]) {
+        row.replaceWith(ranked[id]);
+        delete ranked[id];
+      } else {
+        row.remove();
+      }
+    });
+    doc.querySelectorAll("[data-part]").forEach(function (part) {
+      var target = region.querySelector('[data-part="' + part.dataset.part + '"]');
+      if (!target) return;
+      if (part.tagName !== "TBODY") {
+        target.innerHTML = part.innerHTML;
+        return;
+      }
+      part.querySelectorAll("tr[data-order]").forEach(function (row) { insert(target, row); });
+      var empty = target.querySelector("tr.empty");
+      if (empty) empty.hidden = target.querySelector("tr[data-item]") !== null;
+    });
+  }
+
+  function update(ids) {
+    var query = "ids=" + ids.map(encodeURIComponent).join(",");
+    return Promise.all(Array.prototype.map.call(regions(), function (region) {
+      var url = region.dataset.live;
+      return fetch(url + (url.indexOf("?") < 0 ? "?" : "&") + query, { cache: "no-store" })
+        .then(function (response) {
+          if (!response.ok) throw new Error(response.statusText);
+          return response.text();
+        })
+        .then(function (html) {
+          patch(region, new DOMParser().parseFromString(html, "text/html"), ids);
+        });
+    }));
+  }
+
+  function poll() {
+    var url = seq === null ? feed : feed + "?since=" + seq + "&limit=" + BATCH;
+    return fetch(url, { cache: "no-store" })
+      .then(function (response) { return response.ok ? response.json() : null; })
+      .then(function (body) {
+        if (body === null) return false;
+        if (body.reset) {
+          location.reload();
+          return false;
+        }
+        var ids = seq === null ? [] : body.items;
+        // seq only moves on once the rows are in, so a failed update is
+        // retried on the next poll.
+        return (ids.length ? update(ids) : Promise.resolve()).then(function () {
+          seq = body.seq;
+          return body.more;
+        });
+      })
+      .catch(function () { return false; })
+      .then(function (more) { setTimeout(poll, more ? 0 : POLL_MS); });
+  }
+
+  document.addEventListener("DOMContentLoaded", function () {
+    if (regions().length) poll();
+  });
+})();
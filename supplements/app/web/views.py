@@ -0,0 +1,396 @@
+from __future__ import annotations
+
+import sqlite3
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    current_app,
+    g,
+    make_response,
+    redirect,
+    render_template,
+    request,
+    url_for,
+)
+from markupsafe import Markup
+
+from ..config import AppConfig
+from ..db import ConnectionManager
+from ..models import ScheduleEntry
+from ..repo import (
+    ItemWithDoses,
+    change_seq,
+    count_items,
+    create_item_with_doses,
+    get_history_page,
+    get_item_names,
+    get_item_with_doses,
+    get_items_page,
+    get_page_items,
+    get_schedule,
+    get_schedule_totals,
+    item_sort_key,
+    search_items,
+    set_status,
+    update_item_and_doses,
+)
+from ..services.history import decode_cursor, encode_cursor
+from ..services.intake import IntakeBuffer
+from ..services.schedule import build_schedule, build_totals
+from ..services.validators import CATEGORIES, STATUSES, validate_item_record
+from .cache import FragmentCache, StampTracker, etag_for
+
+PAGE_SIZE = 200
+SEARCH_LIMIT = 100
+HISTORY_PAGE_SIZE = 100
+RECENT_EVENTS = 10
+# Most item ids one /rows request may ask for; live.js asks the change feed
+# for this many at a time.
+LIVE_BATCH = 100
+
+# Form fields that map onto create_item_with_doses/update_item_and_doses.
+# Dose fields are posted once per dose, suffixed with its position ("amount-0").
+ITEM_EDIT_FIELDS = ("name_display", "category", "name_generic", "brand", "form", "route", "notes")
+DOSE_EDIT_FIELDS = ("amount", "unit", "time_am", "time_midday", "time_pm", "with_food", "instructions")
+TIME_FIELDS = ("time_am", "time_midday", "time_pm")
+MAX_DOSES = 10
+
+bp = Blueprint("web", __name__)
+
+
+@dataclass
+class WebState:
+    cfg: AppConfig
+    db: ConnectionManager
+    stamps: StampTracker
+    fragments: FragmentCache
+    intake: IntakeBuffer
+
+
+def get_state() -> WebState:
+    # The app's shared state, for the views and the API blueprint alike.
+    return current_app.extensions["supplements"]
+
+
+def _conditional(render: Callable[[sqlite3.Connection, str], str]) -> Response:
+    # GET pages depend only on the data, so the data stamp is their ETag and
+    # a browser holding the current one gets a 304 without anything being
+    # rendered. no-cache makes browsers revalidate every time.
+    state = get_state()
+    with state.db.reader() as conn:
+        # Where live.js starts reading the change feed. Read before the page,
+        # so a write in between is applied again rather than missed.
+        g.change_seq = change_seq(conn)
+        stamp = state.stamps.stamp(conn)
+        etag = etag_for(stamp)
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = make_response(render(conn, stamp))
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def _fragment(stamp: str, key: tuple, template: str, context: Callable[[], dict[str, Any]]) -> Markup:
+    return Markup(get_state().fragments.get(stamp, key, lambda: render_template(template, **context())))
+
+
+def _write(fn: Callable[..., Any], **kwargs: Any) -> Any:
+    state = get_state()
+    with state.db.write() as conn:
+        result = fn(conn, **kwargs)
+    state.fragments.invalidate()
+    return result
+
+
+def _status_arg() -> str:
+    status = request.args.get("status", "active")
+    if status not in STATUSES:
+        abort(404)
+    return status
+
+
+def _cursor_arg(name: str) -> Optional[tuple[str, str]]:
+    try:
+        return decode_cursor(request.args.get(name))
+    except ValueError:
+        abort(400)
+
+
+def _ids_arg() -> list[str]:
+    ids = [item_id for item_id in request.args.get("ids", "").split(",") if item_id]
+    if len(ids) > LIVE_BATCH:
+        abort(400)
+    return ids
+
+
+def _live_order(sort_key: str, row_id: str) -> str:
+    # A row's place in its table as one string for live.js to compare.
+    # JavaScript compares strings by UTF-16 unit, not by the UTF-8 bytes
+    # SQLite orders by, so the key goes in as hex; ids are ASCII.
+    return f"{sort_key.encode('utf-8').hex()} {row_id}"
+
+
+def item_order(item: Any) -> str:
+    return _live_order(item_sort_key(item.category, item.name_display), item.id)
+
+
+def entry_order(entry: ScheduleEntry) -> str:
+    return _live_order(entry.sort_key, entry.dose_id)
+
+
+@bp.get("/")
+def dashboard() -> Response:
+    def render(conn: sqlite3.Connection, stamp: str) -> str:
+        def context() -> dict[str, Any]:
+            events, _ = get_history_page(conn, limit=RECENT_EVENTS)
+            return {
+                "counts": count_items(conn),
+                "events": events,
+                "names": get_item_names(conn, (e.item_id for e in events)),
+            }
+
+        summary = _fragment(stamp, ("dashboard",), "_dashboard_summary.html", context)
+        return render_template("dashboard.html", summary=summary)
+
+    return _conditional(render)
+
+
+@bp.get("/items")
+def items() -> Response:
+    status = _status_arg()
+    query = request.args.get("q", "").strip()
+    after = _cursor_arg("after")
+
+    def render(conn: sqlite3.Connection, stamp: str) -> str:
+        def context() -> dict[str, Any]:
+            if query:
+                rows = search_items(conn, query, status=status, limit=SEARCH_LIMIT)
+                next_cursor = None
+            else:
+                rows, next_cursor = get_items_page(conn, status, after=after, limit=PAGE_SIZE, as_tuples=True)
+            return {
+                "rows": rows,
+                "status": status,
+                "query": query,
+                "after": encode_cursor(after),
+                "next": encode_cursor(next_cursor),
+            }
+
+        key = ("items", status, query) if query else ("items", status, after)
+        table = _fragment(stamp, key, "_item_table.html", context)
+        return render_template("list.html", table=table, status=status, query=query, statuses=STATUSES)
+
+    return _conditional(render)
+
+
+@bp.get("/items/rows")
+def item_rows() -> str:
+    # For live.js: the current rows of the changed items `ids` that belong on
+    # an items page, either its window (past `after`, up to and including
+    # `until`, its last row when it was drawn) or the results for `q`. A
+    # changed item left out has left the page.
+    status = _status_arg()
+    query = request.args.get("q", "").strip()
+    after = _cursor_arg("after")
+    until = _cursor_arg("until")
+    ids = _ids_arg()
+
+    rows: list[ItemWithDoses] = []
+    if ids:
+        with get_state().db.reader() as conn:
+            if query:
+                wanted = set(ids)
+                results = search_items(conn, query, status=status, limit=SEARCH_LIMIT)
+                rows = [row for row in results if row[0].id in wanted]
+            else:
+                rows = get_page_items(conn, status, ids, after=after, until=until, as_tuples=True)
+    return render_template("_item_rows.html", rows=rows, status=status, query=query)
+
+
+@bp.get("/history")
+def history() -> Response:
+    item_id = request.args.get("item") or None
+    action = request.args.get("action") or None
+    before = _cursor_arg("before")
+
+    def render(conn: sqlite3.Connection, stamp: str) -> str:
+        def context() -> dict[str, Any]:
+            events, next_cursor = get_history_page(
+                conn, item_id=item_id, action=action, before=before, limit=HISTORY_PAGE_SIZE
+            )
+            return {
+                "events": events,
+                "names": get_item_names(conn, (e.item_id for e in events)),
+                "item_id": item_id,
+                "action": action,
+                "next": encode_cursor(next_cursor),
+            }
+
+        table = _fragment(stamp, ("history", item_id, action, before), "_history_table.html", context)
+        title = None
+        if item_id:
+            title = get_item_names(conn, [item_id]).get(item_id)
+        return render_template("history.html", table=table, item_id=item_id, action=action, title=title)
+
+    return _conditional(render)
+
+
+@bp.get("/schedule")
+def schedule() -> Response:
+    def render(conn: sqlite3.Connection, stamp: str) -> str:
+        def context() -> dict[str, Any]:
+            return {"slots": build_schedule(get_schedule(conn))}
+
+        table = _fragment(stamp, ("schedule",), "_schedule_table.html", context)
+        return render_template("schedule.html", table=table)
+
+    return _conditional(render)
+
+
+@bp.get("/schedule/rows")
+def schedule_rows() -> str:
+    # For live.js: the schedule rows of the changed items `ids` and every
+    # slot's totals. A changed item with no rows here is off the schedule.
+    ids = _ids_arg()
+    with get_state().db.reader() as conn:
+        slots = build_totals(get_schedule_totals(conn))
+        by_number = {slot.slot: slot for slot in slots}
+        for entry in get_schedule(conn, item_ids=ids) if ids else []:
+            by_number[entry.slot].entries.append(entry)
+    return render_template("_schedule_rows.html", slots=slots)
+
+
+def _blank_dose() -> dict[str, Any]:
+    return {"id": None, **{name: None for name in DOSE_EDIT_FIELDS}}
+
+
+def _form_values(item=None, doses=()) -> dict[str, Any]:
+    values: dict[str, Any] = {name: None for name in ITEM_EDIT_FIELDS}
+    values["category"] = "supplement"
+    if item is not None:
+        values.update({name: getattr(item, name) for name in ITEM_EDIT_FIELDS})
+    values["doses"] = [{"id": d.id, **{name: getattr(d, name) for name in DOSE_EDIT_FIELDS}} for d in doses]
+    if not values["doses"]:
+        values["doses"].append(_blank_dose())
+    return values
+
+
+def _raw_form() -> dict[str, Any]:
+    # The form as posted. Checkboxes are only posted when ticked, so the
+    # flags become "1"/"0"; doses marked for removal are left out.
+    raw: dict[str, Any] = {name: request.form.get(name) for name in ITEM_EDIT_FIELDS}
+    try:
+        count = int(request.form.get("dose_count", "1"))
+    except ValueError:
+        abort(400)
+    if not 0 <= count <= MAX_DOSES:
+        abort(400)
+    raw["doses"] = []
+    for i in range(count):
+        if request.form.get(f"remove-{i}"):
+            continue
+        dose = {name: request.form.get(f"{name}-{i}") for name in DOSE_EDIT_FIELDS}
+        for name in TIME_FIELDS:
+            dose[name] = "1" if dose[name] else "0"
+        dose["id"] = request.form.get(f"dose_id-{i}") or None
+        raw["doses"].append(dose)
+    return raw
+
+
+def _shown(raw: dict[str, Any]) -> dict[str, Any]:
+    # Posted values as typed, with the flags in the form the template uses.
+    for dose in raw["doses"]:
+        for name in TIME_FIELDS:
+            dose[name] = dose[name] == "1"
+        dose["with_food"] = {"1": True, "0": False}.get(dose["with_food"] or "")
+    if not raw["doses"]:
+        raw["doses"].append(_blank_dose())
+    return raw
+
+
+def _parse_form() -> tuple[dict[str, Any], list[str]]:
+    # validate_item_record applies the same rules as imports.
+    raw = _raw_form()
+    clean, errors = validate_item_record(raw)
+    if clean is None:
+        return _shown(raw), errors
+    values = {name: clean.get(name) for name in ITEM_EDIT_FIELDS}
+    values["doses"] = [{"id": posted["id"], **dose} for posted, dose in zip(raw["doses"], clean["doses"])]
+    return values, []
+
+
+def _add_dose_page(item=None) -> Optional[Response]:
+    # "Add another dose" posts the form; it comes back with a blank dose
+    # added and nothing saved.
+    if "add_dose" not in request.form:
+        return None
+    values = _shown(_raw_form())
+    if len(values["doses"]) < MAX_DOSES:
+        values["doses"].append(_blank_dose())
+    return _edit_page(values, item=item)
+
+
+def _edit_page(values: dict[str, Any], *, item=None, errors: tuple[str, ...] = (), status: int = 200) -> Response:
+    html = render_template("edit.html", values=values, item=item, errors=errors, categories=CATEGORIES, statuses=STATUSES)
+    return make_response(html, status)
+
+
+@bp.get("/items/new")
+def new_item() -> Response:
+    return _edit_page(_form_values())
+
+
+@bp.post("/items/new")
+def create_item() -> Response:
+    page = _add_dose_page()
+    if page is not None:
+        return page
+    values, errors = _parse_form()
+    if errors:
+        return _edit_page(values, errors=tuple(errors), status=400)
+    item_id = _write(create_item_with_doses, **values)
+    return redirect(url_for("web.edit_item", item_id=item_id), code=303)
+
+
+@bp.get("/items/<item_id>")
+def edit_item(item_id: str) -> Response:
+    def render(conn: sqlite3.Connection, stamp: str) -> str:
+        found = get_item_with_doses(conn, item_id)
+        if found is None:
+            abort(404)
+        item, doses = found
+        values = _form_values(item, doses)
+        return render_template("edit.html", values=values, item=item, errors=(), categories=CATEGORIES, statuses=STATUSES)
+
+    return _conditional(render)
+
+
+@bp.post("/items/<item_id>")
+def update_item(item_id: str) -> Response:
+    with get_state().db.reader() as conn:
+        found = get_item_with_doses(conn, item_id)
+    if found is None:
+        abort(404)
+    page = _add_dose_page(found[0])
+    if page is not None:
+        return page
+    values, errors = _parse_form()
+    if errors:
+        return _edit_page(values, item=found[0], errors=tuple(errors), status=400)
+    _write(update_item_and_doses, item_id=item_id, **values)
+    return redirect(url_for("web.items", status=found[0].status), code=303)
+
+
+@bp.post("/items/<item_id>/status")
+def change_status(item_id: str) -> Response:
+    status = request.form.get("status", "")
+    if status not in STATUSES:
+        abort(400)
+    _write(set_status, item_id=item_id, status=status)
+    return redirect(url_for("web.items", status=status), code=303)
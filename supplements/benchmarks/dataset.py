@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import random
+import sqlite3
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator
+
+from app.db import connect, init_db
+
+# Same seed and spec, same database, row for row; timestamps start here.
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+BATCH = 10_000
+
+_NAMES = (
+    "Vitamin D3", "Vitamin B12", "Vitamin C", "Magnesium Glycinate", "Zinc", "Omega-3 Fish Oil",
+    "Calcium Citrate", "Iron", "Biotin", "Melatonin", "Aspirin", "Ibuprofen", "Metformin",
+    "Lisinopril", "Atorvastatin", "Levothyroxine", "Probiotic", "Turmeric", "Ashwagandha",
+    "Creatine", "Collagen", "CoQ10", "Folate", "Potassium", "Glucosamine",
+)
+_BRANDS = (None, "Nature Made", "Thorne", "NOW", "Kirkland", "Garden of Life", "Pure Encapsulations")
+_NOTES = (None, None, "take with food", "before bed", "morning, empty stomach", "as needed for pain")
+_UNITS = ("mg", "mcg", "IU", "g", "capsule", "tablet")
+_FORMS = (None, "tablet", "capsule", "softgel", "powder", "liquid")
+_ROUTES = (None, "oral", "sublingual", "topical")
+_CATEGORIES = ("rx", "otc", "supplement", "supplement")
+_STATUSES = ("active", "active", "active", "paused", "stopped")
+_FIELDS = ("notes", "brand", "amount", "unit", "time_am", "time_pm", "form")
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    items: int = 10_000
+    doses_per_item: int = 1
+    history: int = 100_000
+    seed: int = 1
+
+    @property
+    def key(self) -> str:
+        return f"i{self.items}-d{self.doses_per_item}-h{self.history}-s{self.seed}"
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _ts(seconds: float) -> str:
+    return (EPOCH + timedelta(seconds=int(seconds))).isoformat()
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _batched(rows: Iterator[tuple], size: int = BATCH) -> Iterator[list[tuple]]:
+    batch: list[tuple] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate(db_path: Path, spec: DatasetSpec) -> None:
+    # Builds a fresh database at db_path through the normal migrations, then
+    # bulk-inserts items, doses and a history timeline spread over the items.
+    db_path.unlink(missing_ok=True)
+    conn = connect(db_path)
+    try:
+        init_db(conn)
+        _fill(conn, spec)
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _fill(conn: sqlite3.Connection, spec: DatasetSpec) -> None:
+    rng = random.Random(spec.seed)
+    # Items are created over the first half of the span, history covers all
+    # of it, one event every `step` seconds.
+    step = 60
+    span = max(spec.history, spec.items) * step
+
+    item_ids: list[str] = []
+    items: list[tuple] = []
+    for n in range(spec.items):
+        item_id = _uuid(rng)
+        item_ids.append(item_id)
+        created = _ts(n * span / 2 / max(spec.items, 1))
+        status = rng.choice(_STATUSES)
+        items.append(
+            (
+                item_id,
+                f"{rng.choice(_NAMES)} {n}",
+                None,
+                rng.choice(_BRANDS),
+                rng.choice(_CATEGORIES),
+                rng.choice(_FORMS),
+                rng.choice(_ROUTES),
+                rng.choice(_NOTES),
+                status,
+                created[:10],
+                created[:10] if status == "stopped" else None,
+                None,
+                None,
+                created,
+                created,
+            )
+        )
+    for batch in _batched(iter(items)):
+        conn.executemany(
+            """
+            INSERT INTO items (
+                id, name_display, name_generic, brand, category, form, route, notes,
+                status, start_date, stop_date, prescriber, pharmacy, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            batch,
+        )
+    conn.commit()
+
+    def doses() -> Iterator[tuple]:
+        for item in items:
+            for _ in range(spec.doses_per_item):
+                yield (
+                    _uuid(rng),
+                    item[0],
+                    rng.choice((None, 1, 2.5, 5, 10, 250, 1000)),
+                    rng.choice(_UNITS),
+                    rng.randint(0, 1),
+                    rng.randint(0, 1),
+                    rng.randint(0, 1),
+                    None,
+                    None,
+                    item[13],
+                    item[13],
+                )
+
+    for batch in _batched(doses()):
+        conn.executemany(
+            """
+            INSERT INTO doses (
+                id, item_id, amount, unit, time_am, time_midday, time_pm,
+                with_food, instructions, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            batch,
+        )
+    conn.commit()
+
+    def history() -> Iterator[tuple]:
+        for n in range(spec.history):
+            item_id = item_ids[rng.randrange(len(item_ids))] if item_ids else _uuid(rng)
+            roll = rng.random()
+            if roll < 0.1:
+                yield (_uuid(rng), _ts(n * step), item_id, "create", None, None, None, "created item")
+            elif roll < 0.3:
+                old, new = rng.sample(("active", "paused", "stopped"), 2)
+                yield (_uuid(rng), _ts(n * step), item_id, "status_change", "status", old, new, f"status -> {new}")
+            else:
+                field = rng.choice(_FIELDS)
+                yield (_uuid(rng), _ts(n * step), item_id, "update", field, str(rng.randint(0, 99)), str(rng.randint(0, 99)), None)
+
+    if item_ids:
+        for batch in _batched(history()):
+            conn.executemany(
+                """
+                INSERT INTO history (id, ts, item_id, action, field, old_value, new_value, note)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                batch,
+            )
+        conn.commit()
+
+
+def ensure_dataset(cache_dir: Path, spec: DatasetSpec) -> Path:
+    # Generated once per spec and reused; runs work on a copy.
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / f"dataset-{spec.key}.db"
+    if not path.exists():
+        partial = path.with_name(path.name + ".partial")
+        generate(partial, spec)
+        for suffix in ("-wal", "-shm"):
+            Path(str(partial) + suffix).unlink(missing_ok=True)
+        partial.rename(path)
+    return path
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from app.db import connect
+
+from .dataset import DatasetSpec, ensure_dataset
+from .scenarios import run_repo_scenarios
+from .startup import STARTUP_BUDGET_MS, over_budget, run_startup_scenarios
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_CACHE_DIR = HERE / ".cache"
+DEFAULT_OUTPUT = HERE / "results.json"
+DEFAULT_BASELINE = HERE / "baseline.json"
+
+RESULTS_VERSION = 1
+
+# A scenario regresses when its median is more than `threshold` slower than
+# the baseline's and also at least MIN_DELTA_MS slower, so sub-millisecond
+# scenarios do not fail on timer noise.
+DEFAULT_THRESHOLD = 0.25
+MIN_DELTA_MS = 0.5
+
+
+@dataclass
+class Regression:
+    name: str
+    baseline_ms: float
+    current_ms: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current_ms / self.baseline_ms if self.baseline_ms else float("inf")
+
+
+def compare(current: dict, baseline: dict, *, threshold: float, min_delta_ms: float = MIN_DELTA_MS) -> list[Regression]:
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        now = current["results"].get(name)
+        if now is None:
+            continue
+        base_ms, now_ms = base["median_ms"], now["median_ms"]
+        if now_ms > base_ms * (1 + threshold) and now_ms - base_ms >= min_delta_ms:
+            regressions.append(Regression(name, base_ms, now_ms))
+    return regressions
+
+
+def _meta(spec: DatasetSpec, repeat: int) -> dict:
+    return {
+        "version": RESULTS_VERSION,
+        "created_at": datetime.now(timezone.utc).replace(microsecond=0).isoformat(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "dataset": spec.as_dict(),
+        "repeat": repeat,
+    }
+
+
+def run(spec: DatasetSpec, *, repeat: int, cache_dir: Path, only: Optional[set[str]], tui: bool, cli: bool) -> dict:
+    started = time.perf_counter()
+    dataset = ensure_dataset(cache_dir, spec)
+    print(f"dataset {spec.key} ready in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    results = {}
+    heavy: dict[str, list[str]] = {}
+    with tempfile.TemporaryDirectory(prefix="supplements-bench-") as tmp:
+        scratch = Path(tmp)
+
+        # Each group gets its own copy, so write scenarios never see each
+        # other's rows and the cached dataset stays pristine.
+        work = scratch / "repo.db"
+        shutil.copyfile(dataset, work)
+        conn = connect(work)
+        try:
+            for name, timing in run_repo_scenarios(conn, repeat=repeat, only=only).items():
+                results[name] = timing.as_dict()
+        finally:
+            conn.close()
+
+        if tui:
+            from .tui import run_tui_scenarios
+
+            work = scratch / "tui.db"
+            shutil.copyfile(dataset, work)
+            for name, timing in run_tui_scenarios(work, scratch, repeat=repeat, only=only).items():
+                results[name] = timing.as_dict()
+
+        if cli:
+            timings, heavy = run_startup_scenarios(dataset, scratch, repeat=repeat, only=only)
+            for name, timing in timings.items():
+                results[name] = timing.as_dict()
+
+    return {"meta": _meta(spec, repeat), "results": results, "heavy_imports": heavy}
+
+
+def _print_table(report: dict, baseline: Optional[dict]) -> None:
+    base_results = (baseline or {}).get("results", {})
+    print(f"{'scenario':<34} {'median ms':>10} {'p95 ms':>10} {'baseline':>10} {'change':>8}")
+    for name, r in sorted(report["results"].items()):
+        base = base_results.get(name)
+        if base:
+            change = f"{(r['median_ms'] / base['median_ms'] - 1) * 100:+.0f}%" if base["median_ms"] else ""
+            base_col = f"{base['median_ms']:.2f}"
+        else:
+            change, base_col = "", "-"
+        print(f"{name:<34} {r['median_ms']:>10.2f} {r['p95_ms']:>10.2f} {base_col:>10} {change:>8}")
+
+
+def _write_json(path: Path, data: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as fp:
+        json.dump(data, fp, indent=2, sort_keys=True)
+        fp.write("\n")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Time the repo, TUI refresh and CLI start-up paths.")
+    parser.add_argument("--items", type=int, default=DatasetSpec.items, help="items in the synthetic dataset")
+    parser.add_argument("--doses", type=int, default=DatasetSpec.doses_per_item, help="doses per item")
+    parser.add_argument("--history", type=int, default=DatasetSpec.history, help="history rows (up to 1M)")
+    parser.add_argument("--seed", type=int, default=DatasetSpec.seed)
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per scenario")
+    parser.add_argument("--only", action="append", help="run scenarios whose name starts with this (repeatable)")
+    parser.add_argument("--no-tui", action="store_true", help="skip the headless Textual scenarios")
+    parser.add_argument("--no-cli", action="store_true", help="skip the command-line cold start scenarios")
+    parser.add_argument(
+        "--startup-budget", type=float, default=STARTUP_BUDGET_MS, help="allowed median ms for a CLI cold start"
+    )
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR, help="where generated datasets are kept")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT, help="results JSON to write")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    if not 0 <= args.history <= 1_000_000:
+        parser.error("--history must be between 0 and 1000000")
+    logging.basicConfig(level=logging.WARNING)
+
+    spec = DatasetSpec(items=args.items, doses_per_item=args.doses, history=args.history, seed=args.seed)
+    report = run(
+        spec,
+        repeat=args.repeat,
+        cache_dir=args.cache_dir,
+        only=set(args.only or ()),
+        tui=not args.no_tui,
+        cli=not args.no_cli,
+    )
+    _write_json(args.output, report)
+
+    baseline = None
+    if args.baseline.exists() and not args.save_baseline:
+        with args.baseline.open(encoding="utf-8") as fp:
+            baseline = json.load(fp)
+        if baseline.get("meta", {}).get("dataset") != spec.as_dict():
+            print(f"baseline {args.baseline} was recorded on a different dataset; not comparing", file=sys.stderr)
+            baseline = None
+
+    _print_table(report, baseline)
+    print(f"results written to {args.output}")
+
+    # The start-up budget is absolute, so it applies with or without a baseline.
+    failed = False
+    for name, median_ms in over_budget(report["results"], args.startup_budget):
+        print(f"OVER BUDGET {name}: {median_ms:.2f} ms > {args.startup_budget:.0f} ms", file=sys.stderr)
+        failed = True
+    for name, modules in sorted(report["heavy_imports"].items()):
+        print(f"HEAVY IMPORT {name}: {', '.join(modules)}", file=sys.stderr)
+        failed = True
+    if failed:
+        return 1
+
+    if args.save_baseline:
+        _write_json(args.baseline, report)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    if baseline is not None:
+        regressions = compare(report, baseline, threshold=args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r.name}: {r.baseline_ms:.2f} ms -> {r.current_ms:.2f} ms ({r.ratio:.2f}x)", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import sqlite3
+import statistics
+import time
+from dataclasses import dataclass
+from itertools import count
+from typing import Callable, Optional
+
+from app import repo
+
+
+@dataclass
+class Timing:
+    runs: int
+    min_ms: float
+    median_ms: float
+    p95_ms: float
+    max_ms: float
+
+    def as_dict(self) -> dict:
+        return {
+            "runs": self.runs,
+            "min_ms": round(self.min_ms, 3),
+            "median_ms": round(self.median_ms, 3),
+            "p95_ms": round(self.p95_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+def summarize(samples: list[float]) -> Timing:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return Timing(
+        runs=len(ordered),
+        min_ms=ordered[0] * 1000,
+        median_ms=statistics.median(ordered) * 1000,
+        p95_ms=p95 * 1000,
+        max_ms=ordered[-1] * 1000,
+    )
+
+
+def time_calls(fn: Callable[[], object], *, repeat: int, setup: Optional[Callable[[], None]] = None) -> Timing:
+    # One untimed warm-up call, then `repeat` timed ones; setup runs before
+    # each call and is not timed.
+    if setup is not None:
+        setup()
+    fn()
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def _middle_history_cursor(conn: sqlite3.Connection) -> Optional[repo.HistoryCursor]:
+    total = conn.execute("SELECT count(*) FROM history").fetchone()[0]
+    row = conn.execute("SELECT ts, id FROM history ORDER BY ts DESC, id DESC LIMIT 1 OFFSET ?", (total // 2,)).fetchone()
+    return None if row is None else (row[0], row[1])
+
+
+def _busiest_item(conn: sqlite3.Connection) -> Optional[str]:
+    row = conn.execute("SELECT item_id FROM history GROUP BY item_id ORDER BY count(*) DESC LIMIT 1").fetchone()
+    return None if row is None else row[0]
+
+
+def _any_active_item(conn: sqlite3.Connection) -> Optional[str]:
+    row = conn.execute("SELECT id FROM items WHERE status = 'active' ORDER BY sort_key, id LIMIT 1").fetchone()
+    return None if row is None else row[0]
+
+
+def run_repo_scenarios(conn: sqlite3.Connection, *, repeat: int, only: Optional[set[str]] = None) -> dict[str, Timing]:
+    # conn is a db.connect() connection on a scratch copy of the dataset;
+    # the write scenarios modify it.
+    results: dict[str, Timing] = {}
+
+    def bench(name: str, fn: Callable[[], object], *, setup: Optional[Callable[[], None]] = None, times: int = repeat) -> None:
+        if only and not any(name.startswith(prefix) for prefix in only):
+            return
+        results[name] = time_calls(fn, repeat=times, setup=setup)
+
+    bench("repo.list_items", lambda: repo.list_items(conn, "active"))
+    bench("repo.list_items.tuples", lambda: repo.list_items(conn, "active", as_tuples=True))
+    bench("repo.get_items_page.first", lambda: repo.get_items_page(conn, "active", limit=200))
+    bench("repo.search_items", lambda: repo.search_items(conn, "vita", status="active", limit=100))
+
+    bench("repo.get_history.first_page", lambda: repo.get_history(conn, limit=200))
+    deep = _middle_history_cursor(conn)
+    if deep is not None:
+        bench("repo.get_history_page.deep", lambda: repo.get_history_page(conn, before=deep, limit=200))
+    busiest = _busiest_item(conn)
+    if busiest is not None:
+        bench("repo.get_history.item", lambda: repo.get_history(conn, item_id=busiest, limit=200))
+
+    created = count()
+    bench(
+        "repo.create_item_with_dose",
+        lambda: repo.create_item_with_dose(
+            conn,
+            name_display=f"Benchmark item {next(created)}",
+            category="supplement",
+            amount=5,
+            unit="mg",
+            time_am=True,
+        ),
+    )
+
+    item_id = _any_active_item(conn)
+    if item_id is not None:
+        edits = count()
+
+        def update() -> None:
+            # Every call changes notes and amount, so it is never a no-op.
+            n = next(edits)
+            repo.update_item_and_dose(
+                conn,
+                item_id=item_id,
+                name_display="Benchmark edit target",
+                category="supplement",
+                name_generic=None,
+                brand=None,
+                form=None,
+                route=None,
+                notes=f"edit {n}",
+                amount=float(n % 50 + 1),
+                unit="mg",
+                time_am=True,
+                time_midday=False,
+                time_pm=bool(n % 2),
+                with_food=None,
+                instructions=None,
+            )
+
+        bench("repo.update_item_and_dose", update)
+
+    return results
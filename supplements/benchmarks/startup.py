@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from typing import Optional
+
+from .scenarios import Timing, time_calls
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Headless commands are scripted (cron exports, quick listings), so their
+# cost is mostly interpreter start plus imports. Each scenario runs the
+# command in a fresh interpreter; a median over budget fails the run.
+STARTUP_BUDGET_MS = 250.0
+
+# Importing any of these means a headless command pulled in the UI stack.
+HEAVY_MODULES = ("textual", "rich", "flask", "werkzeug", "jinja2")
+
+COMMANDS = {
+    "cli.help": ["--help"],
+    "cli.list.stopped": ["list", "--status", "stopped"],
+    "cli.list.json": ["list", "--status", "stopped", "--json"],
+    "cli.history": ["history"],
+    "cli.export.csv": ["export", "--format", "csv"],
+    "cli.backup.list": ["backup", "list"],
+}
+
+
+def _command(data_dir: Path, args: list[str], *python_options: str) -> list[str]:
+    return [sys.executable, *python_options, "-m", "app", "--data-dir", str(data_dir), *args]
+
+
+def _run(cmd: list[str]) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    return subprocess.run(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+
+
+def heavy_imports(data_dir: Path, args: list[str]) -> list[str]:
+    # Top-level packages from HEAVY_MODULES that the command imports.
+    stderr = _run(_command(data_dir, args, "-X", "importtime")).stderr
+    found = set()
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and line.count("|") == 2:
+            found.add(line.rsplit("|", 1)[1].strip().split(".")[0])
+    return sorted(found.intersection(HEAVY_MODULES))
+
+
+def run_startup_scenarios(
+    db_path: Path, scratch: Path, *, repeat: int, only: Optional[set[str]] = None
+) -> tuple[dict[str, Timing], dict[str, list[str]]]:
+    # Returns the timings and, per scenario, any heavy modules it imported.
+    data_dir = scratch / "cli"
+    data_dir.mkdir()
+    shutil.copyfile(db_path, data_dir / "supplements.db")
+
+    results: dict[str, Timing] = {}
+    heavy: dict[str, list[str]] = {}
+    for name, args in COMMANDS.items():
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        cmd = _command(data_dir, args)
+        results[name] = time_calls(lambda: _run(cmd), repeat=repeat)
+        modules = heavy_imports(data_dir, args)
+        if modules:
+            heavy[name] = modules
+    return results, heavy
+
+
+def over_budget(results: dict[str, dict], budget_ms: float = STARTUP_BUDGET_MS) -> list[tuple[str, float]]:
+    return [(name, r["median_ms"]) for name, r in sorted(results.items()) if name in COMMANDS and r["median_ms"] > budget_ms]
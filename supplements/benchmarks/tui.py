@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from textual.widgets import DataTable, Input
+
+from app import repo
+from app.config import AppConfig
+from app.db import connect
+from app.tui.app import SupplementsTUI
+from app.tui.screens.edit_item import EditItemScreen
+from app.tui.screens.list_view import EditRequested, ListView
+
+from .scenarios import Timing, summarize
+
+TIMEOUT_S = 120.0
+SIZE = (160, 50)
+
+
+class ScenarioTimeout(Exception):
+    pass
+
+
+async def _wait_until(cond: Callable[[], bool], timeout: float = TIMEOUT_S) -> None:
+    # Yields to the app's tasks until cond() holds.
+    deadline = time.perf_counter() + timeout
+    while not cond():
+        if time.perf_counter() > deadline:
+            raise ScenarioTimeout("condition not met in time")
+        await asyncio.sleep(0.001)
+
+
+def _table(screen: ListView) -> DataTable:
+    return screen.query_one("#table", DataTable)
+
+
+def _config(db_path: Path, scratch: Path) -> AppConfig:
+    return AppConfig(
+        project_root=scratch,
+        data_dir=scratch,
+        db_path=db_path,
+        exports_dir=scratch / "exports",
+        backups_dir=scratch / "backups",
+    )
+
+
+async def _first_window(cfg: AppConfig, repeat: int) -> Timing:
+    # App construction (including the migration check) until the active list
+    # shows its first rows.
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        app = SupplementsTUI(cfg, backups=False)
+        async with app.run_test(size=SIZE):
+            screen = app.screens_by_name["active"]
+            await _wait_until(lambda: _table(screen).row_count > 0)
+            samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+async def _loaded_app_flows(cfg: AppConfig, repeat: int) -> dict[str, Timing]:
+    results: dict[str, Timing] = {}
+    started = time.perf_counter()
+    app = SupplementsTUI(cfg, backups=False)
+    async with app.run_test(size=SIZE) as pilot:
+        screen = app.screens_by_name["active"]
+        # Until every window of the first load is in the table.
+        await _wait_until(lambda: _table(screen).row_count > 0 and not screen.paging)
+        results["tui.full_load"] = summarize([time.perf_counter() - started])
+
+        # Nothing changed: the generation check should make a poll nearly free.
+        samples = []
+        for _ in range(repeat):
+            t = time.perf_counter()
+            await app._poll_changes()
+            samples.append(time.perf_counter() - t)
+        results["tui.refresh.noop"] = summarize(samples)
+
+        # Another connection edits one visible item; the poll applies it.
+        item_id = _table(screen).coordinate_to_cell_key((0, 0))[0].value
+        writer = connect(cfg.db_path)
+        try:
+            samples = []
+            for n in range(repeat):
+                found = repo.get_item_with_doses(writer, item_id)
+                assert found is not None
+                item, _ = found
+                writer.execute(
+                    "UPDATE items SET notes = ?, updated_at = strftime('%Y-%m-%dT%H:%M:%S+00:00', 'now') WHERE id = ?",
+                    (f"external {n}", item.id),
+                )
+                writer.commit()
+                t = time.perf_counter()
+                await app._poll_changes()
+                samples.append(time.perf_counter() - t)
+            results["tui.refresh.after_write"] = summarize(samples)
+        finally:
+            writer.close()
+
+        # Edit flow: open the editor for the first row, change notes, save,
+        # until the list shows the new value.
+        samples = []
+        for n in range(repeat):
+            t = time.perf_counter()
+            app.post_message(EditRequested(item_id))
+            await _wait_until(lambda: isinstance(app.screen, EditItemScreen))
+            editor = app.screen
+            await pilot.pause()
+            editor.query_one("#notes", Input).value = f"edited {n}"
+            editor.query_one("#save").press()
+            await _wait_until(lambda: app.screen is screen and _table(screen).get_cell(item_id, "notes") == f"edited {n}")
+            samples.append(time.perf_counter() - t)
+        results["tui.edit_save"] = summarize(samples)
+    return results
+
+
+def run_tui_scenarios(db_path: Path, scratch: Path, *, repeat: int, only: Optional[set[str]] = None) -> dict[str, Timing]:
+    cfg = _config(db_path, scratch)
+
+    def wanted(name: str) -> bool:
+        return not only or any(name.startswith(prefix) for prefix in only)
+
+    results: dict[str, Timing] = {}
+    if wanted("tui.first_window"):
+        results["tui.first_window"] = asyncio.run(_first_window(cfg, max(1, min(repeat, 5))))
+    if any(wanted(name) for name in ("tui.full_load", "tui.refresh", "tui.edit_save")):
+        flows = asyncio.run(_loaded_app_flows(cfg, repeat))
+        results.update({name: timing for name, timing in flows.items() if wanted(name)})
+    return results
@@ -0,0 +1,9 @@
+#!/usr/bin/env sh
+# Runs the supplements command line from any directory, e.g.
+#   scripts/run.sh                      open the TUI
+#   scripts/run.sh list --json          print active items as JSON
+#   scripts/run.sh export --format csv  for cron
+# Set PYTHON to use a particular interpreter or virtualenv.
+set -eu
+root=$(CDPATH= cd -- "$(dirname -- "$0")/.." && pwd)
+PYTHONPATH="$root${PYTHONPATH:+:$PYTHONPATH}" exec "${PYTHON:-python3}" -m app "$@"
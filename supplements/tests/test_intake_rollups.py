@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+from app import repo
+from app.db import connect, init_db
+from app.migrations import MIGRATIONS
+from app.services.intake import make_event
+
+AT = datetime(2026, 10, 14, 9, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def conn(tmp_path: Path) -> sqlite3.Connection:
+    conn = connect(tmp_path / "supplements.db")
+    init_db(conn, tmp_path / "backups")
+    yield conn
+    conn.close()
+
+
+def _item_with_two_slots(conn: sqlite3.Connection) -> tuple[str, str]:
+    item_id = repo.create_item_with_doses(
+        conn,
+        name_display="Magnesium",
+        category="supplement",
+        doses=[{"amount": 200, "unit": "mg", "time_am": True, "time_pm": True}],
+    )
+    _, doses = repo.get_item_with_doses(conn, item_id)
+    return item_id, doses[0].id
+
+
+def _mark(conn: sqlite3.Connection, item_id: str, dose_id: str, slot: int, status: str) -> None:
+    repo.record_intakes(conn, [make_event(item_id=item_id, dose_id=dose_id, slot=slot, status=status, at=AT)])
+
+
+def _totals(conn: sqlite3.Connection, table: str) -> tuple[int, int]:
+    return tuple(conn.execute(f"SELECT sum(taken), sum(skipped) FROM {table}").fetchone())
+
+
+def test_remarking_a_slot_replaces_the_earlier_mark(conn: sqlite3.Connection) -> None:
+    item_id, dose_id = _item_with_two_slots(conn)
+    day = make_event(item_id=item_id, at=AT).day
+
+    # AM: taken twice, then skipped then taken; PM: taken then skipped.
+    for slot, status in [(1, "taken"), (1, "taken"), (1, "skipped"), (1, "taken"), (3, "taken"), (3, "skipped")]:
+        _mark(conn, item_id, dose_id, slot, status)
+
+    adherence = repo.get_adherence(conn, start=day, end=day)
+    assert (adherence.taken, adherence.skipped) == (1, 1)
+    assert adherence.taken + adherence.skipped == 2
+    assert _totals(conn, "intake_daily") == (1, 1)
+    assert _totals(conn, "intake_weekly") == (1, 1)
+    assert repo.get_intake_for_day(conn, day) == {(dose_id, 1): "taken", (dose_id, 3): "skipped"}
+
+    # Deleting the latest PM mark brings back the one it replaced.
+    conn.execute("DELETE FROM intake_events WHERE id = (SELECT max(id) FROM intake_events)")
+    conn.commit()
+    assert _totals(conn, "intake_daily") == (2, 0)
+    assert _totals(conn, "intake_weekly") == (2, 0)
+
+
+def test_migration_recounts_inflated_rollups(conn: sqlite3.Connection) -> None:
+    item_id, dose_id = _item_with_two_slots(conn)
+    for status in ("taken", "taken", "skipped"):
+        _mark(conn, item_id, dose_id, 1, status)
+    # What the old triggers left behind: every event counted.
+    conn.execute("UPDATE intake_daily SET taken = 2, skipped = 1")
+    conn.execute("UPDATE intake_weekly SET taken = 2, skipped = 1")
+
+    migration = next(m for m in MIGRATIONS if m.version == 8)
+    migration.apply(conn)
+    conn.commit()
+    assert _totals(conn, "intake_daily") == (0, 1)
+    assert _totals(conn, "intake_weekly") == (0, 1)